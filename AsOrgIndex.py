@@ -0,0 +1,203 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+AsOrgIndex.py
+-------------
+The class in this file maps AS numbers to the names of the organizations that
+own them, using the CAIDA AS2Org datasets in `./data/`. The gzipped JSONL
+dataset is read once and compiled into an index holding the sorted AS numbers
+and their organization names. Given a cache directory, the index is written
+there, memory-mapped on later runs and rebuilt if it is unreadable. The index
+is searched with a binary search, and is only opened when the first lookup is
+made.
+"""
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+
+AS_ORG_DATASETS = {
+    '2008': "./data/20080402.as-org2info.jsonl.gz",
+    '2021': "./data/20211001.as-org2info.jsonl.gz",
+}
+INDEX_MAGIC = b'ASORGIX\x00'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<8sIII')
+
+
+class AsOrgIndex:
+    """
+        Class for looking up the organization that owns an AS number.
+    """
+    def __init__(self, dataset='2021', cache_dir=None):
+        """
+        :param dataset: A key of AS_ORG_DATASETS ('2008' or '2021') or the
+        path to a CAIDA as-org2info JSONL file, gzipped or not. Use
+        `closest_dataset` to pick the dataset closest to the MRT data.
+        :param cache_dir: Optional directory holding the compiled index
+        files. They are named after the SHA-1 of the dataset's contents. If
+        None, the index is compiled in memory every time it is opened.
+        """
+        self.dataset = AS_ORG_DATASETS.get(dataset, dataset)
+        self.cache_dir = cache_dir
+        self.__asns = None
+        self.__offsets = None
+        self.__names = None
+
+    @staticmethod
+    def closest_dataset(timestamp):
+        """
+        :param timestamp: Unix timestamp, e.g. of the updates being studied.
+        :return: The key of AS_ORG_DATASETS whose snapshot date is closest.
+        """
+        def distance(key):
+            date = os.path.basename(AS_ORG_DATASETS[key]).split('.')[0]
+            return abs(datetime.strptime(date, "%Y%m%d").timestamp() - timestamp)
+        return min(AS_ORG_DATASETS, key=distance)
+
+    def __len__(self):
+        self.__open()
+        return len(self.__asns)
+
+    def get(self, asn, default="UNKNOWN"):
+        """
+        :param asn: AS number as a string or an integer.
+        :param default: Value returned for unknown AS numbers.
+        :return: Name of the organization owning asn. If the dataset does
+            not name the organization, the name registered for the AS itself.
+        """
+        self.__open()
+        try:
+            asn = int(asn)
+        except (TypeError, ValueError):
+            return default
+        position = bisect_left(self.__asns, asn)
+        if position == len(self.__asns) or self.__asns[position] != asn:
+            return default
+        start, end = self.__offsets[position], self.__offsets[position + 1]
+        return bytes(self.__names[start:end]).decode('utf-8')
+
+    def index_path(self):
+        """
+        :return: Location of the compiled index for self.dataset inside
+            self.cache_dir, or None if there is no cache directory.
+        """
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha1()
+        with open(self.dataset, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b''):
+                digest.update(chunk)
+        return os.path.join(self.cache_dir, "%s.asorg" % digest.hexdigest())
+
+    def __open(self):
+        if self.__asns is not None:
+            return
+        path = self.index_path()
+        if path is None:
+            if not self.__map(self.__compile()):
+                raise ValueError("Could not compile an AS to organization index from %s" % self.dataset)
+        elif not self.__map_file(path):
+            self.__save(path, self.__compile())
+            if not self.__map_file(path):
+                raise ValueError("Could not read AS to organization index %s" % path)
+        logging.info("AS to organization index for %s opened. %d mappings found" % (self.dataset, len(self.__asns)))
+
+    def __compile(self):
+        """
+        Reads the dataset and compiles the index: a header, the sorted AS
+        numbers, the offsets of their names and the UTF-8 encoded names.
+        :return: The index as bytes.
+        """
+        logging.info("Building AS to organization index from %s" % self.dataset)
+        organizations, as_records = {}, {}
+        opener = gzip.open if self.dataset.endswith(".gz") else open
+        with opener(self.dataset, "rt", encoding="utf-8") as fp:
+            for line in fp:
+                record = json.loads(line)
+                if record.get("type") == "Organization":
+                    organizations[record.get("organizationId")] = record.get("name")
+                elif "asn" in record:
+                    try:
+                        as_records[int(record["asn"])] = (record.get("organizationId"), record.get("name"))
+                    except ValueError:
+                        continue
+
+        asns, offsets, names = array('I'), array('I', [0]), bytearray()
+        for asn in sorted(as_records):
+            organization_id, as_name = as_records[asn]
+            name = organizations.get(organization_id) or as_name or ""
+            asns.append(asn)
+            names += name.encode('utf-8')
+            offsets.append(len(names))
+
+        header = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(asns), 0 if sys.byteorder == 'little' else 1)
+        return header + asns.tobytes() + offsets.tobytes() + bytes(names)
+
+    def __save(self, path, index):
+        """
+        Writes the index to a temporary file first and renames it, so a
+        partially written index is never picked up.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as fp:
+            fp.write(index)
+        os.replace(tmp_path, path)
+
+    def __map_file(self, path):
+        """
+        Memory-maps the index at path.
+        :return: True if it was mapped, False if it is missing or unusable.
+        """
+        try:
+            with open(path, "rb") as fp:
+                buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        return self.__map(buffer)
+
+    def __map(self, buffer):
+        """
+        Reads the index from a buffer without copying it.
+        :return: True if it was read, False if it is truncated, corrupt or
+            was written by another version or on a machine of other byte
+            order.
+        """
+        view = memoryview(buffer).cast('B')
+        if len(view) < INDEX_HEADER.size:
+            return False
+        magic, version, n_asns, byteorder = INDEX_HEADER.unpack_from(view)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or byteorder != (0 if sys.byteorder == 'little' else 1):
+            return False
+        names_offset = INDEX_HEADER.size + 4 * n_asns + 4 * (n_asns + 1)
+        if names_offset > len(view):
+            return False
+        offset = INDEX_HEADER.size
+        asns = view[offset:offset + 4 * n_asns].cast('I')
+        offset += 4 * n_asns
+        offsets = view[offset:names_offset].cast('I')
+        names = view[names_offset:]
+        if offsets[0] != 0 or offsets[-1] != len(names):
+            return False
+        self.__asns, self.__offsets, self.__names = asns, offsets, names
+        self.__buffer = buffer
+        return True
+
+
+def main():
+    index = AsOrgIndex(dataset=AsOrgIndex.closest_dataset(datetime(2008, 2, 24).timestamp()), cache_dir="./cache")
+    for asn in ["17557", "36561", "3491"]:
+        print(asn, index.get(asn))
+
+
+if __name__ == '__main__':
+    main()
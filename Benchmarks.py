@@ -0,0 +1,387 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+Benchmarks.py
+-------------
+The class in this file times the main operations of `ParseUpdates`,
+`RoutingTable` and `DetectHijacks` over a chosen subset of the MRT files in
+`./data/`. Every scenario is run a few times on freshly prepared inputs and
+reports its best time, throughput and the peak memory it allocated. Results
+can be saved as JSON and compared against a stored baseline, so a change that
+makes a scenario slower or hungrier than a threshold allows is caught:
+
+    python3 Benchmarks.py --files "./data/updates.20080219.00*.bz2" --cache-dir ./cache --output baseline.json
+    python3 Benchmarks.py --files "./data/updates.20080219.00*.bz2" --cache-dir ./cache --baseline baseline.json
+"""
+
+from ParseUpdates import ParseUpdates
+from RoutingTable import RoutingTable
+from DetectHijacks import DetectHijacks
+from MrtSource import MrtSource
+from ParallelBz2Source import ParallelBz2Source
+from MmapMrtSource import MmapMrtSource
+import argparse
+import copy
+import gc
+import glob
+import json
+import logging
+import platform
+import random
+import socket
+import struct
+import sys
+import time
+import tracemalloc
+
+SCENARIOS = ('parse', 'apply', 'reachability', 'collapse', 'lpm', 'lpm_batch', 'hijack_scan')
+
+HIJACK_SCAN_RANGES = {'208.65.152.0/22': ['36561']}
+
+
+class Benchmarks:
+    """
+        Class for timing parsing, routing table and hijack detection scenarios.
+    """
+    def __init__(self, files, cache_dir=None, repeat=3, lookups=10000, batch_lookups=1000000, measure_memory=True,
+                 seed=3640, source=None):
+        """
+        :param files: List of MRT files the scenarios run over, in
+        chronological order.
+        :param cache_dir: Parsed-update cache directory, see `ParseUpdates`.
+        With a cache, the parse scenario measures loading the cache rather
+        than decoding the MRT files.
+        :param repeat: Number of timed runs of every scenario. The best time
+        is reported.
+        :param lookups: Number of destinations looked up one at a time by
+        the lpm scenario.
+        :param batch_lookups: Number of destinations looked up at once by the
+        lpm_batch scenario.
+        :param measure_memory: If True, every scenario is run once more under
+        `tracemalloc` to measure the peak memory it allocates. Tracing slows
+        Python down, so this run is not timed.
+        :param seed: Seed of the destinations looked up, so runs are
+        reproducible.
+        :param source: Optional `MrtSource` the MRT files are read with, see
+        `ParseUpdates`.
+        self.results maps the name of every scenario run to a dictionary of
+        its best and mean time in seconds, the number of items it processed,
+        their unit, the throughput in items per second and the peak memory in
+        bytes (None if not measured).
+        """
+        self.files = list(files)
+        self.cache_dir = cache_dir
+        self.repeat = repeat
+        self.lookups = lookups
+        self.batch_lookups = batch_lookups
+        self.measure_memory = measure_memory
+        self.seed = seed
+        self.source = source
+        self.results = {}
+        self.__records = None
+        self.__table = None
+        self.scenario_map = {
+            'parse': (self.__scenario_parse, 'updates'),
+            'apply': (self.__scenario_apply, 'updates'),
+            'reachability': (self.__scenario_reachability, 'entries'),
+            'collapse': (self.__scenario_collapse, 'entries'),
+            'lpm': (self.__scenario_lpm, 'lookups'),
+            'lpm_batch': (self.__scenario_lpm_batch, 'lookups'),
+            'hijack_scan': (self.__scenario_hijack_scan, 'updates'),
+        }
+
+    def run(self, scenarios=SCENARIOS):
+        """
+        Runs the given scenarios and records their results in self.results.
+        :param scenarios: Names of the scenarios to run, see SCENARIOS.
+        :return: self.results.
+        """
+        for name in scenarios:
+            if name not in self.scenario_map:
+                raise ValueError("Unknown scenario: %s" % name)
+            scenario, unit = self.scenario_map[name]
+            prepared = scenario()
+            if prepared is None:
+                continue
+            self.results[name] = self.__measure(name, prepared[0], prepared[1], unit)
+        return self.results
+
+    def __measure(self, name, prepare, run, unit):
+        """
+        Times run(prepare()) self.repeat times, preparing fresh inputs for
+        every run, then measures its peak memory in one more run.
+        :param prepare: Function returning the input of run. Not timed.
+        :param run: Function processing that input and returning the number
+            of items it processed.
+        """
+        times = []
+        items = 0
+        for _ in range(self.repeat):
+            state = prepare()
+            gc.collect()
+            start_time = time.perf_counter()
+            items = run(state)
+            times.append(time.perf_counter() - start_time)
+            del state
+
+        peak_memory = None
+        if self.measure_memory:
+            state = prepare()
+            gc.collect()
+            tracemalloc.start()
+            run(state)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            del state
+
+        best = min(times)
+        result = {
+            'seconds': best,
+            'mean_seconds': sum(times) / len(times),
+            'items': items,
+            'unit': unit,
+            'throughput': items / best if best > 0 else None,
+            'peak_memory': peak_memory,
+        }
+        logging.info("[BENCH] %s: %.3f second(s) for %d %s" % (name, best, items, unit))
+        return result
+
+    def __updates(self):
+        """
+        :return: The update records of self.files in order, parsed once and
+            shared by the scenarios that apply them.
+        """
+        if self.__records is None:
+            self.__records = []
+            for filename in self.files:
+                pu = ParseUpdates(filename=filename, cache_dir=self.cache_dir, source=self.source)
+                self.__records.extend(record for record in pu.stream_updates() if record['timestamp'] is not None)
+        return self.__records
+
+    def __routing_table(self):
+        """
+        :return: A routing table with every update of self.files applied,
+            built once and shared by the read-only scenarios.
+        """
+        if self.__table is None:
+            self.__table = RoutingTable()
+            apply_updates(self.__table, self.__updates())
+        return self.__table
+
+    def __destinations(self, n):
+        """
+        :return: n addresses drawn from the ranges of the routing table, so
+            that most lookups find a route, as integers.
+        """
+        keys = sorted(self.__routing_table().routing_table)
+        rng = random.Random(self.seed)
+        destinations = []
+        for _ in range(n):
+            network, length = keys[rng.randrange(len(keys))]
+            destinations.append(network + rng.randrange(1 << (32 - length)))
+        return destinations
+
+    def __scenario_parse(self):
+        def run(_):
+            n_updates = 0
+            for filename in self.files:
+                pu = ParseUpdates(filename=filename, cache_dir=self.cache_dir, source=self.source)
+                for record in pu.stream_updates():
+                    n_updates += len(record['announcements']) + len(record['withdrawals'])
+            return n_updates
+        return lambda: None, run
+
+    def __scenario_apply(self):
+        records = self.__updates()
+        return RoutingTable, lambda table: apply_updates(table, records)
+
+    def __scenario_reachability(self):
+        table = self.__routing_table()
+
+        def run(_):
+            table.measure_reachability()
+            return len(table.routing_table)
+        return lambda: None, run
+
+    def __scenario_collapse(self):
+        table = self.__routing_table()
+
+        def run(copied_table):
+            n_entries = len(copied_table.routing_table)
+            copied_table.collapse_routing_table()
+            return n_entries
+        return lambda: copy.deepcopy(table), run
+
+    def __scenario_lpm(self):
+        table = self.__routing_table()
+        destinations = [socket.inet_ntoa(struct.pack('!I', address)) for address in self.__destinations(self.lookups)]
+
+        def run(_):
+            for destination in destinations:
+                table.find_path_to_destination(destination)
+            return len(destinations)
+        return lambda: None, run
+
+    def __scenario_lpm_batch(self):
+        try:
+            import numpy as np
+        except ImportError:
+            logging.warning("[BENCH] Skipping lpm_batch: NumPy is not installed")
+            return None
+        table = self.__routing_table()
+        destinations = np.array(self.__destinations(self.batch_lookups), dtype=np.uint32)
+        table.flat_fib()
+
+        def run(_):
+            table.find_routes_batch(destinations)
+            return len(destinations)
+        return lambda: None, run
+
+    def __scenario_hijack_scan(self):
+        records = self.__updates()
+
+        def prepare():
+            dh = DetectHijacks(start_table=RoutingTable(), monitored_range=HIJACK_SCAN_RANGES, as_org_dataset='2008',
+                               cache_dir=self.cache_dir)
+            dh.get_org('36561')
+            return dh
+
+        def run(dh):
+            n_updates = 0
+            for record in records:
+                dh.apply_updates(record)
+                n_updates += len(record['announcements']) + len(record['withdrawals'])
+            return n_updates
+        return prepare, run
+
+    def report(self):
+        """
+        :return: The results as a dictionary ready to be saved as JSON,
+            together with the files and settings they were measured with.
+        """
+        return {
+            'files': self.files,
+            'cache_dir': self.cache_dir,
+            'source': type(self.source or MrtSource()).__name__,
+            'repeat': self.repeat,
+            'lookups': self.lookups,
+            'batch_lookups': self.batch_lookups,
+            'python': platform.python_version(),
+            'measured_at': int(time.time()),
+            'scenarios': self.results,
+        }
+
+    def compare(self, baseline, threshold=0.2, min_seconds=0.01):
+        """
+        Compares self.results with a baseline report.
+        :param baseline: Dictionary returned by `report`, e.g. loaded from a
+            saved JSON file.
+        :param threshold: Allowed relative increase of the best time and of
+            the peak memory of a scenario, e.g. 0.2 for 20%.
+        :param min_seconds: Time increases smaller than this are ignored, as
+            scenarios taking a few milliseconds are dominated by noise.
+        :return: List of messages, one per regression. Scenarios missing
+            from either side are not compared.
+        """
+        if [str(filename) for filename in baseline['files']] != [str(filename) for filename in self.files]:
+            raise ValueError("The baseline was measured over different files")
+        regressions = []
+        for name, result in self.results.items():
+            previous = baseline['scenarios'].get(name)
+            if previous is None:
+                continue
+            for metric in ('seconds', 'peak_memory'):
+                if result[metric] is None or previous.get(metric) is None:
+                    continue
+                if metric == 'seconds' and result[metric] - previous[metric] < min_seconds:
+                    continue
+                if result[metric] > previous[metric] * (1 + threshold):
+                    regressions.append("%s: %s went from %s to %s (+%.1f%%)" %
+                                       (name, metric, previous[metric], result[metric],
+                                        100.0 * (result[metric] / previous[metric] - 1)))
+        return regressions
+
+
+def apply_updates(table, records):
+    """
+    :param table: Routing table the updates are applied to.
+    :param records: Update records as yielded by `ParseUpdates.stream_updates`.
+    :return: Number of updates applied.
+    """
+    n_updates = 0
+    for record in records:
+        for announcement in record['announcements']:
+            table.apply_announcement(announcement)
+        for withdrawal in record['withdrawals']:
+            table.apply_withdrawal(withdrawal)
+        n_updates += len(record['announcements']) + len(record['withdrawals'])
+    return n_updates
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', '-f', nargs='+', default=["./data/updates.20080219.0015.bz2"],
+                        help="MRT files or glob patterns to run the scenarios over.")
+    parser.add_argument('--max-files', type=int, help="Only use the first MAX_FILES files.")
+    parser.add_argument('--scenarios', '-s', nargs='+', default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument('--cache-dir', help="Parsed-update cache directory.")
+    parser.add_argument('--source', default='default', choices=('default', 'parallel-bz2', 'mmap'),
+                        help="How MRT files are decompressed: on the decoding thread, by several threads, or "
+                             "once into --raw-dir and memory-mapped afterwards.")
+    parser.add_argument('--raw-dir', default="./raw", help="Directory of the decompressed files for --source mmap.")
+    parser.add_argument('--repeat', '-r', type=int, default=3, help="Timed runs per scenario.")
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--batch-lookups', type=int, default=1000000)
+    parser.add_argument('--no-memory', action='store_true', help="Do not measure peak memory.")
+    parser.add_argument('--output', '-o', help="Save the results as JSON to this file.")
+    parser.add_argument('--baseline', '-b', help="Fail if the results regress against this JSON file.")
+    parser.add_argument('--threshold', '-t', type=float, default=0.2,
+                        help="Allowed relative regression against the baseline.")
+    parsed_args = parser.parse_args()
+
+    files = []
+    for pattern in parsed_args.files:
+        files.extend(sorted(glob.glob(pattern)) or [pattern])
+    if parsed_args.max_files is not None:
+        files = files[:parsed_args.max_files]
+
+    source = None
+    if parsed_args.source == 'parallel-bz2':
+        source = ParallelBz2Source()
+    elif parsed_args.source == 'mmap':
+        source = MmapMrtSource(parsed_args.raw_dir)
+        source.decompress(files)
+
+    benchmarks = Benchmarks(files, cache_dir=parsed_args.cache_dir, repeat=parsed_args.repeat,
+                            lookups=parsed_args.lookups, batch_lookups=parsed_args.batch_lookups,
+                            measure_memory=not parsed_args.no_memory, source=source)
+    benchmarks.run(parsed_args.scenarios)
+
+    print("%-14s %10s %22s %12s" % ("scenario", "seconds", "throughput", "peak memory"))
+    for name, result in benchmarks.results.items():
+        print("%-14s %10.3f %12.0f %-9s %12s" %
+              (name, result['seconds'], result['throughput'] or 0, result['unit'] + "/s",
+               "-" if result['peak_memory'] is None else "%.1f MB" % (result['peak_memory'] / 1e6)))
+
+    if parsed_args.output is not None:
+        with open(parsed_args.output, "w") as fp:
+            json.dump(benchmarks.report(), fp, indent=2)
+
+    if parsed_args.baseline is not None:
+        with open(parsed_args.baseline) as fp:
+            baseline = json.load(fp)
+        try:
+            regressions = benchmarks.compare(baseline, parsed_args.threshold)
+        except ValueError as e:
+            print("Cannot compare with %s: %s" % (parsed_args.baseline, e))
+            sys.exit(2)
+        for regression in regressions:
+            print("REGRESSION %s" % regression)
+            logging.error("[BENCH] Regression: %s" % regression)
+        if regressions:
+            sys.exit(1)
+        print("No regressions beyond %.0f%% against %s" % (100 * parsed_args.threshold, parsed_args.baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+FastMrtDecoder.py
+-----------------
+The class in this file reads BGP4MP MESSAGE and MESSAGE_AS4 UPDATE records
+straight from the bytes of an MRT file. Only the fields used by
+`ParseUpdates` are decoded: the timestamp, the peer AS, the withdrawn routes,
+the NLRI and the AS_PATH and NEXT_HOP attributes. Any record it does not
+handle is decoded by `mrtparse` instead, so both produce identical updates.
+"""
+
+from MrtSource import MrtSource
+from datetime import datetime
+import io
+import logging
+import socket
+import struct
+import mrtparse
+from mrtparse import AS_PATH_SEG_T
+
+MRT_HEADER = struct.Struct('>IHHI')
+BGP4MP = 16
+BGP4MP_MESSAGE = 1
+BGP4MP_MESSAGE_AS4 = 4
+BGP_UPDATE = 2
+AS_PATH = 2
+NEXT_HOP = 3
+
+
+class FallbackToMrtparse(Exception):
+    """
+        Raised while decoding a record that has to be handed to mrtparse.
+    """
+
+
+class FastMrtDecoder:
+    """
+        Class for decoding BGP UPDATE messages from MRT dumps without mrtparse.
+    """
+    def __init__(self, filename, metrics=None, source=None):
+        """
+        :param filename: MRT file to be decoded. Plain, gzip and bz2
+        compressed files are accepted, as with `mrtparse.Reader`.
+        :param metrics: Optional `Metrics`. Reads from the file are recorded
+        as the decompress stage, and the number of records decoded by each
+        decoder as counters.
+        :param source: `MrtSource` supplying the decompressed bytes of the
+        file. Defaults to `MrtSource`, which decompresses on this thread. If
+        the source supplies a buffer, records are decoded from it in place.
+        self.n_fast and self.n_fallback are the number of records decoded by
+        this class and by mrtparse respectively.
+        """
+        self.filename = filename
+        self.metrics = metrics
+        self.source = source if source is not None else MrtSource()
+        self.n_fast, self.n_fallback = 0, 0
+        self.__dates = {}
+
+    def __records(self):
+        """
+        Yields (header, body) for every record of the file. Both are
+        memoryviews into the source's buffer if it supplies one, and bytes
+        read from the file object it opens otherwise. The body is shorter
+        than the header's length for a truncated last record.
+        """
+        buffer = self.source.buffer(self.filename)
+        if buffer is not None:
+            view = memoryview(buffer)
+            p = 0
+            while p + MRT_HEADER.size <= len(view):
+                length = MRT_HEADER.unpack_from(view, p)[3]
+                yield view[p:p + MRT_HEADER.size], view[p + MRT_HEADER.size:p + MRT_HEADER.size + length]
+                p += MRT_HEADER.size + length
+            return
+
+        fp = self.source.open(self.filename)
+        if self.metrics is not None:
+            fp = self.metrics.wrap_reader(fp, 'decompress')
+        with fp:
+            while True:
+                header = fp.read(MRT_HEADER.size)
+                if len(header) < MRT_HEADER.size:
+                    break
+                yield header, fp.read(MRT_HEADER.unpack(header)[3])
+
+    def __iter__(self):
+        """
+        Yields (timestamp, peer_as, bgp_message) for every BGP message in the
+        file, in file order. `timestamp` and `peer_as` are in the format used
+        by mrtparse. Messages decoded by this class only contain the
+        withdrawn_routes, path_attributes (AS_PATH and NEXT_HOP only) and
+        nlri entries. Records mrtparse cannot decode either are skipped.
+        """
+        for header, body in self.__records():
+            timestamp, mrt_type, subtype, length = MRT_HEADER.unpack(header)
+            message = None
+            if mrt_type == BGP4MP and (subtype == BGP4MP_MESSAGE or subtype == BGP4MP_MESSAGE_AS4) \
+                    and len(body) == length:
+                try:
+                    message = self.__decode(subtype, memoryview(body))
+                except (FallbackToMrtparse, IndexError, struct.error):
+                    message = None
+            if message is not None:
+                self.n_fast += 1
+                yield [timestamp, self.__date(timestamp)], message[0], message[1]
+                continue
+
+            self.n_fallback += 1
+            entry = next(mrtparse.Reader(io.BytesIO(bytes(header) + bytes(body))))
+            if 'bgp_message' not in entry.data:
+                logging.warning("Skipping undecodable record in %s: %s" % (self.filename, entry.err_msg))
+                continue
+            yield entry.data['timestamp'], entry.data['peer_as'], entry.data['bgp_message']
+        if self.metrics is not None:
+            self.metrics.count('records_fast', self.n_fast)
+            self.metrics.count('records_fallback', self.n_fallback)
+
+    def __date(self, timestamp):
+        date = self.__dates.get(timestamp)
+        if date is None:
+            date = str(datetime.fromtimestamp(timestamp))
+            self.__dates[timestamp] = date
+        return date
+
+    def __decode(self, subtype, buf):
+        """
+        Decodes a BGP4MP MESSAGE or MESSAGE_AS4 record body.
+        :return: (peer_as, bgp_message), or None if the record is not an IPv4
+            UPDATE message.
+        """
+        as_len = 2 if subtype == BGP4MP_MESSAGE else 4
+        peer_as = str(int.from_bytes(buf[0:as_len], 'big'))
+        p = 2 * as_len + 2
+        afi = int.from_bytes(buf[p:p + 2], 'big')
+        if afi != 1:
+            return None
+        p += 2 + 4 + 4
+
+        message_start = p
+        p += 16
+        length, message_type = struct.unpack_from('>HB', buf, p)
+        p += 3
+        if message_type != BGP_UPDATE:
+            return None
+        end = message_start + length
+        if end > len(buf):
+            raise FallbackToMrtparse()
+
+        withdrawn_length = int.from_bytes(buf[p:p + 2], 'big')
+        p += 2
+        withdrawn_routes = self.__nlri(buf, p, p + withdrawn_length)
+        p += withdrawn_length
+
+        attributes_length = int.from_bytes(buf[p:p + 2], 'big')
+        p += 2
+        attributes_end = p + attributes_length
+        path_attributes = []
+        while p < attributes_end:
+            flag = buf[p]
+            attribute_type = buf[p + 1]
+            if flag & 0x10:
+                attribute_length = int.from_bytes(buf[p + 2:p + 4], 'big')
+                p += 4
+            else:
+                attribute_length = buf[p + 2]
+                p += 3
+            if p + attribute_length > len(buf):
+                raise FallbackToMrtparse()
+            if attribute_type == AS_PATH:
+                path_attributes.append({'type': [AS_PATH, 'AS_PATH'],
+                                        'value': self.__as_path(buf, p, p + attribute_length, as_len)})
+            elif attribute_type == NEXT_HOP:
+                if attribute_length != 4:
+                    raise FallbackToMrtparse()
+                path_attributes.append({'type': [NEXT_HOP, 'NEXT_HOP'], 'value': socket.inet_ntoa(buf[p:p + 4])})
+            p += attribute_length
+
+        nlri = self.__nlri(buf, p, end)
+        return peer_as, {'withdrawn_routes': withdrawn_routes, 'path_attributes': path_attributes, 'nlri': nlri}
+
+    @staticmethod
+    def __as_path(buf, p, end, as_len):
+        segments = []
+        while p < end:
+            segment_type = buf[p]
+            segment_length = buf[p + 1]
+            p += 2
+            if p + segment_length * as_len > len(buf):
+                raise FallbackToMrtparse()
+            value = [str(int.from_bytes(buf[p + i * as_len:p + (i + 1) * as_len], 'big'))
+                     for i in range(segment_length)]
+            p += segment_length * as_len
+            segments.append({'type': [segment_type, AS_PATH_SEG_T[segment_type]], 'length': segment_length,
+                             'value': value})
+        return segments
+
+    @staticmethod
+    def __nlri(buf, p, end):
+        """
+        Decodes IPv4 prefixes between p and end. Invalid prefixes and
+        duplicate prefixes (which mrtparse re-reads as ADD-PATH NLRI) are left
+        to mrtparse.
+        """
+        routes = []
+        seen = set()
+        while p < end:
+            prefix_length = buf[p]
+            if prefix_length > 32:
+                raise FallbackToMrtparse()
+            n = (prefix_length + 7) // 8
+            if p + 1 + n > len(buf):
+                raise FallbackToMrtparse()
+            raw = bytes(buf[p + 1:p + 1 + n])
+            if prefix_length % 8 and raw[-1] & (0xff >> (prefix_length % 8)):
+                raise FallbackToMrtparse()
+            if (prefix_length, raw) in seen:
+                raise FallbackToMrtparse()
+            seen.add((prefix_length, raw))
+            routes.append({'prefix_length': prefix_length, 'prefix': socket.inet_ntoa(raw + b'\x00' * (4 - n))})
+            p += 1 + n
+        return routes
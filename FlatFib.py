@@ -0,0 +1,86 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+FlatFib.py
+----------
+The class in this file flattens a set of (possibly nested) IPv4 prefixes into
+sorted, disjoint address intervals, each labelled with the longest prefix
+covering it. Longest prefix matching for many addresses at once then becomes
+a single vectorised binary search with NumPy.
+"""
+
+import socket
+import numpy as np
+
+
+class FlatFib:
+    """
+        Class for vectorised longest prefix matching over a fixed set of prefixes.
+    """
+    def __init__(self, keys):
+        """
+        :param keys: Iterable of (network, prefix length) tuples in ascending
+        order of network address, with a prefix before the prefixes it
+        contains (the order of `PrefixTrie.items`).
+        self.keys is the list of prefixes; the route index returned by
+        `lookup` for an address is a position in this list.
+        self.starts and self.routes describe the flattened intervals: the
+        addresses from self.starts[i] up to self.starts[i + 1] - 1 are matched
+        by route self.routes[i], or by no route if it is -1.
+        """
+        self.keys = list(keys)
+        starts = [0]
+        routes = [-1]
+
+        def emit(position, route):
+            if position > 0xffffffff:
+                return
+            if starts[-1] == position:
+                routes[-1] = route
+            elif routes[-1] != route:
+                starts.append(position)
+                routes.append(route)
+
+        # Every prefix opens an interval at its network address and hands the
+        # addresses after its last one back to the closest enclosing prefix.
+        stack = []
+        for idx, (network, length) in enumerate(self.keys):
+            while stack and stack[-1][0] <= network:
+                end, _ = stack.pop()
+                emit(end, stack[-1][1] if stack else -1)
+            emit(network, idx)
+            stack.append((network + (1 << (32 - length)), idx))
+        while stack:
+            end, _ = stack.pop()
+            emit(end, stack[-1][1] if stack else -1)
+
+        self.starts = np.array(starts, dtype=np.uint32)
+        self.routes = np.array(routes, dtype=np.int64)
+
+    def lookup(self, addresses):
+        """
+        Finds the longest matching prefix of every address.
+        :param addresses: NumPy array of unsigned 32-bit addresses, or a
+            sequence of addresses as dotted quad strings or integers.
+        :return: NumPy int64 array holding, for each address, the index in
+            self.keys of its longest matching prefix, or -1 if no prefix
+            matches.
+        """
+        addresses = to_address_array(addresses)
+        positions = np.searchsorted(self.starts, addresses, side='right') - 1
+        return self.routes[positions]
+
+
+def to_address_array(addresses):
+    """
+    :param addresses: NumPy array of addresses, or a sequence of addresses as
+        dotted quad strings or integers.
+    :return: The addresses as a NumPy uint32 array.
+    """
+    if isinstance(addresses, np.ndarray):
+        return addresses.astype(np.uint32, copy=False)
+    addresses = list(addresses)
+    if addresses and isinstance(addresses[0], str):
+        packed = b''.join(socket.inet_aton(address) for address in addresses)
+        return np.frombuffer(packed, dtype='>u4').astype(np.uint32)
+    return np.array(addresses, dtype=np.uint32)
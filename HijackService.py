@@ -0,0 +1,220 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+HijackService.py
+----------------
+The class in this file runs hijack detection as a long-running service. It
+watches a directory for new MRT dumps and runs them through an asyncio
+pipeline: files are decoded in a pool of worker processes, and their updates
+are checked and applied to one persistent routing table by a `DetectHijacks`
+instance. The stages are connected by bounded queues, so a slow stage holds
+back the ones before it instead of letting work pile up in memory.
+"""
+
+from DetectHijacks import DetectHijacks
+from ParallelParseUpdates import parse_file, load_updates
+from RoutingTable import RoutingTable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+import asyncio
+import fnmatch
+import logging
+import os
+import time
+
+
+class HijackService:
+    """
+        Class for detecting hijacks in MRT dumps as they arrive in a directory.
+    """
+    def __init__(self, detector, directory, pattern="updates.*.bz2", poll_interval=5.0, max_queued_files=4,
+                 max_decoded_files=2, max_workers=None, cache_dir=None, process_existing=False, on_alert=None,
+                 max_latencies=10000):
+        """
+        :param detector: `DetectHijacks` instance. Its routing table is the
+        persistent table all updates are applied to.
+        :param directory: Directory the collector writes MRT dumps to.
+        :param pattern: Shell pattern matched against the names of new files.
+        :param poll_interval: Seconds between two scans of the directory. A
+        file is only picked up once its size is unchanged between two scans,
+        so files still being written are not read.
+        :param max_queued_files: Maximum number of files waiting to be
+        decoded.
+        :param max_decoded_files: Maximum number of decoded files waiting to
+        be applied.
+        :param max_workers: Number of decoding processes, and of files
+        decoded at once. Defaults to the number of CPUs.
+        :param cache_dir: Parsed-update cache directory, see `ParseUpdates`.
+        :param process_existing: If True, files already in the directory when
+        the service starts are processed too, oldest name first.
+        :param on_alert: Optional function called with (filename,
+        announcement, latency) for every suspicious announcement.
+        :param max_latencies: Number of latencies kept in
+        self.alert_latencies and self.file_latencies.
+        self.alert_latencies and self.file_latencies are the seconds between
+        the pick-up of a file, when a scan finds its size unchanged, and
+        respectively each alert raised for it and the end of its processing,
+        for the latest max_latencies alerts and files. They do not include
+        the poll_interval the size check waits for. They are also recorded
+        as the alert_latency and file_latency stages of the detector's
+        metrics.
+        """
+        self.detector = detector
+        self.directory = directory
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self.max_queued_files = max_queued_files
+        self.max_decoded_files = max_decoded_files
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.process_existing = process_existing
+        self.on_alert = on_alert
+        self.processed_files = []
+        self.alert_latencies = deque(maxlen=max_latencies)
+        self.file_latencies = deque(maxlen=max_latencies)
+        self.__seen = set()
+        self.__stopping = None
+        self.__loop = None
+
+    def stop(self):
+        """
+        Asks a running service to stop. Files already picked up are still
+        processed. Can be called from any thread, e.g. from on_alert.
+        """
+        if self.__loop is not None:
+            self.__loop.call_soon_threadsafe(self.__stopping.set)
+
+    async def run(self):
+        """
+        Runs the watcher, decoder and applier stages until `stop` is called.
+        Directory scans run in a thread, so a slow file system does not hold
+        back the event loop.
+        """
+        self.__stopping = asyncio.Event()
+        self.__loop = asyncio.get_running_loop()
+        files = asyncio.Queue(maxsize=self.max_queued_files)
+        decoded = asyncio.Queue(maxsize=self.max_decoded_files)
+        with ProcessPoolExecutor(max_workers=self.max_workers) as decoders, \
+                ThreadPoolExecutor(max_workers=1) as applier:
+            await asyncio.gather(self.__watch(files), self.__decode(files, decoded, decoders),
+                                 self.__apply(decoded, applier))
+
+    def __scan(self):
+        """
+        :return: Dictionary of size by path of the unprocessed files matching
+            self.pattern.
+        """
+        sizes = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and fnmatch.fnmatch(entry.name, self.pattern) and entry.path not in self.__seen:
+                    sizes[entry.path] = entry.stat().st_size
+        return sizes
+
+    async def __watch(self, files):
+        if not self.process_existing:
+            self.__seen.update(await asyncio.to_thread(self.__scan))
+        pending = {}
+        while not self.__stopping.is_set():
+            sizes = await asyncio.to_thread(self.__scan)
+            for path in sorted(sizes):
+                if pending.get(path) != sizes[path]:
+                    pending[path] = sizes[path]
+                elif sizes[path] > 0:
+                    del pending[path]
+                    self.__seen.add(path)
+                    logging.info("New MRT file: %s" % path)
+                    await files.put((path, time.monotonic()))
+            try:
+                await asyncio.wait_for(self.__stopping.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        await files.put(None)
+
+    async def __decode(self, files, decoded, decoders):
+        """
+        Keeps up to self.max_workers files decoding at once, and passes the
+        decoded files on in the order they arrived.
+        """
+        loop = asyncio.get_running_loop()
+        in_flight = deque()
+        next_file = None
+        while True:
+            if next_file is None and len(in_flight) < self.max_workers:
+                next_file = asyncio.ensure_future(files.get())
+            waiting = [future for future in (next_file, in_flight[0][2] if in_flight else None) if future is not None]
+            await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if next_file is not None and next_file.done():
+                item = next_file.result()
+                next_file = None
+                if item is None:
+                    break
+                path, picked_up = item
+                in_flight.append((path, picked_up, loop.run_in_executor(decoders, parse_file, path, self.cache_dir)))
+            while in_flight and in_flight[0][2].done():
+                await self.__forward(in_flight.popleft(), decoded)
+        while in_flight:
+            await self.__forward(in_flight.popleft(), decoded)
+        await decoded.put(None)
+
+    @staticmethod
+    async def __forward(item, decoded):
+        path, picked_up, future = item
+        try:
+            buffer, _, _ = await future
+        except Exception:
+            logging.exception("Could not decode %s" % path)
+            return
+        await decoded.put((path, picked_up, buffer))
+
+    async def __apply(self, decoded, applier):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await decoded.get()
+            if item is None:
+                return
+            try:
+                await loop.run_in_executor(applier, self.__apply_file, *item)
+            except Exception:
+                logging.exception("Could not apply the updates of %s" % item[0])
+
+    def __apply_file(self, path, picked_up, buffer):
+        """
+        Runs in the applier thread, the only one touching the routing table.
+        """
+        metrics = self.detector.metrics
+        n_alerts, n_records = 0, 0
+        for next_updates in load_updates(buffer):
+            n_records += 1
+            for announcement in self.detector.apply_updates(next_updates):
+                latency = time.monotonic() - picked_up
+                self.alert_latencies.append(latency)
+                if metrics.enabled:
+                    metrics.record('alert_latency', latency)
+                n_alerts += 1
+                logging.warning("Alert for %s/%d from %s, %.3f second(s) after pick-up" %
+                                (announcement['range']['prefix'], announcement['range']['prefix_length'], path,
+                                 latency))
+                if self.on_alert is not None:
+                    self.on_alert(path, announcement, latency)
+        latency = time.monotonic() - picked_up
+        self.file_latencies.append(latency)
+        if metrics.enabled:
+            metrics.record('file_latency', latency)
+        self.processed_files.append(path)
+        logging.info("Processed %s: %d update collections, %d alert(s), %.3f second(s) after pick-up" %
+                     (path, n_records, n_alerts, latency))
+
+
+def main():
+    dh = DetectHijacks(start_table=RoutingTable(), monitored_range={'208.65.152.0/22': ['36561']},
+                       cache_dir="./cache")
+    service = HijackService(detector=dh, directory="./data", cache_dir="./cache")
+    try:
+        asyncio.run(service.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
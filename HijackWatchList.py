@@ -0,0 +1,103 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+HijackWatchList.py
+------------------
+The class in this file holds the destination ranges being watched for hijacks
+and the AS numbers expected to originate them. The ranges are indexed in a
+`PrefixTrie`, so finding the watched ranges an announcement relates to takes
+at most 32 steps (plus one per watched range it contains), however many
+ranges are watched.
+"""
+
+from PrefixTrie import PrefixTrie
+from RoutingTable import network_to_key, key_to_network
+import ipaddress
+
+EXACT = 'exact'
+MORE_SPECIFIC = 'more-specific'
+LESS_SPECIFIC = 'less-specific'
+
+
+class HijackWatchList:
+    """
+        Class for classifying announcements against a set of watched ranges.
+    """
+    def __init__(self, learn_origins=True):
+        """
+        :param learn_origins: If True, a watched range without expected
+        origins adopts the origin of the first announcement for the range
+        itself or for a range it contains.
+        self.ranges is a `PrefixTrie` mapping the routing table key of every
+        watched range to the set of AS numbers (strings) expected to
+        originate it.
+        """
+        self.ranges = PrefixTrie()
+        self.learn_origins = learn_origins
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def watch(self, network, expected_origins=None):
+        """
+        Adds a range to the watch list, or replaces its expected origins.
+        :param network: CIDR string, `ipaddress.IPv4Network` or routing table
+            key. Host bits of CIDR strings are ignored.
+        :param expected_origins: Iterable of AS numbers expected to originate
+            the range. If empty, the origins are learnt (see learn_origins).
+        """
+        if not isinstance(network, tuple):
+            network = network_to_key(ipaddress.ip_network(network, strict=False))
+        self.ranges.insert(network, set(str(asn) for asn in expected_origins or ()))
+
+    def expected_origins(self, network):
+        """
+        :param network: A watched range, as accepted by `watch`.
+        :return: The set of expected origins of the range, or None if it is
+            not watched.
+        """
+        if not isinstance(network, tuple):
+            network = network_to_key(ipaddress.ip_network(network, strict=False))
+        return self.ranges.get(network)
+
+    def classify(self, key, origin):
+        """
+        Finds the watched ranges an announcement relates to.
+        :param key: Routing table key of the announced range.
+        :param origin: AS number originating the announcement, or None if
+            its AS path is empty.
+        :return: List of (relation, watched key, expected origins, conflict)
+            tuples, one per related watched range, most specific range first.
+            relation is EXACT if the announcement is for the watched range,
+            MORE_SPECIFIC if it is for a range inside it and LESS_SPECIFIC if
+            it covers it. conflict is True if origin is not expected for the
+            watched range.
+        """
+        related = []
+        for watched, expected in self.ranges.covering(key):
+            if not expected and self.learn_origins and origin is not None:
+                expected.add(str(origin))
+            related.append((EXACT if watched == key else MORE_SPECIFIC, watched, expected,
+                            bool(expected) and str(origin) not in expected))
+        for watched, expected in self.ranges.items(within=key):
+            if watched != key:
+                related.append((LESS_SPECIFIC, watched, expected, bool(expected) and str(origin) not in expected))
+        return related
+
+    def conflicts(self, key, origin):
+        """
+        :param key: Routing table key of the announced range.
+        :param origin: AS number originating the announcement.
+        :return: The tuples of `classify` with a conflict.
+        """
+        return [match for match in self.classify(key, origin) if match[3]]
+
+
+def describe_match(match):
+    """
+    :param match: A tuple returned by `HijackWatchList.classify`.
+    :return: A short human readable description of it.
+    """
+    relation, watched, expected, conflict = match
+    return "%s %s (expected origin: %s)%s" % (relation, key_to_network(watched), ", ".join(sorted(expected)) or "-",
+                                            " CONFLICT" if conflict else "")
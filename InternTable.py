@@ -0,0 +1,80 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+InternTable.py
+--------------
+The class in this file stores each distinct value once and refers to it by a
+small integer id. `RoutingTable` uses it for the AS paths and next hops
+shared by many routes, so two routes can be compared by comparing ids.
+Values are reference counted and dropped once nothing refers to them, so the
+table does not grow with every path ever seen in a long replay.
+"""
+
+
+class InternTable:
+    """
+        Class for interning values under hashable, immutable keys.
+    """
+    def __init__(self):
+        """
+        self.keys, self.values and self.references hold the immutable key,
+        the stored value and the number of references of every interned
+        value, indexed by id. The ids of released values are reused; their
+        key and value are None until then.
+        """
+        self.keys = []
+        self.values = []
+        self.references = []
+        self.__ids = {}
+        self.__free_ids = []
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __getitem__(self, value_id):
+        return self.values[value_id]
+
+    def intern(self, key, value):
+        """
+        Returns the id of key and adds a reference to it, storing value
+        under it if key is not interned. Values interned later under an
+        equal key are not stored; the first one is shared instead.
+        :param key: Hashable, immutable representation of value.
+        :param value: Value to be stored.
+        :return: Integer id of key. Its reference count is 1 if and only if
+            value has just been stored.
+        """
+        value_id = self.__ids.get(key)
+        if value_id is not None:
+            self.references[value_id] += 1
+            return value_id
+        if self.__free_ids:
+            value_id = self.__free_ids.pop()
+            self.keys[value_id], self.values[value_id], self.references[value_id] = key, value, 1
+        else:
+            value_id = len(self.values)
+            self.keys.append(key)
+            self.values.append(value)
+            self.references.append(1)
+        self.__ids[key] = value_id
+        return value_id
+
+    def acquire(self, value_id):
+        """
+        Adds a reference to an interned value.
+        :param value_id: Id returned by `intern`.
+        """
+        self.references[value_id] += 1
+
+    def release(self, value_id):
+        """
+        Drops a reference to an interned value, and the value itself once
+        nothing refers to it.
+        :param value_id: Id returned by `intern`.
+        """
+        count = self.references[value_id] - 1
+        self.references[value_id] = count
+        if not count:
+            del self.__ids[self.keys[value_id]]
+            self.keys[value_id], self.values[value_id] = None, None
+            self.__free_ids.append(value_id)
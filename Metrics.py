@@ -0,0 +1,345 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+Metrics.py
+----------
+The class in this file collects counters, timers and latency histograms for
+the stages of a run: decompressing and decoding MRT files, building update
+records, applying updates to a routing table and checking them for hijacks.
+`ParseUpdates`, `RoutingTable` and `DetectHijacks` accept a `Metrics`
+instance and expose it as `self.metrics`. When the instance is built, an
+enabled `Metrics` replaces the methods of its stages, on that instance only,
+by timed wrappers (see `instrument`); a disabled one installs nothing, so the
+hot paths run the plain methods at no cost. Only methods called once per
+update or coarser are timed. Stages can additionally be profiled with
+cProfile, or sampled by a background thread.
+"""
+
+import cProfile
+import functools
+import pstats
+import sys
+import threading
+import time
+import types
+
+HISTOGRAM_BUCKETS = 32
+
+
+class Metrics:
+    """
+        Class for collecting per-stage counters, timers and latency histograms.
+    """
+    def __init__(self, enabled=True, profile_stages=(), sample_interval=None):
+        """
+        :param enabled: If False, nothing is instrumented or recorded. Read
+        when an object is instrumented: objects built while self was
+        disabled are not timed if self is enabled later.
+        :param profile_stages: Names of the stages to run under cProfile,
+        see `profile_stats`. A stage called from within another profiled
+        stage is covered by the outer stage's profile.
+        :param sample_interval: If set, `start_sampler` samples the running
+        stage every sample_interval seconds, see self.samples.
+        self.counters maps a counter name to its value.
+        self.timers maps a stage name to a [calls, total seconds, maximum
+        seconds] list. Stage times are measured with a monotonic clock and
+        include the stages nested in them, e.g. decode includes decompress.
+        self.histograms maps a stage name to a list of HISTOGRAM_BUCKETS
+        counts: bucket 0 counts calls shorter than 1 microsecond and bucket
+        i calls from 2 ** (i - 1) up to 2 ** i microseconds.
+        self.hooks is a list of functions called with (stage, seconds) after
+        every timed call.
+        self.samples maps a stage name to a dictionary counting, for every
+        (file, line, function) the sampled thread was found in while the
+        stage was running, the number of samples.
+        """
+        self.enabled = enabled
+        self.profile_stages = frozenset(profile_stages)
+        self.sample_interval = sample_interval
+        self.counters = {}
+        self.timers = {}
+        self.histograms = {}
+        self.hooks = []
+        self.samples = {}
+        self.__profiles = {}
+        self.__profiling = False
+        self.__active = []
+        self.__sampler = None
+        self.__sampler_stop = None
+
+    def count(self, name, n=1):
+        """
+        :param name: Name of the counter.
+        :param n: Amount added to the counter.
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, stage, seconds):
+        """
+        Records one call of a stage.
+        :param stage: Name of the stage.
+        :param seconds: Duration of the call.
+        """
+        timer = self.timers.get(stage)
+        if timer is None:
+            timer = self.timers[stage] = [0, 0.0, 0.0]
+            self.histograms[stage] = [0] * HISTOGRAM_BUCKETS
+        timer[0] += 1
+        timer[1] += seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+        self.histograms[stage][min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        for hook in self.hooks:
+            hook(stage, seconds)
+
+    def timer(self, stage):
+        """
+        :param stage: Name of the stage.
+        :return: Context manager timing the code it runs as one call of the
+            stage. For code that runs rarely; hot methods should be timed
+            with `instrument`.
+        """
+        return _StageTimer(self, stage)
+
+    def wrap(self, function, stage):
+        """
+        :param function: Function to be timed.
+        :param stage: Name of the stage every call is recorded as.
+        :return: A function timing and calling function, or function itself
+            if self is disabled.
+        """
+        if not self.enabled:
+            return function
+        record = self.record
+        perf_counter = time.perf_counter
+        if stage not in self.profile_stages and self.sample_interval is None:
+            @functools.wraps(function)
+            def timed(*args, **kwargs):
+                start_time = perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    record(stage, perf_counter() - start_time)
+            return timed
+
+        @functools.wraps(function)
+        def observed(*args, **kwargs):
+            self.__enter(stage)
+            start_time = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(stage, perf_counter() - start_time)
+                self.__exit(stage)
+        return observed
+
+    def wrap_iter(self, iterable, stage):
+        """
+        :param iterable: Iterable whose items are expensive to produce, e.g.
+            a generator decoding a file.
+        :param stage: Name of the stage every item is recorded as.
+        :return: An iterator timing the production of every item, or
+            iterable itself if self is disabled.
+        """
+        if not self.enabled:
+            return iterable
+        return self.__timed_iter(iter(iterable), self.wrap(next, stage))
+
+    @staticmethod
+    def __timed_iter(iterator, timed_next):
+        while True:
+            try:
+                item = timed_next(iterator)
+            except StopIteration:
+                return
+            yield item
+
+    def wrap_reader(self, fp, stage):
+        """
+        :param fp: File object, e.g. a bz2 file being decompressed.
+        :param stage: Name of the stage every read is recorded as.
+        :return: A file object timing fp.read, or fp itself if self is
+            disabled.
+        """
+        if not self.enabled:
+            return fp
+        return _TimedReader(fp, self.wrap(fp.read, stage))
+
+    def instrument(self, obj, stage_by_method):
+        """
+        Replaces methods of obj, on obj only, by timed wrappers. Does
+        nothing if self is disabled. Objects keeping wrappers must drop them
+        when pickled or copied, see `uninstrumented_state`, and instrument
+        the copy again.
+        :param obj: Instance to be instrumented.
+        :param stage_by_method: Dictionary mapping method names to stage
+            names. Private methods are given by their mangled names.
+        """
+        if not self.enabled:
+            return
+        for method, stage in stage_by_method.items():
+            setattr(obj, method, self.wrap(types.MethodType(getattr(type(obj), method), obj), stage))
+
+    def __enter(self, stage):
+        self.__active.append(stage)
+        if stage in self.profile_stages and not self.__profiling:
+            profile = self.__profiles.get(stage)
+            if profile is None:
+                profile = self.__profiles[stage] = cProfile.Profile()
+            self.__profiling = stage
+            profile.enable()
+
+    def __exit(self, stage):
+        self.__active.pop()
+        if self.__profiling == stage and stage not in self.__active:
+            self.__profiles[stage].disable()
+            self.__profiling = False
+
+    def profile_stats(self, stage):
+        """
+        :param stage: A stage of self.profile_stages.
+        :return: `pstats.Stats` of the calls profiled for the stage, or None
+            if it has not run.
+        """
+        profile = self.__profiles.get(stage)
+        return pstats.Stats(profile) if profile is not None else None
+
+    def start_sampler(self):
+        """
+        Starts a daemon thread sampling the calling thread every
+        self.sample_interval seconds. Only stages instrumented after this
+        `Metrics` was created with a sample_interval are sampled.
+        """
+        if not self.enabled or self.sample_interval is None or self.__sampler is not None:
+            return
+        thread_id = threading.get_ident()
+        self.__sampler_stop = threading.Event()
+        self.__sampler = threading.Thread(target=self.__sample, args=(thread_id, self.__sampler_stop), daemon=True)
+        self.__sampler.start()
+
+    def stop_sampler(self):
+        """
+        Stops the thread started by `start_sampler`.
+        """
+        if self.__sampler is not None:
+            self.__sampler_stop.set()
+            self.__sampler.join()
+            self.__sampler = None
+
+    def __sample(self, thread_id, stop):
+        while not stop.wait(self.sample_interval):
+            active = self.__active
+            frame = sys._current_frames().get(thread_id)
+            if not active or frame is None:
+                continue
+            code = frame.f_code
+            location = (code.co_filename, frame.f_lineno, code.co_name)
+            samples = self.samples.setdefault(active[-1], {})
+            samples[location] = samples.get(location, 0) + 1
+
+    def percentile(self, stage, fraction):
+        """
+        :param stage: Name of a recorded stage.
+        :param fraction: Fraction of the calls, e.g. 0.99.
+        :return: Upper bound in seconds, to the histogram's resolution, of
+            the duration of that fraction of the calls of stage.
+        """
+        buckets = self.histograms[stage]
+        target = fraction * sum(buckets)
+        seen = 0
+        for bucket, n_calls in enumerate(buckets):
+            seen += n_calls
+            if n_calls and seen >= target:
+                return (1 << bucket) / 1e6
+        return self.timers[stage][2]
+
+    def summary(self):
+        """
+        :return: Dictionary with the counters and, for every stage, its
+            number of calls, total, mean and maximum seconds and the 50th,
+            90th and 99th percentiles.
+        """
+        stages = {}
+        for stage, (calls, total, maximum) in self.timers.items():
+            stages[stage] = {
+                'calls': calls,
+                'seconds': total,
+                'mean_seconds': total / calls if calls else 0.0,
+                'max_seconds': maximum,
+                'p50_seconds': self.percentile(stage, 0.5),
+                'p90_seconds': self.percentile(stage, 0.9),
+                'p99_seconds': self.percentile(stage, 0.99),
+            }
+        return {'counters': dict(self.counters), 'stages': stages}
+
+    def log_summary(self, log):
+        """
+        Writes the summary, one line per stage and counter.
+        :param log: Function taking a message, e.g. `logging.info`.
+        """
+        summary = self.summary()
+        for stage, values in sorted(summary['stages'].items(), key=lambda item: -item[1]['seconds']):
+            log("[METRICS] %s: %d call(s), %.3f second(s), mean %.1f us, p99 <= %.1f us, max %.1f us" %
+                (stage, values['calls'], values['seconds'], values['mean_seconds'] * 1e6,
+                 values['p99_seconds'] * 1e6, values['max_seconds'] * 1e6))
+        for name, value in sorted(summary['counters'].items()):
+            log("[METRICS] %s: %d" % (name, value))
+
+    def reset(self):
+        """
+        Clears everything recorded so far. Instrumented methods stay
+        instrumented.
+        """
+        self.counters.clear()
+        self.timers.clear()
+        self.histograms.clear()
+        self.samples.clear()
+        self.__profiles.clear()
+
+
+def uninstrumented_state(obj, stage_by_method):
+    """
+    :param obj: Instance possibly instrumented by `Metrics.instrument`.
+    :param stage_by_method: Dictionary obj was instrumented with.
+    :return: A copy of obj.__dict__ without the timed wrappers, for
+        obj.__getstate__. The wrappers are bound to obj, so a copy keeping
+        them would update obj instead of itself.
+    """
+    return {name: value for name, value in obj.__dict__.items() if name not in stage_by_method}
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'start_time')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.metrics.enabled:
+            self.metrics.record(self.stage, time.perf_counter() - self.start_time)
+        return False
+
+
+class _TimedReader:
+    """
+        File object wrapper whose read method is timed.
+    """
+    def __init__(self, fp, timed_read):
+        self.__fp = fp
+        self.read = timed_read
+
+    def __getattr__(self, name):
+        return getattr(self.__fp, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__fp.close()
+        return False
@@ -0,0 +1,138 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+MmapMrtSource.py
+----------------
+The class in this file is an `MrtSource` for MRT files that have been
+decompressed once into a local directory. Decompressed files are
+memory-mapped, so `FastMrtDecoder` reads records straight out of the page
+cache without decompressing or copying them on every pass over the corpus.
+The corpus is decompressed with:
+
+    python3 MmapMrtSource.py --files "./data/*.bz2" --raw-dir ./raw
+"""
+
+from MrtSource import MrtSource
+from ParallelBz2Source import ParallelBz2Source
+import argparse
+import glob
+import logging
+import mmap
+import os
+import shutil
+import time
+
+COMPRESSED_EXTENSIONS = ('.bz2', '.gz')
+
+
+class MmapMrtSource(MrtSource):
+    """
+        Class for memory-mapping pre-decompressed MRT files.
+    """
+    def __init__(self, raw_dir, fallback=None):
+        """
+        :param raw_dir: Directory holding the decompressed files, see
+        `decompress`.
+        :param fallback: `MrtSource` used for compressed files that have not
+        been decompressed into raw_dir, or have changed since. Defaults to
+        `ParallelBz2Source`.
+        """
+        self.raw_dir = raw_dir
+        self.fallback = fallback if fallback is not None else ParallelBz2Source()
+
+    def raw_path(self, filename):
+        """
+        :param filename: MRT file.
+        :return: Location of the decompressed copy of filename in
+            self.raw_dir, or filename itself if it is not compressed.
+        """
+        if self.compression(filename) is None:
+            return filename
+        name = os.path.basename(filename)
+        for extension in COMPRESSED_EXTENSIONS:
+            if name.endswith(extension):
+                name = name[:-len(extension)]
+                break
+        return os.path.join(self.raw_dir, name + ".mrt")
+
+    def is_decompressed(self, filename):
+        """
+        :param filename: MRT file.
+        :return: True if a decompressed copy of filename at least as recent
+            as filename exists.
+        """
+        raw_path = self.raw_path(filename)
+        if raw_path == filename:
+            return True
+        try:
+            return os.path.getmtime(raw_path) >= os.path.getmtime(filename)
+        except OSError:
+            return False
+
+    def open(self, filename):
+        """
+        :param filename: MRT file.
+        :return: Binary file object reading the decompressed copy of
+            filename, or the file opened by self.fallback if there is none.
+        """
+        if self.is_decompressed(filename):
+            return open(self.raw_path(filename), "rb")
+        return self.fallback.open(filename)
+
+    def buffer(self, filename):
+        """
+        :param filename: MRT file.
+        :return: Read-only mmap of the decompressed copy of filename, or None
+            if there is none.
+        """
+        if not self.is_decompressed(filename):
+            return None
+        with open(self.raw_path(filename), "rb") as fp:
+            if not os.fstat(fp.fileno()).st_size:
+                return b''
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def decompress(self, filenames):
+        """
+        Decompresses the files that do not have an up to date copy in
+        self.raw_dir, using self.fallback. Copies are written to a temporary
+        file first and renamed, so a partial copy is never picked up.
+        :param filenames: MRT files.
+        :return: Number of files decompressed.
+        """
+        os.makedirs(self.raw_dir, exist_ok=True)
+        n_files = 0
+        for filename in filenames:
+            if self.is_decompressed(filename):
+                continue
+            raw_path = self.raw_path(filename)
+            tmp_path = "%s.%d.tmp" % (raw_path, os.getpid())
+            with self.fallback.open(filename) as source, open(tmp_path, "wb") as destination:
+                shutil.copyfileobj(source, destination, 1 << 20)
+            os.replace(tmp_path, raw_path)
+            n_files += 1
+        return n_files
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', '-f', nargs='+', required=True, help="MRT files or glob patterns to decompress.")
+    parser.add_argument('--raw-dir', '-d', default="./raw", help="Directory the decompressed files are written to.")
+    parser.add_argument('--workers', '-w', type=int, help="Decompression threads per file.")
+    parsed_args = parser.parse_args()
+
+    files = []
+    for pattern in parsed_args.files:
+        files.extend(sorted(glob.glob(pattern)) or [pattern])
+    source = MmapMrtSource(parsed_args.raw_dir, fallback=ParallelBz2Source(max_workers=parsed_args.workers))
+    start_time = time.time()
+    n_files = source.decompress(files)
+    logging.info("Decompressed %d of %d file(s) into %s in %.1f second(s)" %
+                 (n_files, len(files), parsed_args.raw_dir, time.time() - start_time))
+    print("Decompressed %d of %d file(s) into %s" % (n_files, len(files), parsed_args.raw_dir))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(filename)s:%(lineno)-4d: %(message)s',
+                        datefmt='%m-%d %H:%M')
+    main()
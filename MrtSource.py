@@ -0,0 +1,61 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+MrtSource.py
+------------
+The class in this file supplies the bytes of MRT files to `FastMrtDecoder`
+and `ParseUpdates`. It is the default byte source: it recognises plain, gzip
+and bz2 compressed files and decompresses them on the decoding thread, as
+`mrtparse.Reader` does. Other sources plug in by subclassing it:
+`ParallelBz2Source` decompresses bz2 blocks on several cores ahead of the
+decoder, and `MmapMrtSource` memory-maps files decompressed once beforehand.
+"""
+
+import bz2
+import gzip
+
+BZ2_MAGIC = b'\x42\x5a\x68'
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class MrtSource:
+    """
+        Class for reading the decompressed bytes of MRT files.
+    """
+    def open(self, filename):
+        """
+        :param filename: MRT file, plain or gzip or bz2 compressed.
+        :return: Binary file object reading the decompressed contents of
+            filename. It is closed by the caller.
+        """
+        compression = self.compression(filename)
+        if compression == 'bz2':
+            return bz2.open(filename, "rb")
+        if compression == 'gzip':
+            return gzip.open(filename, "rb")
+        return open(filename, "rb")
+
+    def buffer(self, filename):
+        """
+        :param filename: MRT file.
+        :return: The decompressed contents of filename as an object
+            supporting the buffer protocol, e.g. an mmap, if this source can
+            supply them without copying; None otherwise, in which case
+            `open` is used.
+        """
+        return None
+
+    @staticmethod
+    def compression(filename):
+        """
+        :param filename: MRT file.
+        :return: 'bz2' or 'gzip' if the file starts with the magic bytes of
+            that format, None otherwise.
+        """
+        with open(filename, "rb") as fp:
+            magic = fp.read(max(len(BZ2_MAGIC), len(GZIP_MAGIC)))
+        if magic.startswith(BZ2_MAGIC):
+            return 'bz2'
+        if magic.startswith(GZIP_MAGIC):
+            return 'gzip'
+        return None
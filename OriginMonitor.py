@@ -0,0 +1,192 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+OriginMonitor.py
+----------------
+The class in this file watches the origin AS of every prefix in a stream of
+updates. It keeps a small origin history per prefix and reports, as they
+happen, multiple origin AS (MOAS) conflicts, where a prefix is originated by
+another AS while its current origin still announces it, and origin changes,
+where a prefix moves from one origin AS to another. Each update costs a
+constant number of dictionary operations, so the whole `./data/` directory
+can be checked in a single pass.
+"""
+
+from ParallelParseUpdates import ParallelParseUpdates
+from RoutingTable import prefix_key, key_to_network, origin_as
+import glob
+import logging
+
+MOAS = 'moas'
+ORIGIN_CHANGE = 'origin-change'
+
+
+class _PrefixState:
+    __slots__ = ('peer_origins', 'active', 'history', 'last_origin')
+
+    def __init__(self):
+        self.peer_origins = {}
+        self.active = {}
+        self.history = {}
+        self.last_origin = None
+
+
+class OriginMonitor:
+    """
+        Class for detecting MOAS conflicts and origin changes for all prefixes.
+    """
+    def __init__(self, on_event=None):
+        """
+        :param on_event: Optional function called with every event as it is
+        detected.
+        self.prefixes maps the routing table key of every prefix seen to its
+        state: the origin currently announced by each peer AS, the number of
+        peers currently announcing each origin, the history of every
+        origin ever seen as a [first seen, last seen, number of
+        announcements] list and the origin of the latest announcement.
+        self.events is the list of detected events. Each one is a dictionary
+        with the event type (MOAS or ORIGIN_CHANGE), timestamp, prefix,
+        peer_as, origin and the other origins involved: the origins still
+        announced for a MOAS conflict, the previous origin for an origin
+        change.
+        """
+        self.prefixes = {}
+        self.events = []
+        self.on_event = on_event
+        self.n_announcements, self.n_withdrawals = 0, 0
+
+    def apply_announcement(self, announcement):
+        """
+        Records the origin of an announcement and reports the event it
+        causes, if any.
+        :param announcement: Announcement dictionary.
+        :return: The event dictionary, or None.
+        """
+        self.n_announcements += 1
+        origin = origin_as(announcement)
+        if origin is None:
+            return None
+        timestamp = announcement['timestamp'][0]
+        key = prefix_key(announcement['range']['prefix'], announcement['range']['prefix_length'])
+        state = self.prefixes.get(key)
+        if state is None:
+            state = self.prefixes[key] = _PrefixState()
+
+        history = state.history.get(origin)
+        if history is None:
+            state.history[origin] = [timestamp, timestamp, 1]
+        else:
+            history[1] = timestamp
+            history[2] += 1
+        previous_origin, state.last_origin = state.last_origin, origin
+
+        peer = announcement['peer_as']
+        peer_origin = state.peer_origins.get(peer)
+        if peer_origin == origin:
+            return None
+        state.peer_origins[peer] = origin
+        if peer_origin is not None:
+            self.__deactivate(state, peer_origin)
+        newly_active = origin not in state.active
+        state.active[origin] = state.active.get(origin, 0) + 1
+        if not newly_active:
+            return None
+
+        if len(state.active) > 1:
+            others = sorted(asn for asn in state.active if asn != origin)
+            return self.__report(MOAS, timestamp, key, peer, origin, others)
+        if previous_origin is not None and previous_origin != origin:
+            return self.__report(ORIGIN_CHANGE, timestamp, key, peer, origin, [previous_origin])
+        return None
+
+    def apply_withdrawal(self, withdrawal):
+        """
+        Forgets the origin announced by the withdrawing peer.
+        :param withdrawal: Withdrawal dictionary.
+        """
+        self.n_withdrawals += 1
+        state = self.prefixes.get(prefix_key(withdrawal['range']['prefix'], withdrawal['range']['prefix_length']))
+        if state is None:
+            return
+        origin = state.peer_origins.pop(withdrawal['peer_as'], None)
+        if origin is not None:
+            self.__deactivate(state, origin)
+
+    @staticmethod
+    def __deactivate(state, origin):
+        count = state.active[origin] - 1
+        if count:
+            state.active[origin] = count
+        else:
+            del state.active[origin]
+
+    def __report(self, event_type, timestamp, key, peer, origin, other_origins):
+        event = {
+            'type': event_type,
+            'timestamp': timestamp,
+            'prefix': str(key_to_network(key)),
+            'peer_as': peer,
+            'origin': origin,
+            'other_origins': other_origins,
+        }
+        self.events.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
+        return event
+
+    def origin_history(self, key):
+        """
+        :param key: Routing table key of a prefix.
+        :return: Dictionary mapping every origin AS seen for the prefix to a
+            (first seen, last seen, number of announcements) tuple.
+        """
+        state = self.prefixes.get(key)
+        if state is None:
+            return {}
+        return {origin: tuple(history) for origin, history in state.history.items()}
+
+    def current_origins(self, key):
+        """
+        :param key: Routing table key of a prefix.
+        :return: Set of origin ASes currently announced for the prefix.
+        """
+        state = self.prefixes.get(key)
+        return set(state.active) if state is not None else set()
+
+    def run(self, mrt_files, cache_dir=None):
+        """
+        Processes every update of mrt_files in timestamp order.
+        :param mrt_files: A list of MRT files or a glob pattern, see
+            `ParallelParseUpdates`.
+        :param cache_dir: Parsed-update cache directory.
+        :return: Number of events detected.
+        """
+        n_events = len(self.events)
+        ppu = ParallelParseUpdates(files=mrt_files, cache_dir=cache_dir)
+        for next_updates in ppu.get_next_updates():
+            if next_updates['timestamp'] is None:
+                break
+            for announcement in next_updates['announcements']:
+                self.apply_announcement(announcement)
+            for withdrawal in next_updates['withdrawals']:
+                self.apply_withdrawal(withdrawal)
+        logging.info("%d prefixes checked in %d file(s), %d events detected" %
+                     (len(self.prefixes), len(ppu.files), len(self.events) - n_events))
+        return len(self.events) - n_events
+
+
+def main():
+    def log_event(event):
+        logging.info("%s at %d for %s: origin AS %s, other origin(s) %s (peer AS %s)" %
+                     (event['type'], event['timestamp'], event['prefix'], event['origin'],
+                      ", ".join(event['other_origins']), event['peer_as']))
+
+    monitor = OriginMonitor(on_event=log_event)
+    monitor.run(sorted(glob.glob("./data/updates.*.bz2")), cache_dir="./cache")
+    n_moas = sum(1 for event in monitor.events if event['type'] == MOAS)
+    print("Prefixes: %d | MOAS conflicts: %d | Origin changes: %d" %
+          (len(monitor.prefixes), n_moas, len(monitor.events) - n_moas))
+
+
+if __name__ == '__main__':
+    main()
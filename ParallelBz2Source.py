@@ -0,0 +1,210 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+ParallelBz2Source.py
+--------------------
+The class in this file is an `MrtSource` that decompresses bz2 files on
+several cores. A bz2 stream is a sequence of independently compressed blocks
+of up to 900 kB, each starting with a 48-bit magic number that is not aligned
+to a byte. The blocks are located by searching for that number, each block is
+wrapped into a bz2 stream of its own, and the blocks are decompressed by a
+pool of threads while the decoder consumes the ones already done. The bz2
+module releases the GIL while decompressing, so the threads run in parallel.
+"""
+
+from MrtSource import MrtSource
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import bisect
+import bz2
+import os
+
+BLOCK_MAGIC = 0x314159265359
+END_OF_STREAM_MAGIC = 0x177245385090
+MAGIC_BITS = 48
+BLOCK_CRC_BITS = 32
+STREAM_HEADER = b'BZh9'
+
+
+def find_magic(data, magic):
+    """
+    :param data: Contents of a bz2 file.
+    :param magic: 48-bit magic number.
+    :return: Sorted list of the bit offsets at which magic occurs in data.
+        The compressed data of a block may contain the number by chance; such
+        offsets are not told apart here.
+    """
+    offsets = []
+    for shift in range(8):
+        window = (magic << (64 - MAGIC_BITS - shift)).to_bytes(8, 'big')
+        needle = window[1:6]
+        position = data.find(needle, 1)
+        while position != -1:
+            start = position - 1
+            if start + (shift + MAGIC_BITS + 7) // 8 <= len(data):
+                candidate = int.from_bytes(data[start:start + 8].ljust(8, b'\x00'), 'big')
+                if (candidate >> (64 - MAGIC_BITS - shift)) & ((1 << MAGIC_BITS) - 1) == magic:
+                    offsets.append(start * 8 + shift)
+            position = data.find(needle, position + 1)
+    return sorted(offsets)
+
+
+def decompress_bits(data, start, end):
+    """
+    Decompresses the bz2 block found between two bit offsets of a bz2 file.
+    :param data: Contents of a bz2 file.
+    :param start: Bit offset of the magic number of the block.
+    :param end: Bit offset just past the block.
+    :return: The decompressed bytes.
+    :raises OSError, EOFError or ValueError: If the bits are not exactly one
+        whole block.
+    """
+    n_bits = end - start
+    first_byte, last_byte = start // 8, (end + 7) // 8
+    bits = int.from_bytes(data[first_byte:last_byte], 'big')
+    bits = (bits >> ((last_byte * 8) - end)) & ((1 << n_bits) - 1)
+    block_crc = (bits >> (n_bits - MAGIC_BITS - BLOCK_CRC_BITS)) & ((1 << BLOCK_CRC_BITS) - 1)
+    # A stream of one block ends with the end of stream magic number and a
+    # combined CRC equal to the block's CRC.
+    stream = (bits << (MAGIC_BITS + BLOCK_CRC_BITS)) | (END_OF_STREAM_MAGIC << BLOCK_CRC_BITS) | block_crc
+    n_bits += MAGIC_BITS + BLOCK_CRC_BITS
+    padding = -n_bits % 8
+    decompressor = bz2.BZ2Decompressor()
+    decompressed = decompressor.decompress(STREAM_HEADER + (stream << padding).to_bytes((n_bits + padding) // 8, 'big'))
+    if not decompressor.eof:
+        raise EOFError("Compressed block ended before the end of stream marker")
+    return decompressed
+
+
+class ParallelBz2Source(MrtSource):
+    """
+        Class for decompressing bz2 compressed MRT files on several cores.
+    """
+    def __init__(self, max_workers=None, max_pending=None):
+        """
+        :param max_workers: Number of decompression threads. Defaults to the
+        number of CPUs.
+        :param max_pending: Maximum number of blocks decompressed ahead of the
+        decoder. Bounds memory use to about 900 kB per block. Defaults to
+        twice max_workers.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.max_workers
+
+    def open(self, filename):
+        """
+        :param filename: MRT file. Files that are not bz2 compressed are
+        opened by `MrtSource`.
+        :return: Binary file object reading the decompressed contents of
+            filename while its later blocks are decompressed in the
+            background.
+        """
+        if self.compression(filename) != 'bz2':
+            return super().open(filename)
+        with open(filename, "rb") as fp:
+            data = fp.read()
+        return _Bz2BlockReader(filename, data, self.__spans(data), self.max_workers, self.max_pending)
+
+    @staticmethod
+    def __spans(data):
+        """
+        :return: List of (start, end) bit offsets of the blocks of data. A
+            block ends where the next block or the end of its stream starts.
+        """
+        blocks = find_magic(data, BLOCK_MAGIC)
+        boundaries = sorted(set(blocks + find_magic(data, END_OF_STREAM_MAGIC)))
+        spans = []
+        for block in blocks:
+            following = bisect.bisect_right(boundaries, block)
+            spans.append((block, boundaries[following] if following < len(boundaries) else len(data) * 8))
+        return spans
+
+
+class _Bz2BlockReader:
+    """
+        File object reading the blocks of a bz2 file in order while a pool of
+        threads decompresses the blocks that follow.
+    """
+    def __init__(self, filename, data, spans, max_workers, max_pending):
+        self.filename = filename
+        self.__data = data
+        self.__spans = spans
+        self.__max_pending = max_pending
+        self.__pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.__futures = deque()
+        self.__next_span = 0
+        self.__chunk = b''
+        self.__offset = 0
+
+    def __submit(self):
+        while len(self.__futures) < self.__max_pending and self.__next_span < len(self.__spans):
+            start, end = self.__spans[self.__next_span]
+            self.__futures.append((self.__next_span, self.__pool.submit(decompress_bits, self.__data, start, end)))
+            self.__next_span += 1
+
+    def __next_chunk(self):
+        """
+        :return: The decompressed bytes of the next block, or None at the end
+            of the file.
+        """
+        self.__submit()
+        if not self.__futures:
+            return None
+        index, future = self.__futures.popleft()
+        try:
+            chunk = future.result()
+        except (OSError, EOFError, ValueError):
+            chunk = self.__merge_spans(index)
+        self.__submit()
+        return chunk
+
+    def __merge_spans(self, index):
+        """
+        Decompresses a block that failed to decompress on its own because a
+        chance occurrence of a magic number inside the compressed data was
+        taken for the start of the next block. The block is extended over
+        the following spans until it decompresses.
+        """
+        start = self.__spans[index][0]
+        for end_index in range(index + 1, len(self.__spans)):
+            if self.__futures and self.__futures[0][0] == end_index:
+                self.__futures.popleft()[1].cancel()
+            else:
+                self.__next_span = end_index + 1
+            try:
+                return decompress_bits(self.__data, start, self.__spans[end_index][1])
+            except (OSError, EOFError, ValueError):
+                continue
+        raise OSError("Invalid data stream in %s" % self.filename)
+
+    def read(self, size=-1):
+        """
+        :param size: Number of bytes to read, or -1 to read to the end.
+        :return: Up to size decompressed bytes; fewer only at the end of the
+            file.
+        """
+        parts = []
+        while size != 0:
+            if self.__offset >= len(self.__chunk):
+                chunk = self.__next_chunk()
+                if chunk is None:
+                    break
+                self.__chunk, self.__offset = chunk, 0
+                continue
+            end = len(self.__chunk) if size < 0 else min(len(self.__chunk), self.__offset + size)
+            parts.append(self.__chunk[self.__offset:end])
+            if size > 0:
+                size -= end - self.__offset
+            self.__offset = end
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+    def close(self):
+        self.__pool.shutdown(wait=False, cancel_futures=True)
+        self.__futures.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
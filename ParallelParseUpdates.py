@@ -0,0 +1,162 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+ParallelParseUpdates.py
+-----------------------
+The class in this file decodes many MRT files at once using a pool of worker
+processes and chains their updates back into a single stream, in the same
+format and order as parsing the files one after the other with
+`ParseUpdates`. Workers send each file back as the buffer of an
+`UpdateStore`, and update records are only rebuilt from it while the stream
+is consumed.
+"""
+
+from ParseUpdates import ParseUpdates
+from UpdateStore import UpdateStore
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import glob
+import io
+import os
+import time
+import logging
+
+
+def parse_file(filename, cache_dir=None, source=None):
+    """
+    Parses a single MRT file. Entry point of the worker processes.
+    :param filename: MRT file to be parsed.
+    :param cache_dir: Parsed-update cache directory passed to `ParseUpdates`.
+    :param source: `MrtSource` passed to `ParseUpdates`.
+    :return: (the file's updates as an `UpdateStore` buffer, see
+        `UpdateStore.write`, number of announcements, number of withdrawals).
+        Use `load_updates` to read the records back.
+    """
+    pu = ParseUpdates(filename=filename, cache_dir=cache_dir, source=source)
+    buffer = io.BytesIO()
+    pu.parse_updates_to_store().write(buffer)
+    return buffer.getvalue(), pu.n_announcements, pu.n_withdrawals
+
+
+def load_updates(buffer):
+    """
+    :param buffer: Buffer returned by `parse_file`.
+    :return: Generator yielding the update records of the file ordered by
+        timestamp, as `ParseUpdates.get_next_updates` does, without the final
+        record with a `None` timestamp. Records are built as they are
+        yielded.
+    """
+    store = UpdateStore.from_buffer(buffer)
+    if store is None:
+        raise ValueError("Unreadable update buffer")
+    for record in store.get_next_updates():
+        if record['timestamp'] is None:
+            return
+        yield record
+
+
+class ParallelParseUpdates:
+    """
+        Class for parsing several BGP MRT dumps in parallel.
+    """
+    def __init__(self, files, max_workers=None, max_pending=None, cache_dir=None, source=None):
+        """
+        :param files: A list of MRT files or a glob pattern such as
+        `./data/updates.20080224.*.bz2`. Files matched by a glob are sorted by
+        name, which for the files in `./data/` is chronological order.
+        Updates are yielded in the order of this list.
+        :param max_workers: Number of worker processes. Defaults to the number
+        of CPUs. With 1, files are parsed in this process.
+        :param max_pending: Maximum number of files decoded ahead of the
+        consumer. Bounds memory use. Defaults to twice max_workers.
+        :param cache_dir: Optional parsed-update cache directory, see
+        `ParseUpdates`.
+        :param source: Optional `MrtSource` used by the workers, see
+        `ParseUpdates`. It must be picklable.
+        self.n_announcements and self.n_withdrawals are the number of route
+        announcements and withdrawals seen across all files so far.
+        """
+        if isinstance(files, str):
+            files = sorted(glob.glob(files))
+        self.files = list(files)
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.cache_dir = cache_dir
+        self.source = source
+        self.n_announcements, self.n_withdrawals = 0, 0
+        self.time_to_parse = 0
+
+    def get_next_updates(self):
+        """
+        Yields the next collection of announcements and withdrawals across all
+        files: the records of every file, sorted by time, one file after the
+        other in the order of self.files. The stream is identical to parsing
+        each file serially with `ParseUpdates.stream_updates` and chaining the
+        results, whether or not the time ranges of the files overlap.
+        :return: Generator yielding the same records as
+            `ParseUpdates.get_next_updates`, including the final record with a
+            `None` timestamp.
+        """
+        start_time = time.time()
+        if self.max_workers == 1:
+            results = (parse_file(filename, self.cache_dir, self.source) for filename in self.files)
+            for record in self.__chain(results):
+                yield record
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                max_pending = self.max_pending or 2 * (self.max_workers or os.cpu_count() or 1)
+                for record in self.__chain(self.__bounded_map(pool, max_pending)):
+                    yield record
+
+        self.time_to_parse = time.time() - start_time
+        logging.info("Time taken to parse %d file(s): %d second(s)" % (len(self.files), self.time_to_parse))
+        logging.info("Routes announced: %d | Routes withdrawn: %d" % (self.n_announcements, self.n_withdrawals))
+        yield {'announcements': [], 'withdrawals': [], 'timestamp': None}
+
+    def __bounded_map(self, pool, max_pending):
+        """
+        Submits files to the pool keeping at most max_pending of them in
+        flight, and returns their results in submission order.
+        """
+        futures = deque()
+        files = iter(self.files)
+        for filename in files:
+            futures.append(pool.submit(parse_file, filename, self.cache_dir, self.source))
+            if len(futures) >= max_pending:
+                break
+        while futures:
+            result = futures.popleft().result()
+            for filename in files:
+                futures.append(pool.submit(parse_file, filename, self.cache_dir, self.source))
+                break
+            yield result
+
+    def __chain(self, results):
+        """
+        Yields the records of the per-file results, file by file. Only the
+        current file is held as records; the files decoded ahead are held as
+        compact `UpdateStore` buffers.
+        """
+        for buffer, n_announcements, n_withdrawals in results:
+            self.n_announcements += n_announcements
+            self.n_withdrawals += n_withdrawals
+            for record in load_updates(buffer):
+                yield record
+
+
+def main():
+    ppu = ParallelParseUpdates(files="./data/updates.20080219.0*.bz2")
+    updates = ppu.get_next_updates()
+    while True:
+        next_updates = updates.__next__()
+        if next_updates['timestamp'] is None:
+            logging.info("No more updates to process in %d file(s)" % len(ppu.files))
+            break
+        else:
+            logging.info("At timestamp: %d | %d announcements | %d withdrawals" % (next_updates['timestamp'],
+                                                                                   len(next_updates['announcements']),
+                                                                                   len(next_updates['withdrawals'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,21 +10,40 @@ about announced and withdrawn routes. You will then use this information to
 build your routing table.
 """
 
-import ipaddress
 import mrtparse
 import json
 import time
 import logging
+import heapq
+import hashlib
+import os
+from UpdateStore import UpdateStore
+from FastMrtDecoder import FastMrtDecoder
+from Metrics import Metrics
 
 
 class ParseUpdates:
     """
         Class for parsing updates recorded in BGP MRT dumps.
     """
-    def __init__(self, filename):
+    def __init__(self, filename, cache_dir=None, fast_decoder=True, metrics=None, source=None):
         """
         :param filename: This is the MRT file to be parsed by the methods in
         this class. Sample files can be found in `./data/`.
+        :param cache_dir: Optional directory holding parsed-update cache files.
+        When set, the decoded updates are saved there the first time the file
+        is parsed and later parses memory-map the cache instead of decoding
+        the MRT file. Cache files are named after the SHA-1 of the MRT file's
+        contents, so a changed file is never served from a stale cache.
+        :param fast_decoder: If True, BGP4MP UPDATE records are decoded by
+        `FastMrtDecoder` and only other records go through mrtparse. If
+        False, every record is decoded by mrtparse.
+        :param metrics: Optional `Metrics` recording the decompress, decode,
+        build_records and cache_load stages. Decoding by mrtparse includes
+        its decompression, which is then not recorded separately.
+        :param source: Optional `MrtSource` supplying the decompressed bytes
+        of the file, e.g. a `ParallelBz2Source` or an `MmapMrtSource`. By
+        default the file is decompressed on the decoding thread.
         self.announcements and self.withdrawals are dictionaries that are keyed
         by timestamps and contain the list of all BGP route announcements and
         withdrawals at each timestamp.
@@ -39,7 +58,12 @@ class ParseUpdates:
         }
         self.n_announcements, self.n_withdrawals = 0, 0
         self.time_to_parse = 0
-
+        self.cache_dir = cache_dir
+        self.fast_decoder = fast_decoder
+        self.source = source
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.metrics.instrument(self, {'_ParseUpdates__announcement_records': 'build_records',
+                                       '_ParseUpdates__withdrawal_records': 'build_records'})
 
     def parse_updates(self):
         """
@@ -51,14 +75,12 @@ class ParseUpdates:
         `__parse_withdrawal_updates` methods with these parameters.
         :return: True if parsing was completed successfully. False otherwise.
         """
-            
+        if self.cache_dir is not None:
+            return self.__parse_updates_from_store()
+
         start_time = time.time()
 
-        for entry in mrtparse.Reader(self.filename):
-            entry_data = entry.data
-            entry_timestamp = entry_data['timestamp']
-            entry_source_peer = entry_data['peer_as']
-            entry_bgpMessage = entry_data['bgp_message']
+        for entry_timestamp, entry_source_peer, entry_bgpMessage in self.__messages():
             self.__parse_announcement_updates(entry_timestamp, entry_source_peer, entry_bgpMessage)
             self.__parse_withdrawal_updates(entry_timestamp, entry_source_peer, entry_bgpMessage)
 
@@ -71,6 +93,33 @@ class ParseUpdates:
         logging.info("Routes announced: %d | Routes withdrawn: %d" % (self.n_announcements, self.n_withdrawals))
         return True
 
+    def __messages(self):
+        """
+        Yields (timestamp, peer_as, bgp_message) for every BGP message in
+        self.filename that could be decoded, using `FastMrtDecoder` or
+        mrtparse depending on self.fast_decoder.
+        """
+        if self.fast_decoder:
+            decoder = FastMrtDecoder(self.filename, metrics=self.metrics, source=self.source)
+            for message in self.metrics.wrap_iter(decoder, 'decode'):
+                yield message
+            return
+
+        reader = mrtparse.Reader(self.filename if self.source is None else self.source.open(self.filename))
+        try:
+            for entry in self.metrics.wrap_iter(reader, 'decode'):
+                if entry.err_msg is not None:
+                    logging.warning("Skipping undecodable record in %s: %s" % (self.filename, entry.err_msg))
+                    # The reader is also the entry, and mrtparse never
+                    # clears the error of a previous record.
+                    entry.err, entry.err_msg = None, None
+                    continue
+                entry_data = entry.data
+                if 'bgp_message' in entry_data:
+                    yield entry_data['timestamp'], entry_data['peer_as'], entry_data['bgp_message']
+        finally:
+            reader.f.close()
+
     def __parse_announcement_updates(self, timestamp, peer_as, bgp_message):
         """
         Checkpoint ID: 1 [1 points]
@@ -96,9 +145,28 @@ class ParseUpdates:
         :param bgp_message: BGP message containing all updates.
         :return: True if announcements were properly recorded. False otherwise.
         """
-        ###        
-        update = {}
-        CIDR = []
+        ###
+        for update in self.__announcement_records(timestamp, peer_as, bgp_message):
+            time = timestamp[0]
+            if time not in self.announcements:
+                self.announcements.update( {time : []})
+            self.announcements[time].append(update)
+            self.n_announcements = self.n_announcements + 1
+
+        return True
+
+    def __announcement_records(self, timestamp, peer_as, bgp_message):
+        """
+        Builds the announcement records carried by a single bgp_message
+        without storing them anywhere. Shared by `parse_updates` and
+        `stream_updates`.
+        :param timestamp: Timestamp obtained from the BGP header.
+        :param peer_as: Peer AS obtained from the BGP header.
+        :param bgp_message: BGP message containing all updates.
+        :return: List of announcement dictionaries (see
+            `__parse_announcement_updates` for the format).
+        """
+        records = []
         as_path_data = []
         next_hop_data = []
 
@@ -119,17 +187,9 @@ class ParseUpdates:
                 'peer_as' : peer_as,
                 'as_path' : as_path_data
             }
-                time = timestamp[0]
-                if time not in self.announcements:
-                    self.announcements.update( {time : []})
-                    self.announcements[time].append(update)
-
-                else:
-                    self.announcements[time].append(update)
-                self.n_announcements = self.n_announcements + 1
+                records.append(update)
 
-
-        return True
+        return records
 
     def __parse_withdrawal_updates(self, timestamp, peer_as, bgp_message):
         """
@@ -154,27 +214,37 @@ class ParseUpdates:
         :return: True if announcements were properly recorded. False otherwise.
         """
         ###
-        update = {}
-        CIDR = []
+        for update in self.__withdrawal_records(timestamp, peer_as, bgp_message):
+            self.n_withdrawals = 1 + self.n_withdrawals
+            time = timestamp[0]
 
-        if bgp_message['withdrawn_routes'] != []:
-            for item in bgp_message['withdrawn_routes']:
-                self.n_withdrawals = 1 + self.n_withdrawals
-                update = {
-                'timestamp' : timestamp,
-                'range' : item,
-                'peer_as' : peer_as,
-                }
-                time = timestamp[0]
+            if time not in self.withdrawals:
+                self.withdrawals.update( {time : []})
+            self.withdrawals[time].append(update)
 
-                if time not in self.withdrawals:
-                    self.withdrawals.update( {time : []})
-                    self.withdrawals[time].append(update)
-                else:
-                    self.withdrawals[time].append(update)
+        return True
 
+    def __withdrawal_records(self, timestamp, peer_as, bgp_message):
+        """
+        Builds the withdrawal records carried by a single bgp_message
+        without storing them anywhere. Shared by `parse_updates` and
+        `stream_updates`.
+        :param timestamp: Timestamp obtained from the BGP header.
+        :param peer_as: Peer AS obtained from the BGP header.
+        :param bgp_message: BGP message containing all updates.
+        :return: List of withdrawal dictionaries (see
+            `__parse_withdrawal_updates` for the format).
+        """
+        records = []
+        for item in bgp_message['withdrawn_routes']:
+            update = {
+            'timestamp' : timestamp,
+            'range' : item,
+            'peer_as' : peer_as,
+            }
+            records.append(update)
 
-        return True
+        return records
 
     def get_next_updates(self):
         """
@@ -193,18 +263,196 @@ class ParseUpdates:
             yield update_record
         yield {'announcements': [], 'withdrawals': [], 'timestamp': None}
 
+    def stream_updates(self, reorder_window=0):
+        """
+        Streaming counterpart of `parse_updates` followed by
+        `get_next_updates`. Records are decoded from the MRT file and grouped
+        by timestamp while the file is still being read. A group is yielded as
+        soon as a record more than `reorder_window` seconds newer has been
+        seen, so `self.announcements` and `self.withdrawals` are never
+        populated and only the pending groups are held in memory.
+        n_announcements, n_withdrawals and time_to_parse are still updated.
+        :param reorder_window: Number of seconds a timestamp is held back to
+            absorb records that arrive slightly out of order. Records older
+            than an already yielded timestamp are yielded in their own group.
+        :return: Generator yielding the same records as `get_next_updates`,
+            including the final record with a `None` timestamp.
+        """
+        if self.cache_dir is not None:
+            for update_record in self.parse_updates_to_store().get_next_updates():
+                yield update_record
+            return
+
+        start_time = time.time()
+        pending = {}
+        pending_timestamps = []
+        latest = None
+
+        for entry_timestamp, entry_source_peer, entry_bgpMessage in self.__messages():
+            announcements = self.__announcement_records(entry_timestamp, entry_source_peer, entry_bgpMessage)
+            withdrawals = self.__withdrawal_records(entry_timestamp, entry_source_peer, entry_bgpMessage)
+            self.n_announcements = self.n_announcements + len(announcements)
+            self.n_withdrawals = self.n_withdrawals + len(withdrawals)
+            if not announcements and not withdrawals:
+                continue
+
+            timestamp = entry_timestamp[0]
+            if timestamp not in pending:
+                pending[timestamp] = {'announcements': [], 'withdrawals': [], 'timestamp': timestamp}
+                heapq.heappush(pending_timestamps, timestamp)
+            pending[timestamp]['announcements'].extend(announcements)
+            pending[timestamp]['withdrawals'].extend(withdrawals)
+
+            if latest is None or timestamp > latest:
+                latest = timestamp
+            while pending_timestamps and pending_timestamps[0] < latest - reorder_window:
+                yield pending.pop(heapq.heappop(pending_timestamps))
+
+        while pending_timestamps:
+            yield pending.pop(heapq.heappop(pending_timestamps))
+
+        self.time_to_parse = time.time() - start_time
+        logging.info("Time taken to stream all records: %d second(s)" % self.time_to_parse)
+        logging.info("Routes announced: %d | Routes withdrawn: %d" % (self.n_announcements, self.n_withdrawals))
+        yield {'announcements': [], 'withdrawals': [], 'timestamp': None}
+
+    def parse_updates_to_store(self):
+        """
+        Columnar counterpart of `parse_updates`. Reads the MRT file and
+        records every announcement and withdrawal as a row of an
+        `UpdateStore` instead of building one dictionary per NLRI. If
+        self.cache_dir is set, the store is loaded from the cache when
+        possible and saved to it otherwise.
+        self.announcements and self.withdrawals are left untouched;
+        n_announcements, n_withdrawals and time_to_parse are updated.
+        :return: The populated `UpdateStore`.
+        """
+        start_time = time.time()
+        store = None
+        if self.cache_dir is not None:
+            with self.metrics.timer('cache_load'):
+                store = UpdateStore.load(self.cache_path())
+        if store is None:
+            store = self.__decode_to_store()
+            if self.cache_dir is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                store.save(self.cache_path())
+        else:
+            logging.info("Loaded parsed updates for %s from cache" % self.filename)
+
+        self.n_announcements += store.n_announcements
+        self.n_withdrawals += store.n_withdrawals
+        self.time_to_parse = time.time() - start_time
+        logging.info("Time taken to parse all records: %d second(s)" % self.time_to_parse)
+        logging.info("Routes announced: %d | Routes withdrawn: %d" % (self.n_announcements, self.n_withdrawals))
+        return store
+
+    def cache_path(self):
+        """
+        :return: Location of the cache file for self.filename inside
+            self.cache_dir, named after the SHA-1 of the file's contents.
+        """
+        digest = hashlib.sha1()
+        with open(self.filename, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b''):
+                digest.update(chunk)
+        return os.path.join(self.cache_dir, "%s.upd" % digest.hexdigest())
+
+    def stream_update_stores(self, max_rows=65536):
+        """
+        Bounded-memory counterpart of `parse_updates_to_store`. Decodes the
+        MRT file into a sequence of `UpdateStore` blocks, so only one block
+        is held in memory at a time. A block is closed after the BGP message
+        that brings it to max_rows rows, so it can exceed max_rows by the
+        updates of that one message. Rows keep
+        the order of the MRT file and are not sorted by time. If
+        self.cache_dir is set and the file is cached, the whole cached store
+        is yielded instead; it is memory-mapped rather than read into memory.
+        n_announcements and n_withdrawals are updated as blocks are yielded.
+        :param max_rows: Number of rows after which a decoded block is
+            closed.
+        :return: Generator yielding non-empty `UpdateStore` blocks.
+        """
+        store = None
+        if self.cache_dir is not None:
+            with self.metrics.timer('cache_load'):
+                store = UpdateStore.load(self.cache_path())
+        stores = [store] if store is not None else self.__decode_to_stores(max_rows)
+        for store in stores:
+            if not len(store):
+                continue
+            self.n_announcements += store.n_announcements
+            self.n_withdrawals += store.n_withdrawals
+            yield store
+
+    def __decode_to_store(self):
+        """
+        Decodes the MRT file into a new `UpdateStore`.
+        """
+        return next(self.__decode_to_stores())
+
+    def __decode_to_stores(self, max_rows=None):
+        """
+        Decodes the MRT file into `UpdateStore` blocks, starting a new block
+        once one holds max_rows rows. The last block is always yielded, even
+        if it is empty.
+        """
+        store = UpdateStore()
+        for timestamp, peer_as, bgp_message in self.__messages():
+            nlri = bgp_message['nlri']
+            if nlri:
+                as_path_data = []
+                next_hop_data = []
+                for item in bgp_message['path_attributes']:
+                    if item['type'][1] == 'AS_PATH':
+                        as_path_data.append(item['value'])
+                    if item['type'][1] == 'NEXT_HOP':
+                        next_hop_data.append(item['value'])
+                as_path_id = store.intern_as_path(as_path_data)
+                next_hop_id = store.intern_next_hop(next_hop_data)
+                for item in nlri:
+                    store.add_announcement(timestamp, peer_as, item['prefix'], item['prefix_length'], as_path_id,
+                                           next_hop_id)
+            for item in bgp_message['withdrawn_routes']:
+                store.add_withdrawal(timestamp, peer_as, item['prefix'], item['prefix_length'])
+            if max_rows is not None and len(store) >= max_rows:
+                yield store
+                store = UpdateStore()
+        yield store
+
+    def __parse_updates_from_store(self):
+        """
+        Fills self.announcements and self.withdrawals from the (possibly
+        cached) `UpdateStore` for self.filename. Used by `parse_updates` when
+        self.cache_dir is set.
+        :return: True if parsing was completed successfully.
+        """
+        store = self.parse_updates_to_store()
+        for row in range(len(store)):
+            update = store.record(row)
+            time = update['timestamp'][0]
+            updates = self.withdrawals if store.is_withdrawal[row] else self.announcements
+            if time not in updates:
+                updates[time] = []
+            updates[time].append(update)
+        return True
+
     def to_json_helper_function(self, destination_json):
         """
         This is a helper function that converts the MRT file saved in
-        `self.filename` to a JSON file and saves it to disk.
+        `self.filename` to a JSON file and saves it to disk. Entries are
+        written as they are decoded, so the file is never held in memory.
+        `UpdateExporter` writes the parsed updates of many files as
+        compressed NDJSON or columnar files instead.
         :param destination_json: The location at which to save the converted
         JSON file.
         """
-        records = []
-        for entry in mrtparse.Reader(self.filename):
-            records.append(entry.data)
         with open(destination_json, "w") as fp:
-            json.dump(obj=records, fp=fp, indent=2, sort_keys=False)
+            fp.write("[")
+            for n_entries, entry in enumerate(mrtparse.Reader(self.filename)):
+                fp.write(",\n" if n_entries else "\n")
+                fp.write(json.dumps(entry.data, indent=2, sort_keys=False))
+            fp.write("\n]")
 
 
 def main():
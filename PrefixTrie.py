@@ -0,0 +1,320 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+PrefixTrie.py
+-------------
+The class in this file is a path-compressed binary (Patricia) trie over IPv4
+prefixes. Prefixes are the (network address as an integer, prefix length)
+keys used by `RoutingTable`. Insertion, removal, exact lookup and the search
+for every prefix covering an address all take at most 32 steps, however many
+prefixes are stored.
+"""
+
+class _Empty:
+    """
+        Value of nodes that do not store a prefix. There is a single instance,
+        which is preserved by copying and pickling.
+    """
+    __slots__ = ()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return '_EMPTY'
+
+
+_EMPTY = _Empty()
+
+
+class _Node:
+    __slots__ = ('prefix', 'length', 'value', 'children')
+
+    def __init__(self, prefix, length, value=_EMPTY):
+        self.prefix = prefix
+        self.length = length
+        self.value = value
+        self.children = [None, None]
+
+
+def _bit(prefix, position):
+    """
+    :return: The bit of prefix at position, counted from the most significant
+        bit (position 0).
+    """
+    return (prefix >> (31 - position)) & 1
+
+
+def _covers(node, prefix, length):
+    """
+    :return: True if the range of node contains the range (prefix, length).
+    """
+    return node.length <= length and ((node.prefix ^ prefix) >> (32 - node.length)) == 0
+
+
+class PrefixTrie:
+    """
+        Class for indexing IPv4 prefixes for longest prefix matching.
+    """
+    def __init__(self):
+        """
+        The root node stands for 0.0.0.0/0 and is always present. Nodes
+        without a value are branching points created by path compression.
+        self.version is incremented whenever a prefix is added or removed,
+        so structures derived from the set of prefixes can tell when they
+        are stale.
+        """
+        self.__root = _Node(0, 0)
+        self.__size = 0
+        self.version = 0
+
+    def __len__(self):
+        return self.__size
+
+    def __contains__(self, key):
+        node = self.__find(key)
+        return node is not None and node.value is not _EMPTY
+
+    def __iter__(self):
+        for key, value in self.items():
+            yield key
+
+    def get(self, key, default=None):
+        """
+        :param key: (network, prefix length) tuple.
+        :return: The value stored for exactly key, or default.
+        """
+        node = self.__find(key)
+        if node is None or node.value is _EMPTY:
+            return default
+        return node.value
+
+    def __find(self, key):
+        prefix, length = key
+        node = self.__root
+        while node is not None and _covers(node, prefix, length):
+            if node.length == length:
+                return node
+            node = node.children[_bit(prefix, node.length)]
+        return None
+
+    def insert(self, key, value=None):
+        """
+        Stores value under key, replacing any value already stored for it.
+        :param key: (network, prefix length) tuple. Bits of network beyond
+            the prefix length must be zero.
+        :param value: Value to be stored.
+        """
+        prefix, length = key
+        node = self.__root
+        while True:
+            if node.length == length:
+                if node.value is _EMPTY:
+                    self.__size += 1
+                    self.version += 1
+                node.value = value
+                return
+            bit = (prefix >> (31 - node.length)) & 1
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _Node(prefix, length, value)
+                self.__size += 1
+                self.version += 1
+                return
+            common = min(child.length, length, 32 - (child.prefix ^ prefix).bit_length())
+            if common == child.length:
+                node = child
+                continue
+            if common == length:
+                new_node = _Node(prefix, length, value)
+                new_node.children[_bit(child.prefix, length)] = child
+            else:
+                new_node = _Node(prefix & ~(0xffffffff >> common) & 0xffffffff, common)
+                new_node.children[_bit(child.prefix, common)] = child
+                new_node.children[_bit(prefix, common)] = _Node(prefix, length, value)
+            node.children[bit] = new_node
+            self.__size += 1
+            self.version += 1
+            return
+
+    @classmethod
+    def from_sorted(cls, items):
+        """
+        Builds a trie from (key, value) tuples given in the order of
+        `items`: ascending network address, with a prefix before the
+        prefixes it contains. Only the rightmost path of the trie is
+        visited, so each prefix is added in amortised constant time.
+        :param items: Iterable of sorted (key, value) tuples without
+            duplicate keys.
+        :return: The new `PrefixTrie`.
+        """
+        trie = cls()
+        stack = [trie.__root]
+        for (prefix, length), value in items:
+            while not _covers(stack[-1], prefix, length):
+                stack.pop()
+            node = stack[-1]
+            if node.length == length:
+                if node.value is not _EMPTY:
+                    raise ValueError("Duplicate prefix %d/%d" % (prefix, length))
+                node.value = value
+                trie.__size += 1
+                continue
+            bit = _bit(prefix, node.length)
+            child = node.children[bit]
+            new_node = _Node(prefix, length, value)
+            if child is not None:
+                common = min(length, 32 - (child.prefix ^ prefix).bit_length())
+                if common == length or prefix < child.prefix:
+                    raise ValueError("Prefixes are not sorted")
+                branch = _Node(prefix & ~(0xffffffff >> common) & 0xffffffff, common)
+                branch.children[0] = child
+                branch.children[1] = new_node
+                node.children[bit] = branch
+                stack.append(branch)
+            else:
+                node.children[bit] = new_node
+            stack.append(new_node)
+            trie.__size += 1
+        trie.version += 1
+        return trie
+
+    def remove(self, key):
+        """
+        Removes key and prunes the branching nodes that are no longer needed.
+        :param key: (network, prefix length) tuple.
+        :return: True if key was stored. False otherwise.
+        """
+        prefix, length = key
+        path = []
+        node = self.__root
+        while node is not None and _covers(node, prefix, length) and node.length != length:
+            bit = _bit(prefix, node.length)
+            path.append((node, bit))
+            node = node.children[bit]
+        if node is None or not _covers(node, prefix, length) or node.value is _EMPTY:
+            return False
+
+        node.value = _EMPTY
+        self.__size -= 1
+        self.version += 1
+        if not path:
+            return True
+        children = [child for child in node.children if child is not None]
+        parent, bit = path[-1]
+        if len(children) == 1:
+            parent.children[bit] = children[0]
+        elif not children:
+            parent.children[bit] = None
+            if len(path) > 1 and parent.value is _EMPTY:
+                grandparent, parent_bit = path[-2]
+                grandparent.children[parent_bit] = parent.children[1 - bit]
+        return True
+
+    def covering(self, key):
+        """
+        Finds every stored prefix whose range contains key.
+        :param key: (network, prefix length) tuple. Use a prefix length of 32
+            to look up a single address.
+        :return: List of (key, value) tuples in decreasing order of prefix
+            length, i.e. the longest prefix match first.
+        """
+        prefix, length = key
+        result = []
+        node = self.__root
+        while node is not None and _covers(node, prefix, length):
+            if node.value is not _EMPTY:
+                result.append(((node.prefix, node.length), node.value))
+            if node.length == length:
+                break
+            node = node.children[_bit(prefix, node.length)]
+        result.reverse()
+        return result
+
+    def longest_match(self, key):
+        """
+        :param key: (network, prefix length) tuple.
+        :return: (key, value) of the longest stored prefix containing key, or
+            None if there is none.
+        """
+        prefix, length = key
+        match = None
+        node = self.__root
+        while node is not None and _covers(node, prefix, length):
+            if node.value is not _EMPTY:
+                match = node
+            if node.length == length:
+                break
+            node = node.children[_bit(prefix, node.length)]
+        if match is None:
+            return None
+        return (match.prefix, match.length), match.value
+
+    def family(self, key):
+        """
+        Finds the prefixes directly above and below key in a single walk.
+        The cost is 32 steps plus the number of children found.
+        :param key: (network, prefix length) tuple. It does not need to be
+            stored.
+        :return: (parent, children). parent is the (key, value) of the
+            longest stored prefix strictly containing key, or None. children
+            is the list of (key, value) of the stored prefixes strictly
+            contained in key and not contained in any other such prefix,
+            i.e. the prefixes whose parent is key or would be key if it were
+            stored.
+        """
+        prefix, length = key
+        parent = None
+        node = self.__root
+        while node is not None and node.length < length:
+            if ((node.prefix ^ prefix) >> (32 - node.length)) != 0:
+                node = None
+                break
+            if node.value is not _EMPTY:
+                parent = node
+            node = node.children[(prefix >> (31 - node.length)) & 1]
+        if parent is not None:
+            parent = (parent.prefix, parent.length), parent.value
+
+        children = []
+        if node is None or ((node.prefix ^ prefix) >> (32 - length)) != 0:
+            return parent, children
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.value is not _EMPTY and node.length > length:
+                children.append(((node.prefix, node.length), node.value))
+                continue
+            for child in node.children:
+                if child is not None:
+                    stack.append(child)
+        return parent, children
+
+    def items(self, within=None):
+        """
+        Yields stored (key, value) tuples in ascending order of network
+        address. A prefix is always yielded before the prefixes it contains.
+        :param within: Optional (network, prefix length) tuple. If given,
+            only prefixes contained in it (including itself) are yielded.
+        """
+        node = self.__root
+        if within is not None:
+            prefix, length = within
+            while node is not None and node.length < length:
+                if not _covers(node, prefix, length):
+                    return
+                node = node.children[_bit(prefix, node.length)]
+            if node is None or not _covers(_Node(prefix, length), node.prefix, node.length):
+                return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.value is not _EMPTY:
+                yield (node.prefix, node.length), node.value
+            if node.children[1] is not None:
+                stack.append(node.children[1])
+            if node.children[0] is not None:
+                stack.append(node.children[0])
@@ -11,30 +11,189 @@ announcing AS), and compress your routing table by merging together equivalent
 entries.
 """
 
-from typing import Annotated
 from ParseUpdates import ParseUpdates
+from UpdateStore import UpdateStore, pack_prefix, unpack_prefix, as_path_key
+from PrefixTrie import PrefixTrie
+from InternTable import InternTable
+from Metrics import Metrics, uninstrumented_state
 import sys
 import ipaddress
 import time
 import logging
-from collections import Counter
-import sys
+import heapq
 if sys.version_info[0] >= 3:
     unicode = str
 
+SNAPSHOT_VERSION = 1
+# Stage of every method timed by an enabled `Metrics`. The per-route helpers
+# are left out: timing them would cost more than they do.
+TIMED_METHODS = {
+    'apply_announcement': 'apply_announcement',
+    'apply_withdrawal': 'apply_withdrawal',
+    'collapse_routing_table': 'collapse',
+    'measure_reachability': 'reachability',
+    'find_path_to_destination': 'lookup',
+    'find_routes_batch': 'lookup_batch',
+    'replay': 'replay',
+}
+
 root = logging.getLogger()
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(filename)s:%(lineno)-4d: %(message)s',
                     datefmt='%m-%d %H:%M', filename="a3-bgp.log", filemode="w")
 
 
+def prefix_key(prefix, prefix_length):
+    """
+    Builds the key under which a destination range is stored in
+    `RoutingTable.routing_table`.
+    :param prefix: Network address of the range as a dotted quad string.
+    :param prefix_length: Prefix length of the range.
+    :return: (network address as an unsigned 32-bit integer, prefix length).
+    """
+    return pack_prefix(prefix), prefix_length
+
+
+def network_to_key(network):
+    """
+    :param network: An `ipaddress.IPv4Network` or a CIDR string.
+    :return: The routing table key for network.
+    """
+    network = ipaddress.ip_network(network)
+    return int(network.network_address), network.prefixlen
+
+
+def key_to_network(key):
+    """
+    :param key: A routing table key.
+    :return: The range described by key as an `ipaddress.IPv4Network`.
+    """
+    return ipaddress.IPv4Network(key)
+
+
+def as_path_of(entry):
+    """
+    :param entry: A routing table entry or announcement.
+    :return: The list of AS numbers of the last segment of its AS path, the
+        path used to compare and report routes.
+    """
+    path = []
+    for item in entry['as_path']:
+        for node in item:
+            path = node['value']
+    return path
+
+
+def path_ases(entry):
+    """
+    :param entry: A routing table entry or announcement.
+    :return: The set of every AS number on its AS path, across all segments
+        and AS_PATH attributes.
+    """
+    return set(asn for item in entry['as_path'] for node in item for asn in node['value'])
+
+
+def origin_as(entry):
+    """
+    :param entry: A routing table entry or announcement.
+    :return: The AS that originated the route (the last AS of its AS path),
+        or None if the AS path is empty.
+    """
+    path = as_path_of(entry)
+    return path[-1] if path else None
+
+
+def route_description(key, entry):
+    """
+    :param key: A routing table key.
+    :param entry: The routing table entry stored for key.
+    :return: The route in the format returned by
+        `RoutingTable.find_path_to_destination`.
+    """
+    return {
+        'prefix_len': key[1],
+        'as_path': as_path_of(entry),
+        'next_hop': entry['next_hop'],
+        'source_as': entry['peer_as']
+    }
+
+
+def key_contains(outer, inner):
+    """
+    :param outer: A routing table key.
+    :param inner: A routing table key.
+    :return: True if the range of inner is contained in the range of outer.
+    """
+    shift = 32 - outer[1]
+    return outer[1] <= inner[1] and (outer[0] >> shift) == (inner[0] >> shift)
+
+
+def replay_position(table, mrt_files):
+    """
+    Finds where a table that has applied part of mrt_files, as recorded in
+    its last_applied_file and last_applied_timestamp attributes, carries on
+    replaying them.
+    :param table: `RoutingTable` or `ShardedRoutingTable`.
+    :param mrt_files: List of MRT files in chronological order.
+    :return: (list of the files still to be replayed, timestamp up to which
+        the updates of the first of them have already been applied or None).
+    :raises ValueError: If the table has applied updates of a file that is
+        not in mrt_files. Replaying all of mrt_files would apply updates a
+        second time, so a table continuing with new files must be given its
+        last applied file first.
+    """
+    mrt_files = list(mrt_files)
+    if table.last_applied_file is None:
+        return mrt_files, None
+    if table.last_applied_file not in mrt_files:
+        raise ValueError("The table has applied updates up to %d of %s, which is not in the files to replay" %
+                         (table.last_applied_timestamp, table.last_applied_file))
+    return mrt_files[mrt_files.index(table.last_applied_file):], table.last_applied_timestamp
+
+
+def replay_updates(table, mrt_files, skip_until=None, cache_dir=None):
+    """
+    Yields the update records of mrt_files for `replay`, file by file, and
+    records the replay position in table once each record has been applied,
+    i.e. when the next one is requested.
+    :param table: `RoutingTable` or `ShardedRoutingTable`.
+    :param mrt_files: Files returned by `replay_position`.
+    :param skip_until: Timestamp returned by `replay_position`. The records
+        of the first file up to this timestamp are skipped.
+    :param cache_dir: Parsed-update cache directory passed to `ParseUpdates`.
+    :return: Generator yielding the records of `ParseUpdates.stream_updates`,
+        without the final record with a `None` timestamp.
+    """
+    for filename in mrt_files:
+        pu = ParseUpdates(filename=filename, cache_dir=cache_dir)
+        for next_updates in pu.stream_updates():
+            if next_updates['timestamp'] is None:
+                break
+            if skip_until is not None and next_updates['timestamp'] <= skip_until:
+                continue
+            yield next_updates
+            table.last_applied_file = filename
+            table.last_applied_timestamp = next_updates['timestamp']
+        skip_until = None
+
+
 class RoutingTable:
     """
         Class for updating routing tables.
     """
-    def __init__(self):
+    def __init__(self, metrics=None):
         """
+        :param metrics: Optional `Metrics` recording the apply_announcement,
+        apply_withdrawal, collapse, reachability, lookup, lookup_batch and
+        replay stages, see TIMED_METHODS. Available as self.metrics.
         self.routing_table is a dictionary keyed by destination IP range and
-        contains the shortest route available to reach that range.
+        contains the shortest route available to reach that range. Ranges
+        are keyed by (network address as an integer, prefix length) tuples,
+        see `prefix_key`; use `key_to_network` and `network_to_key` to
+        convert from and to `ipaddress` objects.
+        self.prefix_index is a `PrefixTrie` holding every key of
+        self.routing_table. It is kept in sync by the methods of this class
+        and used for longest prefix matching, so entries must not be added
+        to or removed from self.routing_table directly.
         self.time_of_earliest_update and self.time_of_latest_update are the
         first and last timestamps of the updates that were used to construct
         self.routing_table.
@@ -43,14 +202,68 @@ class RoutingTable:
         self.total_paths_changed is the number of times you either updated
         any entry in the routing table with a shorter path from another
         announcement or removed an entry from the routing table.
+        self.as_paths and self.next_hops are `InternTable`s holding every
+        AS path and next hop in use once, keyed by nested tuples (see
+        `as_path_key`). Routes refer to them by id, and the entries of
+        self.routing_table share the interned lists.
+        self.adj_rib_in is a dictionary keyed like self.routing_table. For
+        every range it maps each peer AS to that peer's current route as an
+        (AS path length, sequence number, AS path id, next hop id, timestamp)
+        tuple; entries are only built for the routes installed in
+        self.routing_table. The sequence number records when the peer's
+        route appeared and is kept when the peer re-announces the range, so
+        among equally short paths the oldest route stays selected. For every
+        range, self.__candidates holds a heap
+        of (AS path length, sequence number, peer AS) tuples; entries no
+        longer matching self.adj_rib_in are discarded lazily when they reach
+        the top, so re-selecting the best route costs O(log k) for k peers.
         self.reachability is the number of unique IP addresses that you have
         a path to using this routing table.
+        For every range in the table, self.__route_ids holds the (peer AS,
+        AS path id, next hop id) of its route, so routes are compared with
+        a tuple comparison instead of comparing their AS paths.
+        self.reachability and the set of redundant entries, the entries
+        `collapse_routing_table` would remove, are kept up to date as ranges
+        are installed and removed, so `statistics` answers in O(1). An entry
+        is redundant exactly when it has the same route as the closest
+        range containing it, so a change to one range only affects that
+        range and the ranges directly below it, see `PrefixTrie.family`.
+        self.prefixes_by_origin and self.prefixes_by_as are inverted indexes
+        of self.routing_table, kept up to date with it. They map an AS number
+        to the set of keys whose route is originated by that AS, see
+        `origin_as`, and whose AS path contains that AS anywhere, see
+        `path_ases`. Use `prefixes_originated_by` and `prefixes_through`.
+        self.last_applied_file and self.last_applied_timestamp record how
+        far `replay` has got: the file holding the last applied update and
+        its timestamp. They are saved in snapshots so a restored table can
+        carry on replaying where it stopped.
         All these parameters will be updated as you complete checkpoints 3-5.
         """
         self.routing_table = {}
+        self.prefix_index = PrefixTrie()
+        self.__flat_fib = None
+        self.as_paths, self.next_hops = InternTable(), InternTable()
+        self.__path_info = []
+        self.__recently_interned = {}
+        self.adj_rib_in = {}
+        self.__candidates = {}
+        self.__route_ids = {}
+        self.__route_sequence = 0
         self.time_of_earliest_update, self.time_of_latest_update = sys.maxsize, 0
         self.total_updates_received, self.total_paths_changed = 0, 0
         self.reachability = 0
+        self.__redundant = set()
+        self.prefixes_by_origin, self.prefixes_by_as = {}, {}
+        self.last_applied_file, self.last_applied_timestamp = None, 0
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.metrics.instrument(self, TIMED_METHODS)
+
+    def __getstate__(self):
+        return uninstrumented_state(self, TIMED_METHODS)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.metrics.instrument(self, TIMED_METHODS)
 
     def apply_announcement(self, announcement):
         """
@@ -79,8 +292,7 @@ class RoutingTable:
         """
         ###
         timestamp = announcement['timestamp'][0]
-        temp = ( str(announcement['range']['prefix']) + '/' + str(announcement['range']['prefix_length']) )
-        full_ip = ipaddress.ip_network(temp)
+        full_ip = prefix_key(announcement['range']['prefix'], announcement['range']['prefix_length'])
 
 
         self.total_updates_received = self.total_updates_received + 1
@@ -93,26 +305,23 @@ class RoutingTable:
             self.time_of_latest_update = timestamp
 
 
-        if full_ip not in self.routing_table:
-            self.routing_table.update( {full_ip : announcement})
-
-        if full_ip in self.routing_table:
-            for item in announcement['as_path']:
-                for node in item:
-                    path = node['value']
-        
-            temp = self.routing_table[full_ip]['as_path']
-            for x in temp:
-                for y in x:
-                    curr_path = y['value']
-                
-
-            if (len(path) < len(curr_path)):
-                self.total_paths_changed = self.total_paths_changed + 1
-                self.routing_table.update({full_ip : announcement})
-        
-        
-
+        peer = sys.intern(announcement['peer_as'])
+        path_id, hop_id = self.__intern_route(announcement['as_path'], announcement['next_hop'])
+        length = self.__path_info[path_id][0]
+        routes = self.adj_rib_in.setdefault(full_ip, {})
+        current = routes.get(peer)
+        if current is None:
+            self.__route_sequence = self.__route_sequence + 1
+            sequence = self.__route_sequence
+        else:
+            sequence = current[1]
+        routes[peer] = (length, sequence, path_id, hop_id, announcement['timestamp'])
+        if current is not None:
+            self.__release_route(current)
+        if current is None or current[0] != length:
+            heapq.heappush(self.__candidates.setdefault(full_ip, []), (length, sequence, peer))
+        self.__select_best_route(full_ip)
+        return True
         ###
 
     def apply_withdrawal(self, withdrawal):
@@ -137,22 +346,255 @@ class RoutingTable:
         """
         ###
         timestamp = withdrawal['timestamp'][0]
-        temp = ( str(withdrawal['range']['prefix']) + '/' + str(withdrawal['range']['prefix_length']) )
-        full_ip = ipaddress.ip_network(temp)
+        full_ip = prefix_key(withdrawal['range']['prefix'], withdrawal['range']['prefix_length'])
 
         w_source = withdrawal['peer_as']
         self.total_updates_received = self.total_updates_received + 1
 
-        if full_ip in self.routing_table:
-            a_source = self.routing_table[full_ip]['peer_as']
-            if w_source == a_source:
+        routes = self.adj_rib_in.get(full_ip)
+        route = None if routes is None else routes.pop(w_source, None)
+        if route is not None:
+            self.__release_route(route)
+            self.__select_best_route(full_ip)
+        return True
+        ###
+
+    def __intern_route(self, as_path, next_hop):
+        """
+        Interns the AS path and next hop of an announcement. The caller owns
+        one reference to the returned AS path id, dropped by
+        `__release_route`. Next hops are few (about one per peer session),
+        so they are kept for the lifetime of the table.
+        :param as_path: as_path entry of the announcement.
+        :param next_hop: next_hop entry of the announcement.
+        :return: (AS path id, next hop id).
+        """
+        # The announcements of one UPDATE message share their attribute
+        # objects, so most lookups are answered by object identity.
+        recent = self.__recently_interned
+        seen = recent.get(id(as_path))
+        if seen is not None and self.as_paths.values[seen[1]] is seen[2]:
+            path_id = seen[1]
+            self.as_paths.acquire(path_id)
+        else:
+            if len(recent) > 1024:
+                recent.clear()
+            key = as_path_key(as_path)
+            path_id = self.as_paths.intern(key, as_path)
+            if self.as_paths.references[path_id] == 1:
+                segments = [segment[1] for attribute in key for segment in attribute]
+                info = (len(segments[-1]) if segments else 0, segments[-1][-1] if segments and segments[-1] else None,
+                        tuple(dict.fromkeys(asn for segment in segments for asn in segment)))
+                if path_id == len(self.__path_info):
+                    self.__path_info.append(info)
+                else:
+                    self.__path_info[path_id] = info
+            recent[id(as_path)] = (as_path, path_id, self.as_paths.values[path_id])
+        seen = recent.get(id(next_hop))
+        if seen is not None:
+            hop_id = seen[1]
+        else:
+            hop_id = self.next_hops.intern(tuple(next_hop), next_hop)
+            recent[id(next_hop)] = (next_hop, hop_id)
+        return path_id, hop_id
+
+    def __release_route(self, route):
+        """
+        :param route: An Adj-RIB-In route tuple that is being dropped.
+        """
+        self.as_paths.release(route[2])
+
+    def __route_entry(self, key, peer, route):
+        """
+        :param key: Routing table key of the range.
+        :param peer: Peer AS announcing the route.
+        :param route: The peer's Adj-RIB-In route tuple for key.
+        :return: The routing table entry for the route, in the format of the
+            announcements produced by `ParseUpdates`.
+        """
+        return {
+            'timestamp': route[4],
+            'range': {'prefix_length': key[1], 'prefix': unpack_prefix(key[0])},
+            'next_hop': self.next_hops.values[route[3]],
+            'peer_as': peer,
+            'as_path': self.as_paths.values[route[2]],
+        }
+
+    def __select_best_route(self, key):
+        """
+        Re-selects the route with the shortest AS path among the peers'
+        routes for key in self.adj_rib_in and installs it in
+        self.routing_table. The range is removed from the table once no peer
+        has a route for it. total_paths_changed is updated when the selected
+        route changes peer or path, or when the range is removed.
+        :param key: Routing table key of the range.
+        """
+        routes = self.adj_rib_in[key]
+        candidates = self.__candidates[key]
+        while candidates:
+            length, sequence, peer = candidates[0]
+            route = routes.get(peer)
+            if route is not None and route[0] == length and route[1] == sequence:
+                break
+            heapq.heappop(candidates)
+
+        previous = self.routing_table.get(key)
+        if not candidates:
+            del self.adj_rib_in[key]
+            del self.__candidates[key]
+            if previous is not None:
+                self.__remove_range(key)
                 self.total_paths_changed = self.total_paths_changed + 1
-                #self.routing_table.pop(full_ip)
+            return
+
+        peer = candidates[0][2]
+        route = routes[peer]
+        route_ids = (peer, route[2], route[3])
+        if previous is None:
+            self.__install_range(key, self.__route_entry(key, peer, route), route_ids)
+        else:
+            previous_ids = self.__route_ids[key]
+            if previous_ids != route_ids:
+                if previous_ids[0] != peer or previous_ids[1] != route[2]:
+                    self.total_paths_changed = self.total_paths_changed + 1
+                self.__install_range(key, self.__route_entry(key, peer, route), route_ids)
+            elif previous['timestamp'] is not route[4]:
+                self.routing_table[key] = self.__route_entry(key, peer, route)
+
+        if len(candidates) > 2 * len(routes) + 8:
+            candidates[:] = [(route[0], route[1], peer) for peer, route in routes.items()]
+            heapq.heapify(candidates)
+
+    def __install_range(self, key, entry, route_ids):
+        """
+        Adds key to the table, or replaces its entry, and updates
+        self.reachability, the set of redundant entries and the AS indexes.
+        :param key: Routing table key of the range.
+        :param entry: Route to be installed for the range.
+        :param route_ids: (peer AS, AS path id, next hop id) of the route.
+        """
+        previous_ids = self.__route_ids.get(key)
+        is_new = previous_ids is None
+        self.routing_table[key] = entry
+        self.__route_ids[key] = route_ids
+        if is_new:
+            self.prefix_index.insert(key)
+        else:
+            self.__unindex_route(key, previous_ids[1])
+        self.__index_route(key, route_ids[1])
+        parent, children = self.prefix_index.family(key)
+        children = [child for child, _ in children]
+        if is_new and parent is None:
+            self.reachability += (1 << (32 - key[1])) - sum(1 << (32 - child[1]) for child in children)
+        self.__update_redundancy(key, None if parent is None else self.__route_ids[parent[0]])
+        for child in children:
+            self.__update_redundancy(child, route_ids)
+
+    def __remove_range(self, key):
+        """
+        Removes key from the table and updates self.reachability, the set of
+        redundant entries and the AS indexes.
+        :param key: Routing table key of the range.
+        """
+        self.routing_table.pop(key)
+        self.__unindex_route(key, self.__route_ids.pop(key)[1])
+        self.prefix_index.remove(key)
+        self.__redundant.discard(key)
+        parent, children = self.prefix_index.family(key)
+        children = [child for child, _ in children]
+        if parent is None:
+            self.reachability -= (1 << (32 - key[1])) - sum(1 << (32 - child[1]) for child in children)
+        parent_ids = None if parent is None else self.__route_ids[parent[0]]
+        for child in children:
+            self.__update_redundancy(child, parent_ids)
+
+    def __index_route(self, key, path_id):
+        _, origin, ases = self.__path_info[path_id]
+        self.prefixes_by_origin.setdefault(origin, set()).add(key)
+        for asn in ases:
+            self.prefixes_by_as.setdefault(asn, set()).add(key)
+
+    def __unindex_route(self, key, path_id):
+        _, origin, ases = self.__path_info[path_id]
+        for index, asns in ((self.prefixes_by_origin, (origin,)), (self.prefixes_by_as, ases)):
+            for asn in asns:
+                keys = index[asn]
+                keys.discard(key)
+                if not keys:
+                    del index[asn]
+
+    def prefixes_originated_by(self, asn):
+        """
+        :param asn: AS number as a string or an integer.
+        :return: Set of the routing table keys whose route is originated by
+            asn. The set belongs to the index and must not be modified.
+        """
+        return self.prefixes_by_origin.get(str(asn), frozenset())
 
+    def prefixes_through(self, asn):
+        """
+        :param asn: AS number as a string or an integer.
+        :return: Set of the routing table keys whose AS path contains asn,
+            as origin or transit AS. The set belongs to the index and must
+            not be modified.
+        """
+        return self.prefixes_by_as.get(str(asn), frozenset())
 
-        ###
+    def is_redundant(self, key):
+        """
+        :param key: Routing table key of a range in the table.
+        :return: True if `collapse_routing_table` would remove key, i.e. the
+            closest range containing it has the same route.
+        """
+        return key in self.__redundant
 
-    def measure_reachability(self):
+    def __update_redundancy(self, key, parent_ids):
+        """
+        :param key: Routing table key of a range in the table.
+        :param parent_ids: Route ids of the closest range containing key, or
+            None if there is none.
+        """
+        if parent_ids is not None and self.__route_ids[key] == parent_ids:
+            self.__redundant.add(key)
+        else:
+            self.__redundant.discard(key)
+
+    def __rebuild_statistics(self):
+        """
+        Recomputes self.reachability, the set of redundant entries and the
+        AS indexes from scratch in one walk over self.prefix_index.
+        """
+        self.measure_reachability()
+        self.prefixes_by_origin, self.prefixes_by_as = {}, {}
+        self.__redundant = set()
+        covering = []
+        for key, _ in self.prefix_index.items():
+            while covering and not key_contains(covering[-1], key):
+                covering.pop()
+            if covering and self.__route_ids[key] == self.__route_ids[covering[-1]]:
+                self.__redundant.add(key)
+            covering.append(key)
+            self.__index_route(key, self.__route_ids[key][1])
+
+    def statistics(self):
+        """
+        Reports the statistics of the routing table without walking it.
+        :return: Dictionary with the number of entries, the number of
+            entries left after `collapse_routing_table`, the number of
+            reachable addresses, the update and path change counters and
+            the timestamps of the earliest and latest updates.
+        """
+        return {
+            'entries': len(self.routing_table),
+            'collapsed_entries': len(self.routing_table) - len(self.__redundant),
+            'reachability': self.reachability,
+            'total_updates_received': self.total_updates_received,
+            'total_paths_changed': self.total_paths_changed,
+            'time_of_earliest_update': self.time_of_earliest_update,
+            'time_of_latest_update': self.time_of_latest_update,
+        }
+
+    def measure_reachability(self, group_by=None, address_range=None):
         """
         Checkpoint ID: 3 [1 point]
         This function will report the number of unique of IP addresses that are
@@ -166,17 +608,50 @@ class RoutingTable:
             - Count how many unique IP address are contained in the
                 collapsed CIDR blocks.
             - Update the `self.reachability` parameter with this number.
-        :return:
+        Ranges are never expanded into addresses. self.prefix_index yields
+        the ranges as [start, end) integer intervals sorted by start, which
+        are merged in a single pass while the sizes of the merged intervals
+        are summed. self.reachability is also maintained incrementally, so
+        this full recount is only needed for group_by.
+        :param group_by: Optional. 'peer_as' or 'origin_as' to also count the
+            addresses reachable through the routes of each peer AS, or
+            originated by each AS, in the same pass.
+        :param address_range: Optional [start, end) interval of integer
+            addresses. If given, only the addresses inside it are counted and
+            self.reachability is left unchanged.
+        :return: None, or a dictionary mapping each AS to its number of
+            reachable addresses if group_by was given. If address_range was
+            given and group_by was not, the number of reachable addresses
+            inside address_range.
         """
         ###
-        ips = set()
-        for item in self.routing_table:
-            hosts = list(ipaddress.ip_network(item).hosts())
-            self.reachability = self.reachability + len(hosts)
-            for item in hosts:
-                ips.add(item)
-
-        self.reachability = len(ips)
+        if group_by not in (None, 'peer_as', 'origin_as'):
+            raise ValueError("group_by must be None, 'peer_as' or 'origin_as'")
+        reachability, end = 0, 0
+        group_reachability, group_end = {}, {}
+        for (network, length), _ in self.prefix_index.items():
+            start, stop = network, network + (1 << (32 - length))
+            if address_range is not None:
+                start, stop = max(start, address_range[0]), min(stop, address_range[1])
+                if start >= stop:
+                    continue
+            if stop > end:
+                reachability += stop - max(start, end)
+                end = stop
+            if group_by is not None:
+                entry = self.routing_table[(network, length)]
+                group = entry['peer_as'] if group_by == 'peer_as' else origin_as(entry)
+                covered = group_end.get(group, 0)
+                if stop > covered:
+                    group_reachability[group] = group_reachability.get(group, 0) + stop - max(start, covered)
+                    group_end[group] = stop
+
+        if address_range is None:
+            self.reachability = reachability
+        if group_by is not None:
+            return group_reachability
+        if address_range is not None:
+            return reachability
 
         ###
 
@@ -195,62 +670,48 @@ class RoutingTable:
         Important: Doing pairwise comparisons is prohibitively expensive and
         will likely run for a long time. Think of more clever ways to collapse
         entries or rules that can filter out a large number of comparisons.
+        self.prefix_index yields every prefix after the prefixes containing
+        it, so a single walk with a stack of the surviving covering entries
+        finds, for each entry, the closest covering entry that remains in
+        the table. The entry is removed if that covering entry has the same
+        source_as, as_path and next_hop, so longest prefix matches resolve to
+        the same route before and after collapsing.
+        Collapsed ranges keep their routes in self.adj_rib_in and return to
+        the table the next time one of those routes is updated.
         :return: True if no exceptions occurred. False if an exception occurred.
         """
         ###
-        new_table  = self.routing_table
-        ips = []
-        for key in new_table:
-            ips.append(key)
-
-        for i in range (0, 20):
-            for i in range (0, len(new_table.keys()) -1):
-                try:
-                    this_key = ips[i]
-                    next_key = ips[i+1]
-                    this_data = new_table[this_key]
-                    next_data = new_table[next_key]
-                    if this_key.subnet_of(next_key) == True:
-                        if (this_data['as_path'] == next_data['as_path']) and (this_data['next_hop'] == next_data['next_hop']):
-                            for a in this_data['as_path']:
-                                for b in a:
-                                    this_aspath = b['value']
-                            for x in next_data['as_path']:
-                                for y in x:
-                                    next_aspath = y['value']
-                            
-                            if Counter(this_aspath) == Counter(next_aspath):
-                                new_table.pop(this_key)
-                                new_table[next_key]['timestamp'] == self.time_of_latest_update
-                                ips.pop(ips.index(this_key))
-
-                    if next_key.subnet_of(this_key) == True:
-                        if (this_data['as_path'] == next_data['as_path']) and (this_data['next_hop'] == next_data['next_hop']):
-                            for a in this_data['as_path']:
-                                for b in a:
-                                    this_aspath = b['value']
-                            for x in next_data['as_path']:
-                                for y in x:
-                                    next_aspath = y['value']
-                            
-                            if Counter(this_aspath) == Counter(next_aspath):
-                                new_table.pop(next_key)
-                                new_table[this_key]['timestamp'] == self.time_of_latest_update
-                                ips.pop(ips.index(next_key))
-                except IndexError:
-                    self.routing_table = new_table
-
-
-
-        self.routing_table = new_table
+        start_time = time.time()
+        n_entries = len(self.routing_table)
+        covering = []
+        redundant = []
+        for key, _ in self.prefix_index.items():
+            while covering and not key_contains(covering[-1][0], key):
+                covering.pop()
+            entry = self.routing_table[key]
+            if covering:
+                covering_key, covering_entry = covering[-1]
+                if self.__route_ids[key] == self.__route_ids[covering_key]:
+                    if entry['timestamp'][0] > covering_entry['timestamp'][0]:
+                        # Entries may be shared with earlier copies of the
+                        # table, so the merged entry replaces the old one.
+                        routes = self.adj_rib_in[covering_key]
+                        peer = covering_entry['peer_as']
+                        routes[peer] = routes[peer][:4] + (entry['timestamp'],)
+                        covering_entry = self.__route_entry(covering_key, peer, routes[peer])
+                        self.routing_table[covering_key] = covering_entry
+                        covering[-1] = (covering_key, covering_entry)
+                    redundant.append(key)
+                    continue
+            covering.append((key, entry))
+
+        for key in redundant:
+            self.__remove_range(key)
+
+        if n_entries:
+            logging.info("Time taken for compression: %d seconds. Space savings: %.2f%%" %
+                         (time.time() - start_time, 100.0 * len(redundant) / n_entries))
         return True
-
-
-            
-        
-
-                
-
         ###
 
     def find_path_to_destination(self, destination):
@@ -276,33 +737,141 @@ class RoutingTable:
         """
         ###
 
-        dest_IP = ipaddress.ip_network(destination, '/32')
+        dest_IP = (int(ipaddress.IPv4Address(destination)), 32)
         routes = []
 
-        for key in self.routing_table:
-            if dest_IP.subnet_of(key) == True:
-                content = self.routing_table[key]
-                for item in content['as_path']:
-                    for a in item:
-                        as_path = a['value']
-                struct = {
-                    'prefix_len': str(key).split('/')[1],
-                    'as_path': as_path,
-                    'next_hop' : content['next_hop'],
-                    'source_as' : content['peer_as']
-                }
-                routes.append(struct)
-                    
+        for key, _ in self.prefix_index.covering(dest_IP):
+            routes.append(route_description(key, self.routing_table[key]))
+
         if not routes:
             routes = [{"as_path": None, "next_hop": None, "prefix_len": None, "source_as": None}]
-            return(routes)
-        else:
-            routes =  sorted(routes, key = lambda i: i['prefix_len'], reverse=True)
-            return(routes)
-        print(routes)
         return routes
         ###
 
+    def flat_fib(self):
+        """
+        Returns the flattened interval representation of the routing table
+        used by `find_routes_batch`. It is rebuilt from self.prefix_index only
+        if prefixes were added or removed since it was last built.
+        :return: A `FlatFib` whose keys are the routing table keys.
+        """
+        if self.__flat_fib is None or self.__flat_fib_version != self.prefix_index.version:
+            from FlatFib import FlatFib
+            self.__flat_fib = FlatFib(key for key, _ in self.prefix_index.items())
+            self.__flat_fib_version = self.prefix_index.version
+        return self.__flat_fib
+
+    def find_routes_batch(self, destinations):
+        """
+        Longest prefix match for many destinations at once. Requires NumPy.
+        :param destinations: NumPy uint32 array of IPv4 addresses, or a
+            sequence of addresses as strings or integers.
+        :return: (route indices, keys). route indices is a NumPy int64 array
+            holding, for each destination, the position in keys of the
+            routing table key of its longest matching route, or -1 if there
+            is no route. Use self.routing_table[keys[i]] for the entry.
+        """
+        fib = self.flat_fib()
+        return fib.lookup(destinations), fib.keys
+
+    def replay(self, mrt_files, cache_dir=None):
+        """
+        Applies the updates of mrt_files in order, file by file. If the table
+        has already applied part of this list, e.g. because it was restored
+        with `load`, the files before self.last_applied_file and the updates
+        of that file up to self.last_applied_timestamp are skipped, see
+        `replay_position`.
+        :param mrt_files: List of MRT files in chronological order. If the
+            table has applied updates, it must contain
+            self.last_applied_file.
+        :param cache_dir: Parsed-update cache directory passed to
+            `ParseUpdates`.
+        :return: Number of files replayed.
+        """
+        files, skip_until = replay_position(self, mrt_files)
+        for next_updates in replay_updates(self, files, skip_until, cache_dir):
+            for announcement in next_updates["announcements"]:
+                self.apply_announcement(announcement)
+            for withdrawal in next_updates["withdrawals"]:
+                self.apply_withdrawal(withdrawal)
+        return len(files)
+
+    def save(self, path):
+        """
+        Writes a binary snapshot of the table. Every route of
+        self.adj_rib_in is stored as one row of an `UpdateStore`, in the
+        order the routes appeared, and the counters, the replay position and
+        the ranges removed by `collapse_routing_table` are stored in its
+        metadata. See `UpdateStore.save` for the file format.
+        :param path: Location of the snapshot file.
+        """
+        rows = sorted(((route[1], key, peer, route) for key, routes in self.adj_rib_in.items()
+                       for peer, route in routes.items()), key=lambda row: row[0])
+        store = UpdateStore()
+        for _, key, peer, route in rows:
+            store.add_announcement(route[4], peer, unpack_prefix(key[0]), key[1],
+                                   store.intern_as_path(self.as_paths.values[route[2]]),
+                                   store.intern_next_hop(self.next_hops.values[route[3]]))
+        store.metadata = {
+            'snapshot_version': SNAPSHOT_VERSION,
+            'route_sequence': self.__route_sequence,
+            'time_of_earliest_update': self.time_of_earliest_update,
+            'time_of_latest_update': self.time_of_latest_update,
+            'total_updates_received': self.total_updates_received,
+            'total_paths_changed': self.total_paths_changed,
+            'last_applied_file': self.last_applied_file,
+            'last_applied_timestamp': self.last_applied_timestamp,
+            'collapsed': [list(key) for key in self.adj_rib_in if key not in self.routing_table],
+        }
+        store.save(path)
+
+    @classmethod
+    def load(cls, path, metrics=None):
+        """
+        Restores a table from a snapshot written by `save`. The snapshot is
+        memory-mapped; the best route of every range is re-selected from the
+        restored routes, which gives the table that was saved.
+        :param path: Location of the snapshot file.
+        :param metrics: Optional `Metrics` for the restored table.
+        :return: The restored `RoutingTable`, or None if the file is missing
+            or is not a snapshot of this version.
+        """
+        store = UpdateStore.load(path)
+        if store is None or not isinstance(store.metadata, dict) \
+                or store.metadata.get('snapshot_version') != SNAPSHOT_VERSION:
+            return None
+        metadata = store.metadata
+        rt = cls(metrics=metrics)
+        for row in range(len(store)):
+            key = (store.prefixes[row], store.prefix_lengths[row])
+            peer = sys.intern(str(store.peer_as[row]))
+            path_id, hop_id = rt.__intern_route(store.as_paths[store.as_path_ids[row]],
+                                                store.next_hops[store.next_hop_ids[row]])
+            length = rt.__path_info[path_id][0]
+            rt.adj_rib_in.setdefault(key, {})[peer] = (length, row + 1, path_id, hop_id,
+                                                       store.timestamp_records[store.timestamps[row]])
+            rt.__candidates.setdefault(key, []).append((length, row + 1, peer))
+
+        collapsed = set(tuple(key) for key in metadata['collapsed'])
+        for key, candidates in rt.__candidates.items():
+            heapq.heapify(candidates)
+            if key not in collapsed:
+                peer = candidates[0][2]
+                route = rt.adj_rib_in[key][peer]
+                rt.routing_table[key] = rt.__route_entry(key, peer, route)
+                rt.__route_ids[key] = (peer, route[2], route[3])
+        rt.prefix_index = PrefixTrie.from_sorted((key, None) for key in sorted(rt.routing_table))
+        rt.__rebuild_statistics()
+
+        rt.__route_sequence = metadata['route_sequence']
+        rt.time_of_earliest_update = metadata['time_of_earliest_update']
+        rt.time_of_latest_update = metadata['time_of_latest_update']
+        rt.total_updates_received = metadata['total_updates_received']
+        rt.total_paths_changed = metadata['total_paths_changed']
+        rt.last_applied_file = metadata['last_applied_file']
+        rt.last_applied_timestamp = metadata['last_applied_timestamp']
+        return rt
+
     def helper_print_routing_table_descriptions(self, collapse=False):
         """
         Helper function that prints statistics associated with the current
@@ -313,23 +882,22 @@ class RoutingTable:
         """
         if collapse:
             self.collapse_routing_table()
-        self.measure_reachability()
         s = "Earliest update seen: %d, \t Latest update seen: %d" % (self.time_of_earliest_update,
                                                                      self.time_of_latest_update)
         s += "\nTotal updates received: %d, \t " \
              "Total number of path changes observed: %d" % (self.total_updates_received, self.total_paths_changed)
         s += "\nTotal number of routing table entries currently in table: %d" % len(self.routing_table.keys())
+        s += "\nRouting table entries left after collapsing: %d" % self.statistics()['collapsed_entries']
         s += "\nReachable addresses of the IPv4 space from current table: %d" % self.reachability
         print(s)
         logging.info(s)
 
 
 def main():
-    pu = ParseUpdates(filename="./data/updates.20080219.0015.bz2")
+    pu = ParseUpdates(filename="./data/updates.20080219.0015.bz2", cache_dir="./cache")
     rt = RoutingTable()
-    pu.parse_updates()
     # pu.to_json_helper_function("./test.json")
-    updates = pu.get_next_updates()
+    updates = pu.stream_updates()
     while True:
         next_updates = updates.__next__()
         if next_updates['timestamp'] is None:
@@ -340,7 +908,6 @@ def main():
                 rt.apply_announcement(announcement)
             for withdrawal in next_updates["withdrawals"]:
                 rt.apply_withdrawal(withdrawal)
-    rt.measure_reachability()
     rt.helper_print_routing_table_descriptions()
     rt.helper_print_routing_table_descriptions(collapse=True)
     for destination in ["8.8.8.8", "125.161.0.1"]:
@@ -0,0 +1,475 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+ShardedRoutingTable.py
+----------------------
+The class in this file spreads a routing table over several worker processes.
+The IPv4 address space is split into contiguous ranges, one per shard, and
+every shard holds a `RoutingTable` for the destination ranges inside its
+addresses. Updates are routed to their shard and sent in batches, so the
+shards apply them in parallel while the next updates are parsed. A range
+crossing a shard boundary, such as a short covering prefix, is applied to
+every shard it overlaps; each shard then holds every range that can match
+its addresses, so longest prefix matching and collapsing work within a shard.
+Lookups, reachability, collapsing and statistics are answered by gathering
+the answers of the shards, counting every range once, at the shard holding
+its first address, and clipping reachability to each shard's addresses.
+"""
+
+from RoutingTable import RoutingTable, prefix_key, replay_position, replay_updates
+from Metrics import Metrics
+import bisect
+import glob
+import ipaddress
+import logging
+import multiprocessing
+import os
+import sys
+import traceback
+
+ADDRESS_SPACE = 1 << 32
+UPDATE_INSIDE, UPDATE_SPANNING, UPDATE_REPLICA = 0, 1, 2
+
+
+def run_shard(connection, start, end):
+    """
+    Entry point of the shard processes. Applies batches of updates and
+    answers requests received on connection until told to close. Batches are
+    not acknowledged; an error while applying one is reported in the reply
+    to the next request.
+    :param connection: End of a `multiprocessing.Pipe` connected to the
+        `ShardedRoutingTable`.
+    :param start: First address of the shard.
+    :param end: Address just past the last address of the shard.
+    """
+    shard = _Shard(start, end)
+    error = None
+    while True:
+        message = connection.recv()
+        command = message[0]
+        if command == 'close':
+            connection.close()
+            return
+        if command == 'apply':
+            if error is None:
+                try:
+                    shard.apply(message[1])
+                except Exception:
+                    error = traceback.format_exc()
+            continue
+        if error is not None:
+            connection.send((False, error))
+            continue
+        try:
+            connection.send((True, getattr(shard, command)(*message[1:])))
+        except Exception:
+            connection.send((False, traceback.format_exc()))
+
+
+class ShardedRoutingTable:
+    """
+        Class for maintaining a routing table partitioned by address range
+        across worker processes.
+    """
+    def __init__(self, shards=None, boundaries=None, batch_size=2000, metrics=None):
+        """
+        :param shards: Number of shards, and of worker processes. Defaults to
+        the number of CPUs. The address space is split into equal ranges
+        aligned on /8 boundaries.
+        :param boundaries: Optional sorted list of the first address of every
+        shard, as integers, starting with 0. Overrides shards, e.g. to
+        balance the shards for the prefixes of a given feed.
+        :param batch_size: Number of updates buffered per shard before they
+        are sent to it. Updates still buffered are sent before any request.
+        :param metrics: Optional `Metrics` recording the apply_announcement,
+        apply_withdrawal, dispatch, collapse, reachability, lookup,
+        lookup_batch and replay stages of this process. The shards do not
+        record metrics.
+        self.boundaries is the list of the first address of every shard.
+        self.total_updates_received, self.time_of_earliest_update and
+        self.time_of_latest_update are kept by this process as in
+        `RoutingTable`. self.reachability is updated by
+        `measure_reachability` and `statistics`. self.total_paths_changed
+        and self.routing_table are gathered from the shards when read.
+        self.last_applied_file and self.last_applied_timestamp record how
+        far `replay` has got.
+        """
+        if boundaries is None:
+            n_shards = min(shards or os.cpu_count() or 1, 256)
+            boundaries = sorted({(i * 256 // n_shards) << 24 for i in range(n_shards)})
+        if not boundaries or boundaries[0] != 0 or list(boundaries) != sorted(set(boundaries)):
+            raise ValueError("boundaries must be a sorted list of distinct addresses starting with 0")
+        self.boundaries = list(boundaries)
+        self.__ends = self.boundaries[1:] + [ADDRESS_SPACE]
+        self.batch_size = batch_size
+        self.time_of_earliest_update, self.time_of_latest_update = sys.maxsize, 0
+        self.total_updates_received = 0
+        self.reachability = 0
+        self.last_applied_file, self.last_applied_timestamp = None, 0
+        self.__buffers = [[] for _ in self.boundaries]
+        self.__connections = []
+        self.__processes = []
+        # Forked shards do not import RoutingTable again, which would reset
+        # the log file configured at import time.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        for start, end in zip(self.boundaries, self.__ends):
+            connection, shard_connection = context.Pipe()
+            process = context.Process(target=run_shard, args=(shard_connection, start, end), daemon=True)
+            process.start()
+            shard_connection.close()
+            self.__connections.append(connection)
+            self.__processes.append(process)
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.metrics.instrument(self, {
+            'apply_announcement': 'apply_announcement',
+            'apply_withdrawal': 'apply_withdrawal',
+            '_ShardedRoutingTable__flush': 'dispatch',
+            'collapse_routing_table': 'collapse',
+            'measure_reachability': 'reachability',
+            'find_path_to_destination': 'lookup',
+            'find_routes_batch': 'lookup_batch',
+            'replay': 'replay',
+        })
+
+    def apply_announcement(self, announcement):
+        """
+        Queues an announcement for the shards its range overlaps, see
+        `RoutingTable.apply_announcement`.
+        :param announcement: Announcement in the format of `ParseUpdates`.
+        :return: True.
+        """
+        timestamp = announcement['timestamp'][0]
+        self.total_updates_received = self.total_updates_received + 1
+        if self.time_of_earliest_update == sys.maxsize:
+            self.time_of_earliest_update = timestamp
+        if timestamp < self.time_of_earliest_update and not(timestamp > self.time_of_latest_update):
+            self.time_of_earliest_update = timestamp
+        elif timestamp > self.time_of_latest_update:
+            self.time_of_latest_update = timestamp
+        self.__dispatch(announcement, False)
+        return True
+
+    def apply_withdrawal(self, withdrawal):
+        """
+        Queues a withdrawal for the shards its range overlaps, see
+        `RoutingTable.apply_withdrawal`.
+        :param withdrawal: Withdrawal in the format of `ParseUpdates`.
+        :return: True.
+        """
+        self.total_updates_received = self.total_updates_received + 1
+        self.__dispatch(withdrawal, True)
+        return True
+
+    def apply_updates(self, update_record):
+        """
+        :param update_record: Record yielded by `get_next_updates` or
+            `stream_updates` of `ParseUpdates`.
+        :return: Number of updates applied.
+        """
+        for announcement in update_record['announcements']:
+            self.apply_announcement(announcement)
+        for withdrawal in update_record['withdrawals']:
+            self.apply_withdrawal(withdrawal)
+        return len(update_record['announcements']) + len(update_record['withdrawals'])
+
+    def __dispatch(self, update, is_withdrawal):
+        """
+        Buffers update for the shard holding the first address of its range
+        and, if the range crosses shard boundaries, for the other shards it
+        overlaps as a replica.
+        """
+        network, length = prefix_key(update['range']['prefix'], update['range']['prefix_length'])
+        end = network + (1 << (32 - length))
+        shard = bisect.bisect_right(self.boundaries, network) - 1
+        if end <= self.__ends[shard]:
+            self.__queue(shard, (update, is_withdrawal, UPDATE_INSIDE))
+            return
+        self.__queue(shard, (update, is_withdrawal, UPDATE_SPANNING))
+        shard += 1
+        while shard < len(self.boundaries) and self.boundaries[shard] < end:
+            self.__queue(shard, (update, is_withdrawal, UPDATE_REPLICA))
+            shard += 1
+
+    def __queue(self, shard, item):
+        buffer = self.__buffers[shard]
+        buffer.append(item)
+        if len(buffer) >= self.batch_size:
+            self.__connections[shard].send(('apply', buffer))
+            self.__buffers[shard] = []
+
+    def __flush(self):
+        """
+        Sends the updates still buffered to their shards.
+        """
+        for shard, buffer in enumerate(self.__buffers):
+            if buffer:
+                self.__connections[shard].send(('apply', buffer))
+                self.__buffers[shard] = []
+
+    def __gather(self, command, *args):
+        """
+        Sends the same request to every shard and waits for their answers.
+        :return: List of the answers, in the order of the shards.
+        """
+        return self.__request([(shard, (command,) + args) for shard in range(len(self.boundaries))])
+
+    def __request(self, requests):
+        """
+        Sends requests to shards and waits for their answers. The shards work
+        on their requests in parallel.
+        :param requests: List of (shard, (command, arguments...)) tuples, at
+            most one per shard.
+        :return: List of the answers, in the order of requests.
+        """
+        self.__flush()
+        for shard, message in requests:
+            self.__connections[shard].send(message)
+        answers = []
+        for shard, _ in requests:
+            try:
+                ok, answer = self.__connections[shard].recv()
+            except EOFError:
+                raise RuntimeError("Shard %d exited unexpectedly" % shard)
+            if not ok:
+                raise RuntimeError("Shard %d failed:\n%s" % (shard, answer))
+            answers.append(answer)
+        return answers
+
+    @property
+    def total_paths_changed(self):
+        """
+        The number of path changes of the ranges, counted by the shard
+        holding the first address of each range.
+        """
+        return sum(self.__gather('total_paths_changed'))
+
+    @property
+    def routing_table(self):
+        """
+        The merged routing table of the shards, built on every access. A
+        range held by several shards is reported with the latest timestamp
+        among them, which `RoutingTable.collapse_routing_table` may have
+        raised in some of them only.
+        """
+        routing_table = {}
+        for entries in self.__gather('entries'):
+            for key, entry in entries.items():
+                current = routing_table.get(key)
+                if current is None or entry['timestamp'][0] > current['timestamp'][0]:
+                    routing_table[key] = entry
+        return routing_table
+
+    def statistics(self):
+        """
+        :return: Dictionary in the format of `RoutingTable.statistics`,
+            merged from the statistics of the shards.
+        """
+        statistics = {'entries': 0, 'collapsed_entries': 0, 'reachability': 0, 'total_paths_changed': 0}
+        for shard_statistics in self.__gather('statistics'):
+            for name in statistics:
+                statistics[name] += shard_statistics[name]
+        self.reachability = statistics['reachability']
+        statistics['total_updates_received'] = self.total_updates_received
+        statistics['time_of_earliest_update'] = self.time_of_earliest_update
+        statistics['time_of_latest_update'] = self.time_of_latest_update
+        return statistics
+
+    def measure_reachability(self, group_by=None):
+        """
+        See `RoutingTable.measure_reachability`. Every shard only counts its
+        own addresses, so the counts of the shards add up.
+        """
+        if group_by not in (None, 'peer_as', 'origin_as'):
+            raise ValueError("group_by must be None, 'peer_as' or 'origin_as'")
+        answers = self.__gather('reachability', group_by)
+        self.reachability = sum(reachability for reachability, _ in answers)
+        if group_by is not None:
+            group_reachability = {}
+            for _, groups in answers:
+                for group, reachability in groups.items():
+                    group_reachability[group] = group_reachability.get(group, 0) + reachability
+            return group_reachability
+
+    def collapse_routing_table(self):
+        """
+        Collapses the table of every shard, see
+        `RoutingTable.collapse_routing_table`. The ranges containing a range
+        are held by the same shard, so collapsing them separately gives the
+        same table.
+        :return: True if every shard succeeded.
+        """
+        return all(self.__gather('collapse'))
+
+    def find_path_to_destination(self, destination):
+        """
+        See `RoutingTable.find_path_to_destination`. Only the shard holding
+        destination is asked.
+        """
+        shard = bisect.bisect_right(self.boundaries, int(ipaddress.IPv4Address(destination))) - 1
+        return self.__request([(shard, ('lookup', destination))])[0]
+
+    def find_routes_batch(self, destinations):
+        """
+        See `RoutingTable.find_routes_batch`. Every shard looks up its own
+        destinations in parallel. Requires NumPy.
+        :return: (route indices, keys). keys concatenates the keys of the
+            shards, so a range held by several shards appears once for each.
+        """
+        import numpy as np
+        from FlatFib import to_address_array
+        addresses = to_address_array(destinations)
+        shard_of = np.searchsorted(np.array(self.boundaries, dtype=np.uint64), addresses, side='right') - 1
+        requests, selections = [], []
+        for shard in range(len(self.boundaries)):
+            selection = shard_of == shard
+            if selection.any():
+                requests.append((shard, ('lookup_batch', addresses[selection])))
+                selections.append(selection)
+        route_indices = np.full(len(addresses), -1, dtype=np.int64)
+        keys = []
+        for selection, (indices, shard_keys) in zip(selections, self.__request(requests)):
+            route_indices[selection] = np.where(indices >= 0, indices + len(keys), -1)
+            keys.extend(shard_keys)
+        return route_indices, keys
+
+    def prefixes_originated_by(self, asn):
+        """
+        :param asn: AS number as a string or an integer.
+        :return: Set of the keys whose route is originated by asn.
+        """
+        return set().union(*self.__gather('prefixes_originated_by', asn))
+
+    def prefixes_through(self, asn):
+        """
+        :param asn: AS number as a string or an integer.
+        :return: Set of the keys whose AS path contains asn.
+        """
+        return set().union(*self.__gather('prefixes_through', asn))
+
+    def replay(self, mrt_files, cache_dir=None):
+        """
+        See `RoutingTable.replay`, whose resuming rules apply: the files
+        before self.last_applied_file and the updates of that file up to
+        self.last_applied_timestamp are skipped.
+        :param mrt_files: List of MRT files in chronological order. If the
+            table has applied updates, it must contain
+            self.last_applied_file.
+        :param cache_dir: Parsed-update cache directory passed to
+            `ParseUpdates`.
+        :return: Number of files replayed.
+        """
+        files, skip_until = replay_position(self, mrt_files)
+        for next_updates in replay_updates(self, files, skip_until, cache_dir):
+            self.apply_updates(next_updates)
+        return len(files)
+
+    def close(self):
+        """
+        Stops the shard processes. Updates still buffered are discarded.
+        """
+        for connection in self.__connections:
+            try:
+                connection.send(('close',))
+            except OSError:
+                pass
+        for process, connection in zip(self.__processes, self.__connections):
+            process.join()
+            connection.close()
+        self.__connections, self.__processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class _Shard:
+    """
+        State of a shard process: a `RoutingTable` for the addresses from
+        start up to end, and the keys of the ranges it holds that extend
+        beyond them.
+    """
+    def __init__(self, start, end):
+        self.table = RoutingTable()
+        self.start, self.end = start, end
+        self.spanning = set()
+
+    def apply(self, updates):
+        """
+        :param updates: List of (update, is_withdrawal, kind) tuples. kind is
+            UPDATE_REPLICA for ranges starting in another shard; their path
+            changes are counted by that shard only.
+        """
+        table = self.table
+        for update, is_withdrawal, kind in updates:
+            paths_changed = table.total_paths_changed
+            if is_withdrawal:
+                table.apply_withdrawal(update)
+            else:
+                table.apply_announcement(update)
+            if kind != UPDATE_INSIDE:
+                self.spanning.add(prefix_key(update['range']['prefix'], update['range']['prefix_length']))
+                if kind == UPDATE_REPLICA:
+                    table.total_paths_changed = paths_changed
+
+    def total_paths_changed(self):
+        return self.table.total_paths_changed
+
+    def entries(self):
+        return self.table.routing_table
+
+    def statistics(self):
+        """
+        :return: `RoutingTable.statistics` of the shard, counting only the
+            ranges starting in the shard and only the reachable addresses
+            inside it.
+        """
+        table = self.table
+        statistics = table.statistics()
+        self.spanning = {key for key in self.spanning if key in table.routing_table}
+        for key in self.spanning:
+            network, length = key
+            if not self.start <= network < self.end:
+                statistics['entries'] -= 1
+                if not table.is_redundant(key):
+                    statistics['collapsed_entries'] -= 1
+            if table.prefix_index.family(key)[0] is None:
+                end = network + (1 << (32 - length))
+                statistics['reachability'] -= (end - network) - (min(end, self.end) - max(network, self.start))
+        return statistics
+
+    def reachability(self, group_by):
+        groups = None
+        if group_by is not None:
+            groups = self.table.measure_reachability(group_by, (self.start, self.end))
+        return self.statistics()['reachability'], groups
+
+    def collapse(self):
+        return self.table.collapse_routing_table()
+
+    def lookup(self, destination):
+        return self.table.find_path_to_destination(destination)
+
+    def lookup_batch(self, addresses):
+        indices, keys = self.table.find_routes_batch(addresses)
+        return indices, list(keys)
+
+    def prefixes_originated_by(self, asn):
+        return set(self.table.prefixes_originated_by(asn))
+
+    def prefixes_through(self, asn):
+        return set(self.table.prefixes_through(asn))
+
+
+def main():
+    files = sorted(glob.glob("./data/updates.20080219.00*.bz2"))
+    with ShardedRoutingTable() as table:
+        table.replay(files, cache_dir="./cache")
+        logging.info("Sharded table over %d shard(s): %s" % (len(table.boundaries), table.statistics()))
+
+
+if __name__ == '__main__':
+    main()
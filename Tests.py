@@ -2,15 +2,18 @@ import sys
 from ParseUpdates import ParseUpdates
 from RoutingTable import RoutingTable
 from DetectHijacks import DetectHijacks
+from Metrics import Metrics
 import logging
 import argparse
+import itertools
 if sys.version_info[0] >= 3:
     unicode = str
 
 class Tests:
-    def __init__(self):
-        self.pu = ParseUpdates(filename="./data/updates.20080219.0015.bz2")
-        self.rt = RoutingTable()
+    def __init__(self, metrics=None):
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.pu = ParseUpdates(filename="./data/updates.20080219.0015.bz2", cache_dir="./cache", metrics=self.metrics)
+        self.rt = RoutingTable(metrics=self.metrics)
         self.dh = None
         self.cp_test_map = [self.__test_parser_full_cp1, self.__test_routing_applying_updates_cp2,
                             self.__test_routing_measuring_reachability_cp3, self.__test_routing_collapsing_table_cp4,
@@ -19,6 +22,7 @@ class Tests:
     def run_checkpoint(self, checkpoint=1):
         logging.info("[CP%d] Executing tests for checkpoint %d." % (checkpoint, checkpoint))
         self.cp_test_map[checkpoint-1]()
+        self.metrics.log_summary(logging.info)
         logging.info("[CP%d] Tests for checkpoint %d complete. Verify that your results match the "
                      "sample output log file." % (checkpoint, checkpoint))
         return
@@ -76,7 +80,7 @@ class Tests:
         return
 
     def __test_hijacks_safe_updating_cp6(self):
-        self.dh = DetectHijacks(start_table=self.rt, monitored_range='208.65.153.0/21')
+        self.dh = DetectHijacks(start_table=self.rt, monitored_range='208.65.153.0/21', cache_dir="./cache")
         self.__test_routing_find_path_cp5()
         files = ["./data/updates.20080222.0208.bz2", "./data/updates.20080224.1839.bz2",
                  "./data/updates.20080224.2009.bz2", "./data/updates.20080224.2026.bz2",
@@ -85,15 +89,36 @@ class Tests:
         self.dh.routing_table.helper_print_routing_table_descriptions()
         return
 
+    def verify_fast_decoder(self, files):
+        mismatched = []
+        for file in files:
+            slow_updates = ParseUpdates(filename=file, fast_decoder=False).stream_updates()
+            fast_updates = ParseUpdates(filename=file, fast_decoder=True).stream_updates()
+            for slow, fast in itertools.zip_longest(slow_updates, fast_updates):
+                if slow != fast:
+                    logging.error("[DECODER] Mismatch in %s at timestamp: %s" % (file, (slow or fast)['timestamp']))
+                    mismatched.append(file)
+                    break
+            else:
+                logging.info("[DECODER] FastMrtDecoder matches mrtparse for %s" % file)
+        logging.info("[DECODER] %d of %d file(s) decoded identically" % (len(files) - len(mismatched), len(files)))
+        return not mismatched
+
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--checkpoint', '-cp', help="All code until the checkpoint ID will be executed.")
+    parser.add_argument('--verify-decoder', '-vd', nargs='+', metavar='MRT_FILE',
+                        help="Check that FastMrtDecoder and mrtparse produce identical updates for these files.")
+    parser.add_argument('--metrics', '-m', action='store_true',
+                        help="Log per-stage timings and counters at the end of the run.")
     parsed_args = parser.parse_args()
+    if parsed_args.verify_decoder is not None:
+        sys.exit(0 if Tests().verify_fast_decoder(parsed_args.verify_decoder) else 1)
     if parsed_args.checkpoint is None:
         parser.print_help()
         sys.exit(0)
-    t = Tests()
+    t = Tests(metrics=Metrics(enabled=parsed_args.metrics))
     t.run_checkpoint(checkpoint=int(parsed_args.checkpoint))
 
 
@@ -0,0 +1,203 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+UpdateExporter.py
+-----------------
+The class in this file exports the announcements and withdrawals parsed from
+any number of MRT files for use by other tools. Updates are decoded into
+bounded `UpdateStore` blocks and written out block by block, so memory stays
+bounded however many files are exported. Two formats are supported:
+
+- gzip compressed NDJSON, one update per line, in the record format of
+  `ParseUpdates` with an added `type` field;
+- a gzip compressed columnar format: a short header followed by
+  length-prefixed `UpdateStore` blocks, read back by `read_columnar`.
+
+    python3 UpdateExporter.py --files "./data/*.bz2" --format columnar --output updates.cols.gz
+"""
+
+from ParseUpdates import ParseUpdates
+from Metrics import Metrics
+from UpdateStore import UpdateStore
+import argparse
+import glob
+import gzip
+import io
+import json
+import logging
+import struct
+import time
+
+COLUMNAR_MAGIC = b'MRTCOLS\x00'
+COLUMNAR_VERSION = 1
+COLUMNAR_HEADER = struct.Struct('<8sI')
+BLOCK_HEADER = struct.Struct('<Q')
+FORMATS = ('ndjson', 'columnar')
+
+
+class UpdateExporter:
+    """
+        Class for streaming parsed BGP updates of many MRT files to disk.
+    """
+    def __init__(self, filenames, cache_dir=None, fast_decoder=True, block_rows=65536, compresslevel=6,
+                 metrics=None, source=None):
+        """
+        :param filenames: MRT files to be exported, in the order they are
+        written.
+        :param cache_dir: Optional parsed-update cache directory, see
+        `ParseUpdates`. Cached files are read from the cache.
+        :param fast_decoder: See `ParseUpdates`.
+        :param block_rows: Number of updates decoded into memory at once,
+        rounded up to the end of a BGP message, see
+        `ParseUpdates.stream_update_stores`. Cached files are memory-mapped
+        and exported as a single block.
+        :param compresslevel: gzip compression level of the output.
+        :param metrics: Optional `Metrics`. Writing a block is recorded as the
+        export stage, in addition to the stages recorded by `ParseUpdates`.
+        :param source: Optional `MrtSource`, see `ParseUpdates`.
+        self.n_announcements and self.n_withdrawals are the number of updates
+        exported so far, and self.n_bytes the number of uncompressed bytes
+        written.
+        """
+        self.filenames = list(filenames)
+        self.cache_dir = cache_dir
+        self.fast_decoder = fast_decoder
+        self.block_rows = block_rows
+        self.compresslevel = compresslevel
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.source = source
+        self.n_announcements, self.n_withdrawals = 0, 0
+        self.n_bytes = 0
+        self.time_to_export = 0
+
+    def stores(self):
+        """
+        Yields the updates of every file as `UpdateStore` blocks, file by
+        file and in file order within a file. The metadata of every block
+        is set to {'filename': name of the MRT file}.
+        """
+        for filename in self.filenames:
+            pu = ParseUpdates(filename=filename, cache_dir=self.cache_dir, fast_decoder=self.fast_decoder,
+                              metrics=self.metrics, source=self.source)
+            for store in pu.stream_update_stores(self.block_rows):
+                store.metadata = {'filename': filename}
+                self.n_announcements += store.n_announcements
+                self.n_withdrawals += store.n_withdrawals
+                yield store
+
+    def to_ndjson(self, destination):
+        """
+        Writes every update to a gzip compressed NDJSON file.
+        :param destination: Location of the output file.
+        :return: Number of updates written.
+        """
+        start_time = time.time()
+        n_updates = 0
+        with gzip.open(destination, "wt", encoding="utf-8", compresslevel=self.compresslevel) as fp:
+            for store in self.stores():
+                with self.metrics.timer('export'):
+                    lines = []
+                    for row in range(len(store)):
+                        update = {'type': 'withdrawal' if store.is_withdrawal[row] else 'announcement'}
+                        update.update(store.record(row))
+                        lines.append(json.dumps(update, separators=(',', ':')))
+                    lines.append('')
+                    self.n_bytes += fp.write("\n".join(lines))
+                n_updates += len(store)
+        self.__log_export(destination, n_updates, start_time)
+        return n_updates
+
+    def to_columnar(self, destination):
+        """
+        Writes every update to a gzip compressed columnar file, one
+        `UpdateStore` block at a time.
+        :param destination: Location of the output file.
+        :return: Number of updates written.
+        """
+        start_time = time.time()
+        n_updates = 0
+        with gzip.open(destination, "wb", compresslevel=self.compresslevel) as fp:
+            self.n_bytes += fp.write(COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION))
+            for store in self.stores():
+                with self.metrics.timer('export'):
+                    block = io.BytesIO()
+                    store.write(block)
+                    self.n_bytes += fp.write(BLOCK_HEADER.pack(len(block.getbuffer())))
+                    self.n_bytes += fp.write(block.getbuffer())
+                n_updates += len(store)
+        self.__log_export(destination, n_updates, start_time)
+        return n_updates
+
+    def export(self, destination, output_format):
+        """
+        :param destination: Location of the output file.
+        :param output_format: One of FORMATS.
+        :return: Number of updates written.
+        """
+        if output_format == 'ndjson':
+            return self.to_ndjson(destination)
+        if output_format == 'columnar':
+            return self.to_columnar(destination)
+        raise ValueError("Unknown export format %r, expected one of %s" % (output_format, ", ".join(FORMATS)))
+
+    def __log_export(self, destination, n_updates, start_time):
+        self.time_to_export = time.time() - start_time
+        logging.info("[EXPORT] Wrote %d update(s) of %d file(s) to %s in %.1f second(s)" %
+                     (n_updates, len(self.filenames), destination, self.time_to_export))
+
+
+def read_ndjson(path):
+    """
+    :param path: File written by `UpdateExporter.to_ndjson`.
+    :return: Generator yielding every update as a dictionary.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as fp:
+        for line in fp:
+            yield json.loads(line)
+
+
+def read_columnar(path):
+    """
+    :param path: File written by `UpdateExporter.to_columnar`.
+    :return: Generator yielding every block as an `UpdateStore`. Only one
+        block is held in memory at a time.
+    """
+    with gzip.open(path, "rb") as fp:
+        header = fp.read(COLUMNAR_HEADER.size)
+        if len(header) < COLUMNAR_HEADER.size or COLUMNAR_HEADER.unpack(header) != (COLUMNAR_MAGIC,
+                                                                                    COLUMNAR_VERSION):
+            raise ValueError("%s is not a columnar update file of version %d" % (path, COLUMNAR_VERSION))
+        while True:
+            block_header = fp.read(BLOCK_HEADER.size)
+            if not block_header:
+                return
+            block_length, = BLOCK_HEADER.unpack(block_header)
+            store = UpdateStore.from_buffer(fp.read(block_length))
+            if store is None:
+                raise ValueError("%s holds a truncated or unreadable block" % path)
+            yield store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', '-f', nargs='+', required=True, help="MRT files or glob patterns to export.")
+    parser.add_argument('--format', default='ndjson', choices=FORMATS)
+    parser.add_argument('--output', '-o', required=True, help="Location of the gzip compressed output file.")
+    parser.add_argument('--cache-dir', help="Parsed-update cache directory.")
+    parser.add_argument('--block-rows', type=int, default=65536,
+                        help="Maximum number of updates held in memory at once.")
+    parsed_args = parser.parse_args()
+
+    files = []
+    for pattern in parsed_args.files:
+        files.extend(sorted(glob.glob(pattern)) or [pattern])
+    exporter = UpdateExporter(files, cache_dir=parsed_args.cache_dir, block_rows=parsed_args.block_rows)
+    exporter.export(parsed_args.output, parsed_args.format)
+    print("Wrote %d announcement(s) and %d withdrawal(s) of %d file(s) to %s" %
+          (exporter.n_announcements, exporter.n_withdrawals, len(files), parsed_args.output))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(filename)s:%(lineno)-4d: %(message)s',
+                        datefmt='%m-%d %H:%M')
+    main()
@@ -0,0 +1,320 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+UpdateStore.py
+--------------
+The class in this file is a compact, column oriented container for the route
+announcements and withdrawals parsed from MRT files. Every update is stored as
+one row of typed arrays instead of one Python dictionary per NLRI, and the AS
+paths and next hops shared by many updates are stored once in interning
+tables. Iterating over the store rebuilds records in the same format as the
+ones produced by `ParseUpdates`. A store can be saved to a binary cache file
+and memory-mapped back without decoding the MRT file again, or written to
+any binary stream, see `UpdateExporter`.
+"""
+
+from array import array
+import json
+import mmap
+import os
+import socket
+import struct
+import sys
+
+CACHE_MAGIC = b'MRTUPDS\x00'
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct('<8sIIII')
+
+
+def pack_prefix(prefix):
+    """
+    :param prefix: Dotted quad IPv4 address as a string.
+    :return: The address as an unsigned 32-bit integer.
+    """
+    return struct.unpack('!I', socket.inet_aton(prefix))[0]
+
+
+def unpack_prefix(packed):
+    """
+    :param packed: IPv4 address as an unsigned 32-bit integer.
+    :return: The address as a dotted quad string.
+    """
+    return socket.inet_ntoa(struct.pack('!I', packed))
+
+
+def as_path_key(as_path):
+    """
+    :param as_path: List of AS_PATH attribute values as stored in the
+        `as_path` entry of an announcement.
+    :return: The AS path as nested tuples of (segment type, AS numbers),
+        usable as a dictionary key.
+    """
+    return tuple([tuple([(segment['type'][0], tuple(segment['value'])) for segment in attribute])
+                  for attribute in as_path])
+
+
+class UpdateStore:
+    """
+        Class for storing parsed BGP updates in typed columns.
+    """
+    def __init__(self):
+        """
+        self.timestamps, self.prefixes, self.prefix_lengths, self.peer_as,
+        self.as_path_ids and self.next_hop_ids are the columns of the store.
+        Row i of every column describes the i-th update that was added.
+        self.is_withdrawal is 1 for withdrawals and 0 for announcements.
+        Withdrawals have no AS path or next hop; their ids are 0, which always
+        refers to the empty entry of the interning tables.
+        self.as_paths and self.next_hops are the interning tables. They hold
+        each distinct AS path and next hop once, in the format used by
+        `ParseUpdates`.
+        self.timestamp_records maps a timestamp to the [timestamp, date]
+        list reported by mrtparse for it.
+        self.metadata is an optional JSON serialisable value saved and
+        loaded with the store by users of the cache format.
+        """
+        self.timestamps = array('I')
+        self.prefixes = array('I')
+        self.prefix_lengths = array('B')
+        self.peer_as = array('I')
+        self.as_path_ids = array('I')
+        self.next_hop_ids = array('I')
+        self.is_withdrawal = array('B')
+        self.as_paths = [[]]
+        self.next_hops = [[]]
+        self.timestamp_records = {}
+        self.metadata = None
+        self.n_announcements, self.n_withdrawals = 0, 0
+        self.__as_path_index = {(): 0}
+        self.__next_hop_index = {(): 0}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def intern_as_path(self, as_path):
+        """
+        Returns the id of as_path in the AS path interning table, adding it if
+        it has not been seen before.
+        :param as_path: List of AS_PATH attribute values as stored in the
+            `as_path` entry of an announcement.
+        :return: Integer id of the AS path.
+        """
+        key = as_path_key(as_path)
+        as_path_id = self.__as_path_index.get(key)
+        if as_path_id is None:
+            as_path_id = len(self.as_paths)
+            self.__as_path_index[key] = as_path_id
+            self.as_paths.append(as_path)
+        return as_path_id
+
+    def intern_next_hop(self, next_hop):
+        """
+        Returns the id of next_hop in the next hop interning table, adding it
+        if it has not been seen before.
+        :param next_hop: List of NEXT_HOP attribute values as stored in the
+            `next_hop` entry of an announcement.
+        :return: Integer id of the next hop.
+        """
+        key = tuple(next_hop)
+        next_hop_id = self.__next_hop_index.get(key)
+        if next_hop_id is None:
+            next_hop_id = len(self.next_hops)
+            self.__next_hop_index[key] = next_hop_id
+            self.next_hops.append(next_hop)
+        return next_hop_id
+
+    def add_announcement(self, timestamp, peer_as, prefix, prefix_length, as_path_id, next_hop_id):
+        """
+        Appends an announcement row.
+        :param timestamp: [timestamp, date] list obtained from the BGP header.
+        :param peer_as: Peer AS obtained from the BGP header.
+        :param prefix: Announced prefix as a dotted quad string.
+        :param prefix_length: Announced prefix length.
+        :param as_path_id: Id returned by `intern_as_path`.
+        :param next_hop_id: Id returned by `intern_next_hop`.
+        """
+        self.__add(timestamp, peer_as, prefix, prefix_length, as_path_id, next_hop_id, 0)
+        self.n_announcements += 1
+
+    def add_withdrawal(self, timestamp, peer_as, prefix, prefix_length):
+        """
+        Appends a withdrawal row.
+        :param timestamp: [timestamp, date] list obtained from the BGP header.
+        :param peer_as: Peer AS obtained from the BGP header.
+        :param prefix: Withdrawn prefix as a dotted quad string.
+        :param prefix_length: Withdrawn prefix length.
+        """
+        self.__add(timestamp, peer_as, prefix, prefix_length, 0, 0, 1)
+        self.n_withdrawals += 1
+
+    def __add(self, timestamp, peer_as, prefix, prefix_length, as_path_id, next_hop_id, is_withdrawal):
+        if timestamp[0] not in self.timestamp_records:
+            self.timestamp_records[timestamp[0]] = timestamp
+        self.timestamps.append(timestamp[0])
+        self.prefixes.append(pack_prefix(prefix))
+        self.prefix_lengths.append(prefix_length)
+        self.peer_as.append(int(peer_as))
+        self.as_path_ids.append(as_path_id)
+        self.next_hop_ids.append(next_hop_id)
+        self.is_withdrawal.append(is_withdrawal)
+
+    def record(self, row):
+        """
+        Rebuilds the update stored in a row as a dictionary in the format
+        produced by `ParseUpdates`. Records rebuilt from the same store share
+        their `as_path` and `next_hop` lists, so they must not be modified.
+        :param row: Index of the row.
+        :return: Announcement or withdrawal dictionary.
+        """
+        update = {
+            'timestamp': self.timestamp_records[self.timestamps[row]],
+            'range': {'prefix_length': self.prefix_lengths[row], 'prefix': unpack_prefix(self.prefixes[row])},
+        }
+        if not self.is_withdrawal[row]:
+            update['next_hop'] = self.next_hops[self.next_hop_ids[row]]
+        update['peer_as'] = str(self.peer_as[row])
+        if not self.is_withdrawal[row]:
+            update['as_path'] = self.as_paths[self.as_path_ids[row]]
+        return update
+
+    def __iter__(self):
+        """
+        Yields every update as a dictionary, in the order it was added.
+        """
+        for row in range(len(self.timestamps)):
+            yield self.record(row)
+
+    def get_next_updates(self):
+        """
+        Yields the next collection of announcements and withdrawals, sorted by
+        time, in the same format as `ParseUpdates.get_next_updates`. Records
+        are only built for the timestamp being yielded.
+        :return:
+        """
+        timestamps = self.timestamps
+        rows = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        start = 0
+        while start < len(rows):
+            timestamp = timestamps[rows[start]]
+            end = start
+            while end < len(rows) and timestamps[rows[end]] == timestamp:
+                end += 1
+            update_record = {'announcements': [], 'withdrawals': [], 'timestamp': timestamp}
+            for row in rows[start:end]:
+                if self.is_withdrawal[row]:
+                    update_record['withdrawals'].append(self.record(row))
+                else:
+                    update_record['announcements'].append(self.record(row))
+            yield update_record
+            start = end
+        yield {'announcements': [], 'withdrawals': [], 'timestamp': None}
+
+    def nbytes(self):
+        """
+        :return: Number of bytes used by the typed columns.
+        """
+        columns = [self.timestamps, self.prefixes, self.prefix_lengths, self.peer_as, self.as_path_ids,
+                   self.next_hop_ids, self.is_withdrawal]
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def save(self, path):
+        """
+        Writes the store to a binary cache file, see `write`. It is written
+        to a temporary file first and renamed, so a partially written cache
+        is never picked up.
+        :param path: Location of the cache file.
+        """
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as fp:
+            self.write(fp)
+        os.replace(tmp_path, path)
+
+    def write(self, fp):
+        """
+        Writes the store to a binary file object. The output holds a fixed
+        header, the raw bytes of every column and the interning tables as
+        JSON.
+        :param fp: File object opened for writing in binary mode.
+        :return: Number of bytes written.
+        """
+        tables = json.dumps({
+            'as_paths': self.as_paths,
+            'next_hops': self.next_hops,
+            'timestamps': list(self.timestamp_records.values()),
+            'metadata': self.metadata,
+        }).encode('utf-8')
+        byteorder = 0 if sys.byteorder == 'little' else 1
+        n_bytes = fp.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(self), byteorder, len(tables)))
+        for column in self.__columns():
+            n_bytes += fp.write(column.tobytes() if isinstance(column, array) else bytes(column))
+        n_bytes += fp.write(tables)
+        return n_bytes
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-maps a cache file written by `save`. The columns of the
+        returned store are read-only views into the mapped file; only the
+        interning tables are decoded. Stores loaded from a cache cannot be
+        added to.
+        :param path: Location of the cache file.
+        :return: The loaded `UpdateStore`, or None if the file is missing, was
+            written by another version or on a machine of other byte order.
+        """
+        try:
+            with open(path, "rb") as fp:
+                buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        return cls.from_buffer(buffer)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """
+        Reads a store written by `write` from a buffer without copying its
+        columns. The buffer is kept alive by the returned store.
+        :param buffer: Object supporting the buffer protocol, e.g. bytes or
+            an mmap.
+        :return: The `UpdateStore`, or None if the buffer is too short, is
+            corrupt, was written by another version or on a machine of other
+            byte order.
+        """
+        view = memoryview(buffer).cast('B')
+        if len(view) < CACHE_HEADER.size:
+            return None
+        magic, version, n_rows, byteorder, tables_length = CACHE_HEADER.unpack_from(view)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION or byteorder != (0 if sys.byteorder == 'little' else 1):
+            return None
+
+        store = cls()
+        tables_offset = CACHE_HEADER.size + sum(column.itemsize * n_rows for column in store.__columns())
+        if tables_offset + tables_length > len(view):
+            return None
+        offset = CACHE_HEADER.size
+        columns = []
+        for column in store.__columns():
+            size = column.itemsize * n_rows
+            columns.append(view[offset:offset + size].cast(column.typecode))
+            offset += size
+        (store.timestamps, store.prefixes, store.peer_as, store.as_path_ids, store.next_hop_ids,
+         store.prefix_lengths, store.is_withdrawal) = columns
+        try:
+            tables = json.loads(bytes(view[offset:offset + tables_length]).decode('utf-8'))
+            store.as_paths = tables['as_paths']
+            store.next_hops = tables['next_hops']
+            store.timestamp_records = {timestamp[0]: timestamp for timestamp in tables['timestamps']}
+            store.metadata = tables.get('metadata')
+        except (ValueError, KeyError, TypeError, IndexError):
+            return None
+        store.n_withdrawals = sum(store.is_withdrawal)
+        store.n_announcements = n_rows - store.n_withdrawals
+        store.__buffer = buffer
+        return store
+
+    def __columns(self):
+        """
+        Columns in the order they are laid out in a cache file. The 4-byte
+        columns come first so that every column stays aligned.
+        """
+        return [self.timestamps, self.prefixes, self.peer_as, self.as_path_ids, self.next_hop_ids,
+                self.prefix_lengths, self.is_withdrawal]
@@ -0,0 +1,197 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+VersionedRoutingTable.py
+------------------------
+The class in this file is a `RoutingTable` that remembers its history. Every
+change to the route installed for a range is recorded in a global change log
+and in a per-range change log, and a copy of the table is kept every few
+thousand changes. The route to an address at any past time is then found by
+binary search in the change logs of the ranges that could contain it, and the
+whole table at a past time is rebuilt from the closest earlier copy.
+"""
+
+from RoutingTable import RoutingTable, prefix_key, route_description
+from bisect import bisect_right
+import ipaddress
+import logging
+import sys
+if sys.version_info[0] >= 3:
+    unicode = str
+
+
+class VersionedRoutingTable(RoutingTable):
+    """
+        Class for routing tables that can be queried as of any past timestamp.
+    """
+    def __init__(self, checkpoint_interval=10000, metrics=None):
+        """
+        :param checkpoint_interval: Number of route changes between two
+        copies of the table. Smaller values make `routing_table_at` faster
+        and use more memory.
+        :param metrics: Optional `Metrics`, see `RoutingTable`.
+        self.changes is the global change log: a list of (timestamp, key,
+        entry) tuples in the order the changes happened. entry is the route
+        installed for key from timestamp on, or None if the range was
+        removed.
+        self.checkpoints is a list of (timestamp, position in self.changes,
+        copy of self.routing_table) tuples. The first one is taken before the
+        first update is applied.
+        self.range_history maps every range that has ever been in the table
+        to a (timestamps, entries) tuple of lists, its own change log.
+        Both logs stay sorted by timestamp: a change made by an update older
+        than the previous change is recorded at the previous change's
+        timestamp.
+        """
+        super().__init__(metrics=metrics)
+        self.checkpoint_interval = checkpoint_interval
+        self.changes = []
+        self.checkpoints = []
+        self.range_history = {}
+
+    def apply_announcement(self, announcement):
+        """
+        Applies the announcement as `RoutingTable.apply_announcement` does
+        and records the change it made, if any.
+        :param announcement: Announcement dictionary.
+        :return: True if no exceptions. False otherwise.
+        """
+        timestamp = announcement['timestamp'][0]
+        self.__start(timestamp)
+        result = super().apply_announcement(announcement)
+        self.__record(timestamp, prefix_key(announcement['range']['prefix'], announcement['range']['prefix_length']))
+        return result
+
+    def apply_withdrawal(self, withdrawal):
+        """
+        Applies the withdrawal as `RoutingTable.apply_withdrawal` does and
+        records the change it made, if any.
+        :param withdrawal: Withdrawal dictionary.
+        :return: True if no exceptions. False otherwise.
+        """
+        timestamp = withdrawal['timestamp'][0]
+        self.__start(timestamp)
+        result = super().apply_withdrawal(withdrawal)
+        self.__record(timestamp, prefix_key(withdrawal['range']['prefix'], withdrawal['range']['prefix_length']))
+        return result
+
+    def collapse_routing_table(self):
+        """
+        Collapses the table as `RoutingTable.collapse_routing_table` does and
+        records the removed ranges as changes at self.time_of_latest_update.
+        :return: True if no exceptions occurred. False if an exception occurred.
+        """
+        keys = list(self.routing_table)
+        result = super().collapse_routing_table()
+        if self.checkpoints:
+            for key in keys:
+                self.__record(self.time_of_latest_update, key)
+        return result
+
+    def __start(self, timestamp):
+        """
+        Takes the first checkpoint before the first update is applied. Tables
+        restored with `load` start with routes, which are recorded as their
+        first changes.
+        """
+        if self.checkpoints:
+            return
+        self.checkpoints.append((timestamp - 1, 0, dict(self.routing_table)))
+        for key, entry in self.routing_table.items():
+            self.range_history[key] = ([timestamp - 1], [entry])
+
+    def __record(self, timestamp, key):
+        entry = self.routing_table.get(key)
+        history = self.range_history.get(key)
+        if history is None:
+            if entry is None:
+                return
+            history = self.range_history[key] = ([], [])
+        elif history[1][-1] is entry:
+            return
+        if self.changes and timestamp < self.changes[-1][0]:
+            timestamp = self.changes[-1][0]
+        history[0].append(timestamp)
+        history[1].append(entry)
+        self.changes.append((timestamp, key, entry))
+        if len(self.changes) - self.checkpoints[-1][1] >= self.checkpoint_interval:
+            self.checkpoints.append((timestamp, len(self.changes), dict(self.routing_table)))
+
+    def __check_time(self, at):
+        if not self.checkpoints or at < self.checkpoints[0][0]:
+            raise ValueError("No routing table history for timestamp %s" % at)
+
+    def entry_at(self, key, at):
+        """
+        :param key: A routing table key.
+        :param at: Timestamp.
+        :return: The entry installed for key once every update with a
+            timestamp up to at had been applied, or None.
+        """
+        self.__check_time(at)
+        history = self.range_history.get(key)
+        if history is None:
+            return None
+        position = bisect_right(history[0], at)
+        return history[1][position - 1] if position else None
+
+    def routing_table_at(self, at):
+        """
+        Rebuilds the table as it was once every update with a timestamp up to
+        at had been applied. Only the changes made after the closest earlier
+        checkpoint are replayed.
+        :param at: Timestamp.
+        :return: Dictionary keyed like self.routing_table.
+        """
+        self.__check_time(at)
+        checkpoint = bisect_right(self.checkpoints, at, key=lambda checkpoint: checkpoint[0]) - 1
+        _, position, table = self.checkpoints[checkpoint]
+        table = dict(table)
+        end = bisect_right(self.changes, at, lo=position, key=lambda change: change[0])
+        for _, key, entry in self.changes[position:end]:
+            if entry is None:
+                table.pop(key, None)
+            else:
+                table[key] = entry
+        return table
+
+    def find_path_to_destination(self, destination, at=None):
+        """
+        Longest prefix match as in `RoutingTable.find_path_to_destination`.
+        :param destination: An IPv4 address as a *string* object.
+        :param at: Optional timestamp. If given, the routes are the ones that
+            were in the table once every update with a timestamp up to at had
+            been applied. Each of the 33 ranges that can contain destination
+            is looked up by binary search in its change log.
+        :return: List of routes in decreasing order of prefix length (see
+            `RoutingTable.find_path_to_destination`).
+        """
+        if at is None:
+            return super().find_path_to_destination(destination)
+
+        address = int(ipaddress.IPv4Address(destination))
+        routes = []
+        for length in range(32, -1, -1):
+            key = (address & (0xffffffff << (32 - length)) & 0xffffffff, length)
+            entry = self.entry_at(key, at)
+            if entry is not None:
+                routes.append(route_description(key, entry))
+        if not routes:
+            routes = [{"as_path": None, "next_hop": None, "prefix_len": None, "source_as": None}]
+        return routes
+
+
+def main():
+    vrt = VersionedRoutingTable()
+    files = ["./data/updates.20080224.1839.bz2", "./data/updates.20080224.2009.bz2",
+             "./data/updates.20080224.2026.bz2", "./data/updates.20080224.2041.bz2",
+             "./data/updates.20080224.2056.bz2"]
+    vrt.replay(files, cache_dir="./cache")
+    logging.info("%d route changes recorded, %d checkpoints" % (len(vrt.changes), len(vrt.checkpoints)))
+    for at in range(vrt.checkpoints[0][0] + 1, vrt.time_of_latest_update + 1, 600):
+        for path in vrt.find_path_to_destination(unicode("208.65.153.238"), at=at):
+            print(at, path)
+
+
+if __name__ == '__main__':
+    main()
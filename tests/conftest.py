@@ -0,0 +1,41 @@
+"""
+CS3640 | Fall 2021 | Assignment 3
+BGP Routing Tables and Identifying BGP Hijacks
+tests/conftest.py
+-----------------
+Shared pytest setup. The modules of the assignment live in the repository
+root, and the MRT files used by the tests in ./data/.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, "data")
+# The smallest update file of the dataset, so the tests stay quick.
+SMALL_MRT_FILE = os.path.join(DATA_DIR, "updates.20080222.0138.bz2")
+
+AS_ORG_2008 = os.path.join(DATA_DIR, "20080402.as-org2info.jsonl.gz")
+# A few consecutive small update files.
+SMALL_MRT_FILES = [os.path.join(DATA_DIR, name) for name in
+                   ("updates.20080224.0238.bz2", "updates.20080224.0253.bz2", "updates.20080224.0308.bz2")]
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def small_mrt_file():
+    if not os.path.exists(SMALL_MRT_FILE):
+        pytest.skip("%s is not available" % SMALL_MRT_FILE)
+    return SMALL_MRT_FILE
+
+
+@pytest.fixture(scope="session")
+def small_mrt_files():
+    missing = [filename for filename in SMALL_MRT_FILES if not os.path.exists(filename)]
+    if missing:
+        pytest.skip("%s is not available" % ", ".join(missing))
+    return list(SMALL_MRT_FILES)
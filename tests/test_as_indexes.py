@@ -0,0 +1,59 @@
+"""
+The origin and transit AS indexes of `RoutingTable` must match a brute-force
+scan of the routing table as routes are announced, replaced, collapsed and
+withdrawn.
+"""
+
+from ParseUpdates import ParseUpdates
+from RoutingTable import RoutingTable, origin_as, path_ases
+
+
+def replay(rt, filename, announced):
+    for next_updates in ParseUpdates(filename=filename).stream_updates():
+        for announcement in next_updates['announcements']:
+            rt.apply_announcement(announcement)
+            announced[(announcement['range']['prefix'], announcement['range']['prefix_length'],
+                       announcement['peer_as'])] = announcement
+        for withdrawal in next_updates['withdrawals']:
+            rt.apply_withdrawal(withdrawal)
+
+
+def brute_force_indexes(rt):
+    by_origin, by_as = {}, {}
+    for key, entry in rt.routing_table.items():
+        by_origin.setdefault(origin_as(entry), set()).add(key)
+        for asn in path_ases(entry):
+            by_as.setdefault(asn, set()).add(key)
+    return by_origin, by_as
+
+
+def assert_indexes(rt):
+    by_origin, by_as = brute_force_indexes(rt)
+    assert rt.prefixes_by_origin == by_origin
+    assert rt.prefixes_by_as == by_as
+    for asn, keys in by_origin.items():
+        assert rt.prefixes_originated_by(asn) == keys
+        assert rt.prefixes_originated_by(int(asn)) == keys
+    for asn, keys in by_as.items():
+        assert rt.prefixes_through(int(asn)) == keys
+        assert by_origin.get(asn, set()) <= keys
+
+
+def test_indexes_match_the_routing_table(small_mrt_files):
+    rt, announced = RoutingTable(), {}
+    replay(rt, small_mrt_files[0], announced)
+    assert_indexes(rt)
+    assert rt.prefixes_originated_by('4294967295') == frozenset()
+    assert rt.prefixes_through(4294967295) == frozenset()
+
+    rt.collapse_routing_table()
+    assert_indexes(rt)
+
+    replay(rt, small_mrt_files[1], announced)
+    assert_indexes(rt)
+
+    for prefix, prefix_length, peer in announced:
+        rt.apply_withdrawal({'timestamp': (0, ''), 'peer_as': peer,
+                             'range': {'prefix': prefix, 'prefix_length': prefix_length}})
+    assert rt.routing_table == {}
+    assert rt.prefixes_by_origin == {} and rt.prefixes_by_as == {}
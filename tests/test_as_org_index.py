@@ -0,0 +1,95 @@
+"""
+`AsOrgIndex`: compiling, memory-mapping and looking up the AS to
+organization index, and rebuilding a damaged index file.
+"""
+
+import gzip
+import json
+import logging
+import os
+
+import pytest
+
+from conftest import AS_ORG_2008
+from AsOrgIndex import AsOrgIndex, INDEX_HEADER
+
+RECORDS = [
+    {"type": "Organization", "organizationId": "YT-ARIN", "name": "YouTube, Inc."},
+    {"type": "Organization", "organizationId": "PT-AP", "name": "Pakistan Telecom"},
+    {"asn": "36561", "organizationId": "YT-ARIN", "name": "YOUTUBE"},
+    {"asn": "17557", "organizationId": "PT-AP", "name": "PKTELECOM-AS-PK"},
+    {"asn": "64512", "organizationId": "UNLISTED", "name": "PRIVATE-AS"},
+    {"asn": "not-a-number", "organizationId": "PT-AP", "name": "BROKEN"},
+]
+EXPECTED = {'36561': "YouTube, Inc.", '17557': "Pakistan Telecom", '64512': "PRIVATE-AS", '3491': "UNKNOWN",
+            'AS1': "UNKNOWN", None: "UNKNOWN"}
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = str(tmp_path / "as-org2info.jsonl.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as fp:
+        for record in RECORDS:
+            fp.write(json.dumps(record) + "\n")
+    return path
+
+
+def lookups(index):
+    return {asn: index.get(asn) for asn in EXPECTED}
+
+
+def compiled(caplog):
+    return any("Building" in record.getMessage() for record in caplog.records)
+
+
+def test_in_memory_index(dataset, tmp_path):
+    index = AsOrgIndex(dataset=dataset)
+    assert index.index_path() is None
+    assert lookups(index) == EXPECTED
+    assert len(index) == 3
+    assert os.listdir(tmp_path) == [os.path.basename(dataset)]
+
+
+def test_cached_index_round_trip(dataset, tmp_path, caplog):
+    cache_dir = str(tmp_path / "cache")
+    with caplog.at_level(logging.INFO):
+        assert lookups(AsOrgIndex(dataset=dataset, cache_dir=cache_dir)) == EXPECTED
+    assert compiled(caplog)
+    assert os.listdir(cache_dir) == [os.path.basename(AsOrgIndex(dataset, cache_dir).index_path())]
+
+    caplog.clear()
+    with caplog.at_level(logging.INFO):
+        assert lookups(AsOrgIndex(dataset=dataset, cache_dir=cache_dir)) == EXPECTED
+    assert not compiled(caplog)
+
+
+@pytest.mark.parametrize("damage", [
+    lambda data: data[:INDEX_HEADER.size - 1],
+    lambda data: data[:INDEX_HEADER.size + 6],
+    lambda data: data[:-3],
+    lambda data: data + b'extra',
+    lambda data: b'',
+])
+def test_damaged_index_is_rebuilt(dataset, tmp_path, caplog, damage):
+    cache_dir = str(tmp_path / "cache")
+    index = AsOrgIndex(dataset=dataset, cache_dir=cache_dir)
+    len(index)
+    path = index.index_path()
+    with open(path, "rb") as fp:
+        data = fp.read()
+    with open(path, "wb") as fp:
+        fp.write(damage(data))
+
+    with caplog.at_level(logging.INFO):
+        assert lookups(AsOrgIndex(dataset=dataset, cache_dir=cache_dir)) == EXPECTED
+    assert compiled(caplog)
+    with open(path, "rb") as fp:
+        assert fp.read() == data
+
+
+def test_caida_dataset():
+    if not os.path.exists(AS_ORG_2008):
+        pytest.skip("%s is not available" % AS_ORG_2008)
+    index = AsOrgIndex(dataset=AS_ORG_2008)
+    assert index.get('36561') == "YouTube, Inc."
+    assert index.get('17557') == "Pakistan Telecom"
@@ -0,0 +1,80 @@
+"""
+`Benchmarks.compare` flags the scenarios that got slower or use more memory
+than a saved baseline.
+"""
+
+import copy
+import json
+
+import pytest
+
+from Benchmarks import Benchmarks
+
+
+def result(seconds, peak_memory=None):
+    return {'seconds': seconds, 'mean_seconds': seconds, 'items': 100, 'unit': 'updates',
+            'throughput': 100 / seconds, 'peak_memory': peak_memory}
+
+
+@pytest.fixture
+def bench():
+    bench = Benchmarks(files=['a.bz2', 'b.bz2'])
+    bench.results = {
+        'parse': result(1.0, 1000),
+        'apply': result(2.0, 1000),
+        'lpm': result(0.001),
+        'collapse': result(0.5),
+    }
+    return bench
+
+
+def baseline(bench, **scenarios):
+    report = copy.deepcopy(bench.report())
+    report['scenarios'].update(scenarios)
+    return json.loads(json.dumps(report))
+
+
+def test_no_regression_against_itself(bench):
+    assert bench.compare(baseline(bench)) == []
+
+
+def test_slower_and_larger_scenarios_are_reported(bench):
+    regressions = bench.compare(baseline(bench, parse=result(0.5, 1000), apply=result(2.0, 500)))
+    assert regressions == ["parse: seconds went from 0.5 to 1.0 (+100.0%)",
+                           "apply: peak_memory went from 500 to 1000 (+100.0%)"]
+
+
+def test_threshold_and_noise_floor(bench):
+    within_threshold = baseline(bench, parse=result(0.9, 1000))
+    assert bench.compare(within_threshold) == []
+    assert len(bench.compare(within_threshold, threshold=0.05)) == 1
+
+    noisy = baseline(bench, lpm=result(0.0001))
+    assert bench.compare(noisy) == []
+    assert bench.compare(noisy, min_seconds=0) == ["lpm: seconds went from 0.0001 to 0.001 (+900.0%)"]
+
+
+def test_missing_scenarios_and_measurements_are_skipped(bench):
+    report = baseline(bench, apply=result(1.0))
+    del report['scenarios']['parse']
+    bench.results['collapse']['peak_memory'] = 10
+    assert bench.compare(report) == ["apply: seconds went from 1.0 to 2.0 (+100.0%)"]
+
+
+def test_baseline_over_other_files_is_rejected(bench):
+    report = baseline(bench)
+    report['files'] = ['a.bz2']
+    with pytest.raises(ValueError):
+        bench.compare(report)
+
+
+def test_compare_a_real_run(small_mrt_file):
+    bench = Benchmarks(files=[small_mrt_file], repeat=1, lookups=100, measure_memory=False)
+    bench.run(['apply', 'reachability', 'lpm'])
+    assert set(bench.results) == {'apply', 'reachability', 'lpm'}
+    assert bench.results['apply']['items'] > 0
+
+    report = baseline(bench)
+    assert bench.compare(report) == []
+    report['scenarios']['apply']['seconds'] = bench.results['apply']['seconds'] / 4
+    assert [message.split(':')[0] for message in bench.compare(report, min_seconds=0)] == ['apply']
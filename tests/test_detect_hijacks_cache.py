@@ -0,0 +1,31 @@
+"""
+`DetectHijacks.update_routing_table_safely` gives the same results with and
+without a parsed-update cache, and only writes a cache when asked to.
+"""
+
+import os
+
+from conftest import AS_ORG_2008
+from DetectHijacks import DetectHijacks
+from RoutingTable import RoutingTable
+
+MONITORED_RANGE = {'12.0.0.0/8': ['7018']}
+
+
+def detect(files, cache_dir=None):
+    dh = DetectHijacks(start_table=RoutingTable(), monitored_range=MONITORED_RANGE, as_org_dataset=AS_ORG_2008)
+    dh.update_routing_table_safely(files, cache_dir=cache_dir)
+    return (dh.routing_table.routing_table, dh.all_announcements_to_monitored_range,
+            dh.suspicious_announcements_to_monitored_range)
+
+
+def test_cache_dir_gives_the_same_results(small_mrt_file, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    uncached = detect([small_mrt_file])
+    assert uncached[1] and uncached[2]
+    assert not os.listdir(tmp_path)
+
+    cache_dir = str(tmp_path / "parsed")
+    assert detect([small_mrt_file], cache_dir=cache_dir) == uncached
+    assert len(os.listdir(cache_dir)) == 1
+    assert detect([small_mrt_file], cache_dir=cache_dir) == uncached
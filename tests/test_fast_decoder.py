@@ -0,0 +1,32 @@
+"""
+Differential check of `FastMrtDecoder` against mrtparse, the same check as
+`python3 Tests.py --verify-decoder`.
+"""
+
+import itertools
+
+import pytest
+
+from ParseUpdates import ParseUpdates
+
+
+def test_fast_decoder_matches_mrtparse(small_mrt_file):
+    pytest.importorskip("mrtparse")
+    slow_updates = ParseUpdates(filename=small_mrt_file, fast_decoder=False).stream_updates()
+    fast_updates = ParseUpdates(filename=small_mrt_file, fast_decoder=True).stream_updates()
+    n_records = 0
+    for slow, fast in itertools.zip_longest(slow_updates, fast_updates):
+        assert slow == fast, "Mismatch at timestamp %s" % (slow or fast)['timestamp']
+        n_records += 1
+    assert n_records > 1
+
+
+def test_fast_decoder_counts_match_mrtparse(small_mrt_file):
+    pytest.importorskip("mrtparse")
+    slow = ParseUpdates(filename=small_mrt_file, fast_decoder=False)
+    fast = ParseUpdates(filename=small_mrt_file, fast_decoder=True)
+    for _ in slow.stream_updates():
+        pass
+    for _ in fast.stream_updates():
+        pass
+    assert (slow.n_announcements, slow.n_withdrawals) == (fast.n_announcements, fast.n_withdrawals)
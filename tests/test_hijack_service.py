@@ -0,0 +1,73 @@
+"""
+`HijackService` picks up the files of a watched directory and checks them the
+same way a serial `DetectHijacks` run does.
+"""
+
+import asyncio
+import os
+import shutil
+
+import pytest
+
+from conftest import AS_ORG_2008, DATA_DIR, SMALL_MRT_FILE
+from DetectHijacks import DetectHijacks
+from HijackService import HijackService
+from Metrics import Metrics
+from RoutingTable import RoutingTable
+
+HIJACK_FILE = os.path.join(DATA_DIR, "updates.20080224.1839.bz2")
+MONITORED_RANGE = {'208.65.152.0/22': ['36561']}
+
+
+def detector(metrics=None):
+    return DetectHijacks(start_table=RoutingTable(metrics=metrics), monitored_range=MONITORED_RANGE,
+                         as_org_dataset=AS_ORG_2008)
+
+
+async def run_until_processed(service, n_files, timeout=120):
+    async def stop_when_done():
+        while len(service.processed_files) < n_files:
+            await asyncio.sleep(0.05)
+        service.stop()
+    await asyncio.wait_for(asyncio.gather(service.run(), stop_when_done()), timeout)
+
+
+def test_service_matches_serial_detection(tmp_path):
+    files = [SMALL_MRT_FILE, HIJACK_FILE]
+    if not all(os.path.exists(filename) for filename in files + [AS_ORG_2008]):
+        pytest.skip("The MRT files are not available")
+    watched = tmp_path / "watched"
+    watched.mkdir()
+    for filename in files:
+        shutil.copy(filename, watched)
+
+    expected = detector()
+    expected.update_routing_table_safely(files)
+
+    alerts = []
+    dh = detector(Metrics())
+    service = HijackService(detector=dh, directory=str(watched), poll_interval=0.05, max_workers=1,
+                            process_existing=True, on_alert=lambda path, announcement, latency: alerts.append(path))
+    asyncio.run(run_until_processed(service, len(files)))
+
+    assert service.processed_files == [str(watched / os.path.basename(filename)) for filename in files]
+    assert dh.routing_table.routing_table == expected.routing_table.routing_table
+    assert dh.suspicious_announcements_to_monitored_range == expected.suspicious_announcements_to_monitored_range
+    assert alerts == [service.processed_files[1]] * len(expected.suspicious_announcements_to_monitored_range)
+    assert dh.metrics.timers['alert_latency'][0] == len(alerts) == len(service.alert_latencies)
+    assert dh.metrics.timers['file_latency'][0] == len(files) == len(service.file_latencies)
+    assert max(service.alert_latencies) <= max(service.file_latencies)
+
+
+def test_existing_files_are_skipped_by_default(tmp_path, small_mrt_file):
+    shutil.copy(small_mrt_file, tmp_path)
+    service = HijackService(detector=detector(), directory=str(tmp_path), poll_interval=0.05, max_workers=1)
+
+    async def run():
+        task = asyncio.ensure_future(service.run())
+        await asyncio.sleep(0.5)
+        service.stop()
+        await asyncio.wait_for(task, 60)
+    asyncio.run(run())
+
+    assert service.processed_files == []
@@ -0,0 +1,85 @@
+"""
+`HijackWatchList` classification, and hijack detection on the 2008 YouTube
+hijack.
+"""
+
+import os
+
+import pytest
+
+from conftest import AS_ORG_2008, DATA_DIR
+from DetectHijacks import DetectHijacks
+from HijackWatchList import EXACT, LESS_SPECIFIC, MORE_SPECIFIC, HijackWatchList
+from RoutingTable import RoutingTable, key_contains, origin_as, prefix_key
+
+HIJACK_FILE = os.path.join(DATA_DIR, "updates.20080224.1839.bz2")
+
+
+def key(network):
+    prefix, length = network.split('/')
+    return prefix_key(prefix, int(length))
+
+
+@pytest.fixture
+def watch_list():
+    wl = HijackWatchList()
+    wl.watch('208.65.152.0/22', ['36561'])
+    wl.watch('208.65.153.0/24', ['36561'])
+    wl.watch('10.0.0.0/8')
+    return wl
+
+
+def relations(matches):
+    return [(relation, watched, conflict) for relation, watched, _, conflict in matches]
+
+
+def test_exact_announcement_by_expected_origin(watch_list):
+    assert relations(watch_list.classify(key('208.65.152.0/22'), '36561')) == [
+        (EXACT, key('208.65.152.0/22'), False),
+        (LESS_SPECIFIC, key('208.65.153.0/24'), False)]
+
+
+def test_more_specific_announcement_lists_most_specific_range_first(watch_list):
+    assert relations(watch_list.classify(key('208.65.153.128/25'), '17557')) == [
+        (MORE_SPECIFIC, key('208.65.153.0/24'), True),
+        (MORE_SPECIFIC, key('208.65.152.0/22'), True)]
+
+
+def test_less_specific_announcement(watch_list):
+    assert relations(watch_list.classify(key('208.65.0.0/16'), '3491')) == [
+        (LESS_SPECIFIC, key('208.65.152.0/22'), True),
+        (LESS_SPECIFIC, key('208.65.153.0/24'), True)]
+    assert watch_list.conflicts(key('208.65.0.0/16'), '3491') == watch_list.classify(key('208.65.0.0/16'), '3491')
+
+
+def test_unrelated_announcement(watch_list):
+    assert watch_list.classify(key('8.8.8.0/24'), '15169') == []
+
+
+def test_origins_are_learnt_from_the_first_announcement(watch_list):
+    assert relations(watch_list.classify(key('10.1.0.0/16'), '100')) == [(MORE_SPECIFIC, key('10.0.0.0/8'), False)]
+    assert watch_list.expected_origins('10.0.0.0/8') == {'100'}
+    assert relations(watch_list.classify(key('10.2.0.0/16'), '200')) == [(MORE_SPECIFIC, key('10.0.0.0/8'), True)]
+
+
+def test_origins_are_not_learnt_when_disabled():
+    wl = HijackWatchList(learn_origins=False)
+    wl.watch('10.0.0.0/8')
+    assert relations(wl.classify(key('10.1.0.0/16'), '100')) == [(MORE_SPECIFIC, key('10.0.0.0/8'), False)]
+    assert wl.expected_origins('10.0.0.0/8') == set()
+
+
+def test_youtube_hijack_is_detected():
+    if not os.path.exists(HIJACK_FILE) or not os.path.exists(AS_ORG_2008):
+        pytest.skip("The hijack data is not available")
+    rt = RoutingTable()
+    dh = DetectHijacks(start_table=rt, monitored_range={'208.65.152.0/22': ['36561']}, as_org_dataset=AS_ORG_2008)
+    dh.update_routing_table_safely([HIJACK_FILE])
+
+    suspicious = dh.suspicious_announcements_to_monitored_range
+    assert suspicious
+    assert set(origin_as(announcement) for announcement in suspicious) == {'17557'}
+    assert set(key(announcement['range']['prefix'] + '/' + str(announcement['range']['prefix_length']))
+               for announcement in suspicious) == {key('208.65.153.0/24')}
+    assert all(origin_as(entry) != '17557' for k, entry in rt.routing_table.items()
+               if key_contains(key('208.65.152.0/22'), k))
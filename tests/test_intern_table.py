@@ -0,0 +1,59 @@
+"""
+Reference counting of `InternTable`, on its own and for the AS paths of a
+`RoutingTable`.
+"""
+
+from collections import Counter
+
+from InternTable import InternTable
+from ParseUpdates import ParseUpdates
+from RoutingTable import RoutingTable
+
+
+def test_values_are_dropped_with_their_last_reference():
+    table = InternTable()
+    first = table.intern(('a',), ['a'])
+    assert table.intern(('a',), ['a', 'copy']) == first
+    assert table[first] == ['a'] and table.references[first] == 2
+    second = table.intern(('b',), ['b'])
+    table.acquire(second)
+
+    table.release(first)
+    assert len(table) == 2 and table.references[first] == 1
+    table.release(first)
+    assert len(table) == 1 and table.references[first] == 0
+    assert table.keys[first] is None and table[first] is None
+
+    assert table.intern(('c',), ['c']) == first
+    assert table.intern(('a',), ['a']) == 2
+    table.release(second)
+    assert table.references[second] == 1
+
+
+def assert_path_references(rt):
+    in_use = Counter(route[2] for routes in rt.adj_rib_in.values() for route in routes.values())
+    assert len(rt.as_paths) == len(in_use)
+    for path_id, references in enumerate(rt.as_paths.references):
+        assert references == in_use.get(path_id, 0)
+        assert (references == 0) == (rt.as_paths.keys[path_id] is None)
+
+
+def test_as_path_references_drop_to_zero_after_withdrawal(small_mrt_files):
+    rt, announced = RoutingTable(), set()
+    for filename in small_mrt_files[:2]:
+        for next_updates in ParseUpdates(filename=filename).stream_updates():
+            for announcement in next_updates['announcements']:
+                rt.apply_announcement(announcement)
+                announced.add((announcement['range']['prefix'], announcement['range']['prefix_length'],
+                               announcement['peer_as']))
+            for withdrawal in next_updates['withdrawals']:
+                rt.apply_withdrawal(withdrawal)
+        assert_path_references(rt)
+    assert len(rt.as_paths)
+
+    for prefix, prefix_length, peer in announced:
+        rt.apply_withdrawal({'timestamp': (0, ''), 'peer_as': peer,
+                             'range': {'prefix': prefix, 'prefix_length': prefix_length}})
+    assert rt.adj_rib_in == {}
+    assert len(rt.as_paths) == 0
+    assert set(rt.as_paths.references) == {0}
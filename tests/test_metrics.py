@@ -0,0 +1,83 @@
+"""
+Tables timed by an enabled `Metrics` must stay picklable and copyable, and a
+disabled `Metrics` must cost nothing on the update path.
+"""
+
+import copy
+import pickle
+import sys
+
+import pytest
+
+import Metrics as metrics_module
+from Metrics import Metrics
+from ParseUpdates import ParseUpdates
+from RoutingTable import TIMED_METHODS, RoutingTable
+
+
+@pytest.fixture(scope="module")
+def timed_table(small_mrt_file):
+    rt = RoutingTable(metrics=Metrics(enabled=True))
+    rt.replay([small_mrt_file])
+    return rt
+
+
+def test_enabled_metrics_record_stages(timed_table):
+    timers = timed_table.metrics.timers
+    assert timers['apply_announcement'][0] == timed_table.total_updates_received - timers['apply_withdrawal'][0]
+    assert timers['replay'][0] == 1
+    assert set(timers) == set(TIMED_METHODS.values()) - {'collapse', 'reachability', 'lookup', 'lookup_batch'}
+
+
+def test_timed_table_pickles(timed_table):
+    restored = pickle.loads(pickle.dumps(timed_table))
+    assert restored.routing_table == timed_table.routing_table
+    assert restored.metrics.timers == timed_table.metrics.timers
+
+
+def test_deep_copy_does_not_update_original(timed_table):
+    table_copy = copy.deepcopy(timed_table)
+    n_entries = len(timed_table.routing_table)
+    n_calls = timed_table.metrics.timers['apply_announcement'][0]
+    announcement = dict(next(iter(timed_table.routing_table.values())),
+                        range={'prefix': '10.99.0.0', 'prefix_length': 16})
+
+    table_copy.apply_announcement(announcement)
+
+    assert len(table_copy.routing_table) == n_entries + 1
+    assert len(timed_table.routing_table) == n_entries
+    assert timed_table.metrics.timers['apply_announcement'][0] == n_calls
+    assert table_copy.metrics.timers['apply_announcement'][0] == n_calls + 1
+
+
+def test_disabled_metrics_install_nothing(small_mrt_file):
+    rt = RoutingTable()
+    assert not set(TIMED_METHODS) & set(vars(rt))
+    assert rt.apply_announcement.__func__ is RoutingTable.apply_announcement
+    assert copy.deepcopy(rt).apply_withdrawal.__func__ is RoutingTable.apply_withdrawal
+
+    entered = set()
+
+    def profile(frame, event, arg):
+        if event == 'call':
+            entered.add(frame.f_code.co_filename)
+
+    records = list(ParseUpdates(filename=small_mrt_file).stream_updates())
+    sys.setprofile(profile)
+    try:
+        for next_updates in records:
+            for announcement in next_updates['announcements']:
+                rt.apply_announcement(announcement)
+            for withdrawal in next_updates['withdrawals']:
+                rt.apply_withdrawal(withdrawal)
+    finally:
+        sys.setprofile(None)
+    assert rt.total_updates_received
+    assert metrics_module.__file__ not in entered
+
+
+def test_copies_are_instrumented_with_their_own_metrics(timed_table):
+    restored = pickle.loads(pickle.dumps(timed_table))
+    for name in TIMED_METHODS:
+        assert vars(restored)[name] is not vars(timed_table)[name]
+        assert getattr(restored, name).__wrapped__.__self__ is restored
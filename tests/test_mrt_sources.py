@@ -0,0 +1,147 @@
+"""
+Every `MrtSource` must supply the bytes `bz2.open` does, so that parsing with
+it gives the same updates, and parsing must skip records mrtparse cannot
+decode and close the files it opens.
+"""
+
+import bz2
+import logging
+import os
+import struct
+
+import pytest
+
+from MmapMrtSource import MmapMrtSource
+from MrtSource import MrtSource
+from ParallelBz2Source import ParallelBz2Source
+from ParseUpdates import ParseUpdates
+
+
+class RecordingSource(MrtSource):
+    """
+        `MrtSource` keeping the file objects it opens.
+    """
+    def __init__(self):
+        self.opened = []
+
+    def open(self, filename):
+        fp = super().open(filename)
+        self.opened.append(fp)
+        return fp
+
+
+def read_in_chunks(fp, size):
+    parts = []
+    while True:
+        part = fp.read(size)
+        if not part:
+            return b''.join(parts)
+        parts.append(part)
+
+
+def mrt_records(data):
+    """
+    :return: The MRT records of data, header included, as a list of bytes.
+    """
+    records, offset = [], 0
+    while offset < len(data):
+        length, = struct.unpack_from('>I', data, offset + 8)
+        records.append(data[offset:offset + 12 + length])
+        offset += 12 + length
+    return records
+
+
+def parsed(filename, **kwargs):
+    return list(ParseUpdates(filename=filename, **kwargs).stream_updates())
+
+
+@pytest.fixture(scope="module")
+def raw(small_mrt_file):
+    with bz2.open(small_mrt_file, "rb") as fp:
+        return fp.read()
+
+
+@pytest.fixture(scope="module")
+def bz2_files(small_mrt_file, raw, tmp_path_factory):
+    """
+    The small MRT file as written by the collector, compressed in 100 kB
+    blocks, and compressed as two concatenated streams.
+    """
+    directory = tmp_path_factory.mktemp("bz2")
+    small_blocks = directory / "updates.blocks.bz2"
+    small_blocks.write_bytes(bz2.compress(raw, 1))
+    streams = directory / "updates.streams.bz2"
+    streams.write_bytes(bz2.compress(raw[:len(raw) // 3], 1) + bz2.compress(raw[len(raw) // 3:], 1))
+    return [small_mrt_file, str(small_blocks), str(streams)]
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_parallel_bz2_source_matches_bz2(bz2_files, raw, max_workers):
+    source = ParallelBz2Source(max_workers=max_workers, max_pending=2)
+    for filename in bz2_files:
+        with source.open(filename) as fp:
+            assert fp.read() == raw
+        with source.open(filename) as fp:
+            assert read_in_chunks(fp, 4093) == raw
+
+
+def test_mmap_source_matches_bz2(bz2_files, raw, tmp_path):
+    source = MmapMrtSource(str(tmp_path / "raw"))
+    assert not source.is_decompressed(bz2_files[0])
+    assert source.buffer(bz2_files[0]) is None
+    with source.open(bz2_files[0]) as fp:
+        assert fp.read() == raw
+
+    assert source.decompress(bz2_files[:2]) == 2
+    assert source.decompress(bz2_files[:2]) == 0
+    for filename in bz2_files[:2]:
+        assert source.is_decompressed(filename)
+        assert bytes(source.buffer(filename)) == raw
+        with source.open(filename) as fp:
+            assert fp.read() == raw
+
+    stat = os.stat(source.raw_path(bz2_files[1]))
+    os.utime(bz2_files[1], (stat.st_atime, stat.st_mtime + 10))
+    assert not source.is_decompressed(bz2_files[1])
+    assert source.buffer(bz2_files[1]) is None
+
+
+@pytest.mark.parametrize("fast_decoder", [True, False])
+def test_sources_parse_the_same_updates(small_mrt_file, tmp_path, fast_decoder):
+    expected = parsed(small_mrt_file, fast_decoder=fast_decoder)
+    assert len(expected) > 1
+
+    mmap_source = MmapMrtSource(str(tmp_path / "raw"))
+    mmap_source.decompress([small_mrt_file])
+    for source in (ParallelBz2Source(max_workers=2), mmap_source):
+        assert parsed(small_mrt_file, fast_decoder=fast_decoder, source=source) == expected
+
+
+def test_mrtparse_skips_other_and_undecodable_records(raw, tmp_path, caplog):
+    records = mrt_records(raw)
+    timestamp = records[200][:4]
+    state_change = timestamp + struct.pack('>HHI', 16, 0, 20) + struct.pack('>HHHH4s4sHH', 3356, 6447, 0, 1,
+                                                                               b'\x04\x45\x90\x01',
+                                                                               b'\x80\xdf\x33\x66', 6, 1)
+    truncated_message = timestamp + struct.pack('>HHI', 16, 4, 4) + b'\x00' * 4
+    with_others = tmp_path / "with-others.mrt"
+    with_others.write_bytes(b''.join(records[:200] + [state_change, truncated_message] + records[200:400]))
+    only_updates = tmp_path / "only-updates.mrt"
+    only_updates.write_bytes(b''.join(records[:400]))
+
+    with caplog.at_level(logging.WARNING):
+        updates = parsed(str(with_others), fast_decoder=False)
+    assert updates == parsed(str(only_updates), fast_decoder=False)
+    assert len([record for record in caplog.records if "Skipping undecodable" in record.getMessage()]) == 1
+
+
+def test_mrtparse_files_are_closed(small_mrt_file):
+    source = RecordingSource()
+    pu = ParseUpdates(filename=small_mrt_file, fast_decoder=False, source=source)
+    stores = pu.stream_update_stores(max_rows=100)
+    assert len(next(stores)) >= 100
+    stores.close()
+    assert [fp.closed for fp in source.opened] == [True]
+
+    pu.parse_updates()
+    assert [fp.closed for fp in source.opened] == [True, True]
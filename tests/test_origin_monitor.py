@@ -0,0 +1,93 @@
+"""
+MOAS conflicts and origin changes reported by `OriginMonitor`.
+"""
+
+from OriginMonitor import MOAS, ORIGIN_CHANGE, OriginMonitor
+from ParseUpdates import ParseUpdates
+from RoutingTable import prefix_key
+
+
+def announcement(timestamp, peer, path, prefix='208.65.153.0', prefix_length=24):
+    return {
+        'timestamp': (timestamp, str(timestamp)),
+        'peer_as': peer,
+        'as_path': [[{'type': 'AS_SEQUENCE', 'value': path}]],
+        'next_hop': '192.0.2.1',
+        'range': {'prefix': prefix, 'prefix_length': prefix_length},
+    }
+
+
+def withdrawal(timestamp, peer, prefix='208.65.153.0', prefix_length=24):
+    return {
+        'timestamp': (timestamp, str(timestamp)),
+        'peer_as': peer,
+        'range': {'prefix': prefix, 'prefix_length': prefix_length},
+    }
+
+
+def summary(events):
+    return [(event['type'], event['timestamp'], event['peer_as'], event['origin'], event['other_origins'])
+            for event in events]
+
+
+def test_moas_conflict_while_the_first_origin_is_announced():
+    seen = []
+    monitor = OriginMonitor(on_event=seen.append)
+    key = prefix_key('208.65.153.0', 24)
+    assert monitor.apply_announcement(announcement(1, '3356', ['3356', '36561'])) is None
+    assert monitor.apply_announcement(announcement(2, '3356', ['3356', '36561'])) is None
+    event = monitor.apply_announcement(announcement(3, '3491', ['3491', '17557']))
+
+    assert summary([event]) == [(MOAS, 3, '3491', '17557', ['36561'])]
+    assert event['prefix'] == '208.65.153.0/24'
+    assert seen == monitor.events == [event]
+    assert monitor.current_origins(key) == {'36561', '17557'}
+    assert monitor.origin_history(key) == {'36561': (1, 2, 2), '17557': (3, 3, 1)}
+
+
+def test_origin_change_after_the_first_origin_is_withdrawn():
+    monitor = OriginMonitor()
+    key = prefix_key('208.65.153.0', 24)
+    monitor.apply_announcement(announcement(1, '3356', ['3356', '36561']))
+    monitor.apply_withdrawal(withdrawal(2, '3356'))
+    assert monitor.current_origins(key) == set()
+    monitor.apply_announcement(announcement(3, '3491', ['3491', '17557']))
+
+    assert summary(monitor.events) == [(ORIGIN_CHANGE, 3, '3491', '17557', ['36561'])]
+
+
+def test_peer_switching_origin_is_an_origin_change_not_a_moas():
+    monitor = OriginMonitor()
+    monitor.apply_announcement(announcement(1, '3356', ['3356', '36561']))
+    monitor.apply_announcement(announcement(2, '3356', ['3356', '17557']))
+
+    assert summary(monitor.events) == [(ORIGIN_CHANGE, 2, '3356', '17557', ['36561'])]
+    assert monitor.current_origins(prefix_key('208.65.153.0', 24)) == {'17557'}
+
+
+def test_same_origin_from_another_peer_is_not_an_event():
+    monitor = OriginMonitor()
+    monitor.apply_announcement(announcement(1, '3356', ['3356', '36561']))
+    monitor.apply_announcement(announcement(2, '3491', ['3491', '36561']))
+    monitor.apply_withdrawal(withdrawal(3, '3356'))
+    monitor.apply_announcement(announcement(4, '3356', ['3356', '36561'], prefix='208.65.152.0', prefix_length=22))
+
+    assert monitor.events == []
+    assert monitor.current_origins(prefix_key('208.65.153.0', 24)) == {'36561'}
+    assert monitor.origin_history(prefix_key('8.8.8.0', 24)) == {}
+
+
+def test_run_matches_applying_the_updates_in_order(small_mrt_files):
+    expected = OriginMonitor()
+    for filename in small_mrt_files:
+        for next_updates in ParseUpdates(filename=filename).stream_updates():
+            for update in next_updates['announcements']:
+                expected.apply_announcement(update)
+            for update in next_updates['withdrawals']:
+                expected.apply_withdrawal(update)
+
+    monitor = OriginMonitor()
+    assert monitor.run(small_mrt_files) == len(expected.events)
+    assert monitor.events == expected.events
+    assert (monitor.n_announcements, monitor.n_withdrawals) == (expected.n_announcements, expected.n_withdrawals)
+    assert any(event['type'] == MOAS for event in monitor.events)
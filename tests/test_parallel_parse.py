@@ -0,0 +1,37 @@
+"""
+`ParallelParseUpdates` must yield exactly the stream of parsing its files
+serially and chaining the results.
+"""
+
+import pytest
+
+from ParseUpdates import ParseUpdates
+from ParallelParseUpdates import ParallelParseUpdates
+
+
+def serial_updates(files):
+    records = []
+    n_announcements, n_withdrawals = 0, 0
+    for filename in files:
+        pu = ParseUpdates(filename=filename)
+        records.extend(record for record in pu.stream_updates() if record['timestamp'] is not None)
+        n_announcements += pu.n_announcements
+        n_withdrawals += pu.n_withdrawals
+    return records, n_announcements, n_withdrawals
+
+
+def parallel_updates(files, max_workers):
+    ppu = ParallelParseUpdates(files, max_workers=max_workers, max_pending=2)
+    records = list(ppu.get_next_updates())
+    assert records[-1]['timestamp'] is None
+    return records[:-1], ppu.n_announcements, ppu.n_withdrawals
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_parallel_stream_matches_serial_stream(small_mrt_files, max_workers):
+    assert parallel_updates(small_mrt_files, max_workers) == serial_updates(small_mrt_files)
+
+
+def test_files_out_of_chronological_order_keep_list_order(small_mrt_files):
+    files = list(reversed(small_mrt_files))
+    assert parallel_updates(files, 2) == serial_updates(files)
@@ -0,0 +1,85 @@
+"""
+Longest prefix matching: `FlatFib` must agree with `PrefixTrie` for every
+address.
+"""
+
+import random
+
+import pytest
+
+from PrefixTrie import PrefixTrie
+
+np = pytest.importorskip("numpy")
+from FlatFib import FlatFib
+
+
+def random_prefixes(rng, n_prefixes):
+    """
+    Random prefixes, many of them nested inside others, plus the default
+    route and the edges of the address space.
+    """
+    keys = {(0, 0), (0, 32), (0xffffffff, 32), (0xff000000, 8)}
+    ordered = sorted(keys)
+    while len(keys) < n_prefixes:
+        parent_network, parent_length = rng.choice(ordered)
+        if rng.random() < 0.5 and parent_length < 32:
+            length = rng.randint(parent_length + 1, min(32, parent_length + 8))
+            network = parent_network | (rng.getrandbits(32) & ((1 << (32 - parent_length)) - 1))
+        else:
+            network, length = rng.getrandbits(32), rng.randint(8, 32)
+        key = (network & (0xffffffff << (32 - length)) & 0xffffffff, length)
+        if key not in keys:
+            keys.add(key)
+            ordered.append(key)
+    return keys
+
+
+def build_trie(keys):
+    trie = PrefixTrie()
+    for key in keys:
+        trie.insert(key, key)
+    return trie
+
+
+def probe_addresses(rng, keys, n_random):
+    """
+    Random addresses plus the first and last address of every prefix and
+    the addresses just outside it, where off-by-one errors show up.
+    """
+    addresses = {rng.getrandbits(32) for _ in range(n_random)}
+    for network, length in keys:
+        last = network + (1 << (32 - length)) - 1
+        addresses.update(address for address in (network - 1, network, last, last + 1) if 0 <= address <= 0xffffffff)
+    return sorted(addresses)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_flat_fib_matches_prefix_trie(seed):
+    rng = random.Random(seed)
+    keys = random_prefixes(rng, 2000)
+    trie = build_trie(keys)
+    fib = FlatFib(key for key, _ in trie.items())
+    addresses = probe_addresses(rng, keys, 20000)
+
+    matches = fib.lookup(np.array(addresses, dtype=np.uint32))
+    for address, match in zip(addresses, matches):
+        expected = trie.longest_match((address, 32))
+        assert (fib.keys[match] if match >= 0 else None) == (expected[0] if expected else None), hex(address)
+
+
+def test_covering_lists_longest_match_first():
+    rng = random.Random(3)
+    keys = random_prefixes(rng, 500)
+    trie = build_trie(keys)
+    for address in probe_addresses(rng, keys, 2000):
+        covering = [key for key, _ in trie.covering((address, 32))]
+        expected = sorted((key for key in keys
+                           if address >> (32 - key[1]) == key[0] >> (32 - key[1])),
+                          key=lambda key: -key[1])
+        assert covering == expected, hex(address)
+        assert (covering[0] if covering else None) == (trie.longest_match((address, 32)) or (None,))[0]
+
+
+def test_lookup_without_routes():
+    fib = FlatFib([])
+    assert list(fib.lookup(["0.0.0.0", "10.1.2.3", "255.255.255.255"])) == [-1, -1, -1]
@@ -0,0 +1,135 @@
+"""
+Incremental state of `RoutingTable`: reachability, redundant entries and
+best route selection must match what a full recount or a brute-force model
+gives, before and after collapsing the table.
+"""
+
+import ipaddress
+import random
+
+import pytest
+
+from ParseUpdates import ParseUpdates
+from RoutingTable import RoutingTable, as_path_of, key_to_network, prefix_key
+
+
+class AdjRibInModel:
+    """
+        Brute-force model of best route selection: for every range, the
+        route of each peer, and the shortest AS path wins, the oldest route
+        among equally short ones.
+    """
+    def __init__(self):
+        self.routes = {}
+        self.sequence = 0
+
+    def announce(self, announcement):
+        key = prefix_key(announcement['range']['prefix'], announcement['range']['prefix_length'])
+        routes = self.routes.setdefault(key, {})
+        current = routes.get(announcement['peer_as'])
+        if current is None:
+            self.sequence += 1
+        sequence = self.sequence if current is None else current[1]
+        routes[announcement['peer_as']] = (len(as_path_of(announcement)), sequence, announcement)
+
+    def withdraw(self, withdrawal):
+        key = prefix_key(withdrawal['range']['prefix'], withdrawal['range']['prefix_length'])
+        routes = self.routes.get(key, {})
+        routes.pop(withdrawal['peer_as'], None)
+        if not routes:
+            self.routes.pop(key, None)
+
+    def best(self, key):
+        length, sequence, announcement = min(self.routes[key].values(), key=lambda route: route[:2])
+        return announcement['peer_as'], announcement['as_path'], announcement['next_hop']
+
+
+def replay(rt, model, filename):
+    for next_updates in ParseUpdates(filename=filename).stream_updates():
+        for announcement in next_updates['announcements']:
+            rt.apply_announcement(announcement)
+            model.announce(announcement)
+        for withdrawal in next_updates['withdrawals']:
+            rt.apply_withdrawal(withdrawal)
+            model.withdraw(withdrawal)
+
+
+def route_of(entry):
+    return entry['peer_as'], entry['as_path'], entry['next_hop']
+
+
+def assert_reachability(rt):
+    incremental = rt.reachability
+    rt.measure_reachability()
+    assert incremental == rt.reachability
+    networks = ipaddress.collapse_addresses(key_to_network(key) for key in rt.routing_table)
+    assert incremental == sum(network.num_addresses for network in networks)
+    assert rt.statistics()['reachability'] == incremental
+
+
+def assert_redundancy(rt):
+    redundant = set()
+    for network, length in rt.routing_table:
+        for parent_length in range(length - 1, -1, -1):
+            parent = (network & (0xffffffff << (32 - parent_length)) & 0xffffffff, parent_length)
+            if parent in rt.routing_table:
+                if route_of(rt.routing_table[parent]) == route_of(rt.routing_table[(network, length)]):
+                    redundant.add((network, length))
+                break
+    assert set(key for key in rt.routing_table if rt.is_redundant(key)) == redundant
+    assert rt.statistics()['collapsed_entries'] == len(rt.routing_table) - len(redundant)
+
+
+def best_routes(rt, addresses):
+    """
+    :return: The (source AS, AS path, next hop) of the longest prefix match
+        of every address, or None.
+    """
+    matches = []
+    for address in addresses:
+        best = rt.find_path_to_destination(address)[0]
+        matches.append(None if best['prefix_len'] is None else
+                       (best['source_as'], best['as_path'], best['next_hop']))
+    return matches
+
+
+@pytest.fixture(scope="module")
+def tables(small_mrt_files):
+    rt, model = RoutingTable(), AdjRibInModel()
+    replay(rt, model, small_mrt_files[0])
+    return rt, model
+
+
+def test_best_routes_match_adj_rib_in_model(tables):
+    rt, model = tables
+    assert set(rt.routing_table) == set(model.routes)
+    for key, entry in rt.routing_table.items():
+        assert route_of(entry) == model.best(key), key_to_network(key)
+
+
+def test_reachability_and_redundancy_through_collapse_and_replay(small_mrt_files):
+    rt, model = RoutingTable(), AdjRibInModel()
+    replay(rt, model, small_mrt_files[0])
+    assert_reachability(rt)
+    assert_redundancy(rt)
+
+    rng = random.Random(0)
+    addresses = [str(ipaddress.IPv4Address(key[0] + rng.randrange(1 << (32 - key[1]))))
+                 for key in rt.routing_table]
+    addresses += [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(2000)]
+    before = best_routes(rt, addresses)
+    n_redundant = sum(1 for key in rt.routing_table if rt.is_redundant(key))
+    assert n_redundant
+
+    n_entries = len(rt.routing_table)
+    rt.collapse_routing_table()
+    assert len(rt.routing_table) == n_entries - n_redundant
+    assert best_routes(rt, addresses) == before
+    assert_reachability(rt)
+    assert_redundancy(rt)
+
+    replay(rt, model, small_mrt_files[1])
+    assert_reachability(rt)
+    assert_redundancy(rt)
+    for key, entry in rt.routing_table.items():
+        assert route_of(entry) == model.best(key), key_to_network(key)
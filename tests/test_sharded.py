@@ -0,0 +1,122 @@
+"""
+`ShardedRoutingTable` must answer like a single `RoutingTable` fed the same
+updates, including for ranges cut in two by a shard boundary.
+"""
+
+import bisect
+import ipaddress
+import random
+
+import pytest
+
+from RoutingTable import RoutingTable
+from ShardedRoutingTable import ShardedRoutingTable
+
+ASNS = ('7018', '3356', '701', '1239', '36561')
+
+
+@pytest.fixture(scope="module")
+def files(small_mrt_files):
+    return small_mrt_files[:2]
+
+
+@pytest.fixture(scope="module")
+def single(files):
+    rt = RoutingTable()
+    rt.replay(files)
+    return rt
+
+
+@pytest.fixture(scope="module")
+def boundaries(single):
+    """
+    Shard boundaries at the middle of short ranges of the table holding more
+    specific ranges on both sides, so those are split across two shards.
+    """
+    keys = sorted(single.routing_table)
+    networks = [network for network, _ in keys]
+
+    def more_specifics(start, end):
+        i = bisect.bisect_left(networks, start)
+        return i < len(networks) and networks[i] < end
+
+    cut = []
+    for network, length in keys:
+        if not 8 <= length <= 20:
+            continue
+        middle, end = network + (1 << (31 - length)), network + (1 << (32 - length))
+        if more_specifics(network + 1, middle) and more_specifics(middle, end):
+            cut.append((network, length))
+    cut = random.Random(3640).sample(cut, min(5, len(cut)))
+    return sorted({0} | {network + (1 << (31 - length)) for network, length in cut}), sorted(cut)
+
+
+@pytest.fixture(scope="module")
+def destinations(single):
+    rng = random.Random(0)
+    keys = sorted(single.routing_table)
+    addresses = [key[0] + rng.randrange(1 << (32 - key[1])) for key in rng.sample(keys, 1000)]
+    addresses += [rng.getrandbits(32) for _ in range(500)]
+    return [str(ipaddress.IPv4Address(address)) for address in addresses]
+
+
+def assert_same_answers(single, sharded, destinations):
+    assert sharded.statistics() == single.statistics()
+    assert sharded.routing_table == single.routing_table
+    for destination in destinations:
+        assert sharded.find_path_to_destination(destination) == single.find_path_to_destination(destination)
+    single_indices, single_keys = single.find_routes_batch(destinations)
+    sharded_indices, sharded_keys = sharded.find_routes_batch(destinations)
+    assert ([sharded_keys[i] if i >= 0 else None for i in sharded_indices] ==
+            [single_keys[i] if i >= 0 else None for i in single_indices])
+    for group_by in ('peer_as', 'origin_as'):
+        assert sharded.measure_reachability(group_by) == single.measure_reachability(group_by)
+    sharded.measure_reachability()
+    single.measure_reachability()
+    assert sharded.reachability == single.reachability
+    for asn in ASNS:
+        assert sharded.prefixes_originated_by(asn) == set(single.prefixes_originated_by(asn))
+        assert sharded.prefixes_through(asn) == set(single.prefixes_through(asn))
+
+
+def test_boundaries_cut_through_ranges(boundaries):
+    shard_starts, cut = boundaries
+    assert len(cut) == 5
+    for network, length in cut:
+        assert network + (1 << (31 - length)) in shard_starts
+
+
+@pytest.mark.parametrize("shards", [1, 3, 'cut'])
+def test_sharded_table_matches_single_table(single, files, boundaries, destinations, shards):
+    settings = {'boundaries': boundaries[0]} if shards == 'cut' else {'shards': shards}
+    with ShardedRoutingTable(batch_size=500, **settings) as sharded:
+        assert sharded.replay(files) == len(files)
+        assert (sharded.last_applied_file, sharded.last_applied_timestamp) == (single.last_applied_file,
+                                                                             single.last_applied_timestamp)
+        assert sharded.total_updates_received == single.total_updates_received
+        assert sharded.total_paths_changed == single.total_paths_changed
+        assert_same_answers(single, sharded, destinations)
+
+
+def test_collapsed_sharded_table_matches_single_table(files, boundaries, destinations):
+    single = RoutingTable()
+    single.replay(files)
+    with ShardedRoutingTable(boundaries=boundaries[0], batch_size=500) as sharded:
+        sharded.replay(files)
+        assert sharded.collapse_routing_table()
+        single.collapse_routing_table()
+        assert set(sharded.routing_table) == set(single.routing_table)
+        assert sharded.statistics() == single.statistics()
+        for destination in destinations:
+            assert ([route['as_path'] for route in sharded.find_path_to_destination(destination)] ==
+                    [route['as_path'] for route in single.find_path_to_destination(destination)])
+
+
+def test_sharded_replay_resumes(single, files, boundaries):
+    with ShardedRoutingTable(boundaries=boundaries[0], batch_size=500) as sharded:
+        assert sharded.replay(files[:1]) == 1
+        assert sharded.replay(files) == 2
+        assert sharded.statistics() == single.statistics()
+        assert sharded.routing_table == single.routing_table
+        with pytest.raises(ValueError):
+            sharded.replay(files[:1])
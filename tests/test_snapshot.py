@@ -0,0 +1,87 @@
+"""
+`RoutingTable.save` and `RoutingTable.load` round-trips, and resuming a
+replay from the position recorded in a table.
+"""
+
+import pytest
+
+from ParseUpdates import ParseUpdates
+from RoutingTable import RoutingTable
+
+
+def state(rt):
+    """
+    Everything a restored table must have in common with the saved one.
+    """
+    routes = {key: {peer: (rt.as_paths.values[route[2]], rt.next_hops.values[route[3]], route[4])
+                    for peer, route in peer_routes.items()}
+              for key, peer_routes in rt.adj_rib_in.items()}
+    return (rt.routing_table, routes, rt.statistics(), rt.last_applied_file, rt.last_applied_timestamp,
+            {asn: keys for asn, keys in rt.prefixes_by_origin.items() if keys})
+
+
+def round_trip(rt, tmp_path):
+    path = str(tmp_path / "table.snapshot")
+    rt.save(path)
+    restored = RoutingTable.load(path)
+    assert restored is not None
+    return restored
+
+
+def replayed(files):
+    rt = RoutingTable()
+    rt.replay(files)
+    return rt
+
+
+def test_save_load_round_trip(small_mrt_files, tmp_path):
+    rt = replayed(small_mrt_files[:1])
+    assert state(round_trip(rt, tmp_path)) == state(rt)
+
+
+def test_collapsed_table_round_trip(small_mrt_files, tmp_path):
+    rt = replayed(small_mrt_files[:1])
+    rt.collapse_routing_table()
+    restored = round_trip(rt, tmp_path)
+    assert state(restored) == state(rt)
+
+    # Collapsed ranges keep their routes and come back once updated.
+    rt.replay(small_mrt_files[:2])
+    restored.replay(small_mrt_files[:2])
+    assert state(restored) == state(rt)
+
+
+def test_resume_replay_from_saved_position(small_mrt_files, tmp_path):
+    files = small_mrt_files[:2]
+    records = [record for record in ParseUpdates(filename=files[0]).stream_updates()
+               if record['timestamp'] is not None]
+    stop = records[len(records) // 2]['timestamp']
+
+    partial = RoutingTable()
+    for next_updates in records:
+        if next_updates['timestamp'] > stop:
+            break
+        for announcement in next_updates['announcements']:
+            partial.apply_announcement(announcement)
+        for withdrawal in next_updates['withdrawals']:
+            partial.apply_withdrawal(withdrawal)
+    partial.last_applied_file, partial.last_applied_timestamp = files[0], stop
+
+    restored = round_trip(partial, tmp_path)
+    assert restored.replay(files) == 2
+    assert state(restored) == state(replayed(files))
+
+
+def test_replaying_again_applies_nothing(small_mrt_files):
+    rt = replayed(small_mrt_files[:1])
+    before = state(rt)
+    rt.replay(small_mrt_files[:1])
+    assert state(rt) == before
+
+
+def test_resume_without_last_applied_file_is_rejected(small_mrt_files):
+    rt = replayed(small_mrt_files[:1])
+    with pytest.raises(ValueError):
+        rt.replay(small_mrt_files[1:2])
+    rt.replay(small_mrt_files[:2])
+    assert state(rt) == state(replayed(small_mrt_files[:2]))
@@ -0,0 +1,72 @@
+"""
+Parsed-update cache: a cached file must give the records of a fresh parse,
+and a damaged cache file must be treated as a cache miss.
+"""
+
+import logging
+import os
+
+import pytest
+
+from ParseUpdates import ParseUpdates
+from UpdateStore import CACHE_HEADER
+
+
+def parse(filename, cache_dir=None):
+    pu = ParseUpdates(filename=filename, cache_dir=cache_dir)
+    records = list(pu.stream_updates())
+    return records, pu.n_announcements, pu.n_withdrawals
+
+
+@pytest.fixture(scope="module")
+def fresh_parse(small_mrt_file):
+    return parse(small_mrt_file)
+
+
+def loaded_from_cache(caplog):
+    return any("from cache" in record.getMessage() for record in caplog.records)
+
+
+def test_cached_records_match_fresh_parse(small_mrt_file, fresh_parse, tmp_path, caplog):
+    cache_dir = str(tmp_path / "cache")
+    assert parse(small_mrt_file, cache_dir) == fresh_parse
+    cache_path = ParseUpdates(filename=small_mrt_file, cache_dir=cache_dir).cache_path()
+    assert os.path.exists(cache_path)
+
+    with caplog.at_level(logging.INFO):
+        assert parse(small_mrt_file, cache_dir) == fresh_parse
+    assert loaded_from_cache(caplog)
+
+
+def truncate_in_header(data):
+    return data[:CACHE_HEADER.size - 3]
+
+
+def truncate_in_columns(data):
+    return data[:CACHE_HEADER.size + (len(data) - CACHE_HEADER.size) // 3]
+
+
+def truncate_in_tables(data):
+    return data[:-10]
+
+
+def corrupt_tables(data):
+    return data[:-10] + b'\xff' * 10
+
+
+@pytest.mark.parametrize("damage", [truncate_in_header, truncate_in_columns, truncate_in_tables, corrupt_tables,
+                                    lambda data: b''])
+def test_damaged_cache_is_a_miss(small_mrt_file, fresh_parse, tmp_path, caplog, damage):
+    cache_dir = str(tmp_path / "cache")
+    parse(small_mrt_file, cache_dir)
+    cache_path = ParseUpdates(filename=small_mrt_file, cache_dir=cache_dir).cache_path()
+    with open(cache_path, "rb") as fp:
+        data = fp.read()
+    with open(cache_path, "wb") as fp:
+        fp.write(damage(data))
+
+    with caplog.at_level(logging.INFO):
+        assert parse(small_mrt_file, cache_dir) == fresh_parse
+    assert not loaded_from_cache(caplog)
+    with open(cache_path, "rb") as fp:
+        assert fp.read() == data
@@ -0,0 +1,82 @@
+"""
+Updates exported by `UpdateExporter` read back as the updates `ParseUpdates`
+parses, in both formats.
+"""
+
+import gzip
+import json
+
+import pytest
+
+from ParseUpdates import ParseUpdates
+from UpdateExporter import UpdateExporter, read_columnar, read_ndjson
+
+
+def canonical(update, update_type):
+    return json.dumps(dict(update, type=update_type), sort_keys=True)
+
+
+def parsed_updates(filenames):
+    updates = []
+    for filename in filenames:
+        for next_updates in ParseUpdates(filename=filename).stream_updates():
+            updates += [canonical(update, 'announcement') for update in next_updates['announcements']]
+            updates += [canonical(update, 'withdrawal') for update in next_updates['withdrawals']]
+    return sorted(updates)
+
+
+@pytest.fixture(scope="module")
+def files(small_mrt_files):
+    return small_mrt_files[:2]
+
+
+@pytest.fixture(scope="module")
+def expected(files):
+    return parsed_updates(files)
+
+
+def test_ndjson_round_trip(tmp_path, files, expected):
+    exporter = UpdateExporter(files, block_rows=1000)
+    destination = tmp_path / "updates.ndjson.gz"
+    assert exporter.export(str(destination), 'ndjson') == len(expected)
+    assert exporter.n_announcements + exporter.n_withdrawals == len(expected)
+
+    updates = list(read_ndjson(str(destination)))
+    assert sorted(json.dumps(update, sort_keys=True) for update in updates) == expected
+    assert [update['timestamp'][0] for update in updates if update['type'] == 'announcement']
+
+
+def test_columnar_round_trip(tmp_path, files, expected):
+    exporter = UpdateExporter(files, block_rows=1000)
+    destination = tmp_path / "updates.cols.gz"
+    assert exporter.export(str(destination), 'columnar') == len(expected)
+
+    stores = list(read_columnar(str(destination)))
+    assert len(stores) > len(files)
+    # Blocks are closed at the end of the BGP message reaching block_rows.
+    full_blocks = [store for store in stores if len(store) >= 1000]
+    assert len(full_blocks) >= len(stores) - len(files)
+    assert all(len(store) < 2000 for store in stores)
+    assert [store.metadata['filename'] for store in stores] == sorted(store.metadata['filename'] for store in stores)
+    updates = [canonical(store.record(row), 'withdrawal' if store.is_withdrawal[row] else 'announcement')
+               for store in stores for row in range(len(store))]
+    assert sorted(json.loads(json.dumps(updates))) == expected
+
+
+def test_columnar_rejects_other_files(tmp_path, files):
+    destination = tmp_path / "updates.cols.gz"
+    UpdateExporter(files[:1]).export(str(destination), 'columnar')
+    data = gzip.decompress(destination.read_bytes())
+
+    not_columnar = tmp_path / "not-columnar.gz"
+    not_columnar.write_bytes(gzip.compress(b'{"type": "announcement"}\n'))
+    with pytest.raises(ValueError):
+        list(read_columnar(str(not_columnar)))
+
+    truncated = tmp_path / "truncated.gz"
+    truncated.write_bytes(gzip.compress(data[:len(data) // 2]))
+    with pytest.raises(ValueError):
+        list(read_columnar(str(truncated)))
+
+    with pytest.raises(ValueError):
+        UpdateExporter(files[:1]).export(str(tmp_path / "updates.csv"), 'csv')
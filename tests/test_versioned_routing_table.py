@@ -0,0 +1,133 @@
+"""
+History invariants of `VersionedRoutingTable`: the past tables it rebuilds
+must be the tables it actually held at the time.
+"""
+
+import copy
+import ipaddress
+
+import pytest
+
+from ParseUpdates import ParseUpdates
+from RoutingTable import key_to_network
+from VersionedRoutingTable import VersionedRoutingTable
+
+
+def snapshot(table):
+    """
+    Copy of a routing table that later in-place changes of its entries do
+    not affect.
+    """
+    return copy.deepcopy(table)
+
+
+def replay(filename, checkpoint_interval):
+    vrt = VersionedRoutingTable(checkpoint_interval=checkpoint_interval)
+    vrt.replay([filename])
+    return vrt
+
+
+@pytest.fixture(scope="module")
+def replayed(small_mrt_file):
+    """
+    Applies the updates of a small file to a table with frequent
+    checkpoints, keeping a copy of the table every few timestamps.
+    :return: (table, dictionary of copy of the table by timestamp).
+    """
+    vrt = VersionedRoutingTable(checkpoint_interval=500)
+    pu = ParseUpdates(filename=small_mrt_file)
+    pu.parse_updates()
+    snapshots = {}
+    for position, next_updates in enumerate(pu.get_next_updates()):
+        if next_updates['timestamp'] is None:
+            break
+        for announcement in next_updates['announcements']:
+            vrt.apply_announcement(announcement)
+        for withdrawal in next_updates['withdrawals']:
+            vrt.apply_withdrawal(withdrawal)
+        if position % 25 == 0:
+            snapshots[next_updates['timestamp']] = snapshot(vrt.routing_table)
+    snapshots[vrt.time_of_latest_update] = snapshot(vrt.routing_table)
+    assert len(vrt.checkpoints) > 2
+    return vrt, snapshots
+
+
+def test_routing_table_at_matches_past_tables(replayed):
+    vrt, snapshots = replayed
+    for at, table in snapshots.items():
+        assert vrt.routing_table_at(at) == table, at
+
+
+def test_entry_at_matches_routing_table_at(replayed):
+    vrt, snapshots = replayed
+    for at in list(snapshots)[::4]:
+        table = vrt.routing_table_at(at)
+        for key in vrt.range_history:
+            assert vrt.entry_at(key, at) == table.get(key), (key, at)
+
+
+def test_change_logs_are_sorted(replayed):
+    vrt, _ = replayed
+    timestamps = [change[0] for change in vrt.changes]
+    assert timestamps == sorted(timestamps)
+    for key, (timestamps, entries) in vrt.range_history.items():
+        assert timestamps == sorted(timestamps), key
+        assert len(timestamps) == len(entries), key
+
+
+def test_checkpoints_match_replayed_changes(replayed):
+    vrt, _ = replayed
+    table = dict(vrt.checkpoints[0][2])
+    applied = vrt.checkpoints[0][1]
+    for _, position, checkpoint_table in vrt.checkpoints[1:]:
+        for _, key, entry in vrt.changes[applied:position]:
+            if entry is None:
+                table.pop(key, None)
+            else:
+                table[key] = entry
+        applied = position
+        assert table == checkpoint_table
+
+
+def test_past_lookup_at_latest_update_matches_current_lookup(replayed):
+    vrt, _ = replayed
+    for key in list(vrt.routing_table)[::50]:
+        destination = str(ipaddress.IPv4Address(key[0]))
+        assert vrt.find_path_to_destination(destination, at=vrt.time_of_latest_update) == \
+            vrt.find_path_to_destination(destination), key_to_network(key)
+
+
+def test_history_before_first_update_is_rejected(replayed):
+    vrt, _ = replayed
+    with pytest.raises(ValueError):
+        vrt.routing_table_at(vrt.checkpoints[0][0] - 1)
+
+
+def test_collapse_leaves_earlier_history_untouched(small_mrt_file):
+    vrt = replay(small_mrt_file, checkpoint_interval=500)
+    checkpoints = snapshot(vrt.checkpoints)
+    range_history = snapshot(vrt.range_history)
+    before = snapshot(vrt.routing_table)
+
+    vrt.collapse_routing_table()
+
+    assert len(vrt.routing_table) < len(before)
+    assert vrt.checkpoints[:len(checkpoints)] == checkpoints
+    for key, (timestamps, entries) in range_history.items():
+        assert vrt.range_history[key][0][:len(timestamps)] == timestamps, key
+        assert vrt.range_history[key][1][:len(entries)] == entries, key
+
+
+def test_collapse_records_merged_timestamps(small_mrt_file):
+    vrt = replay(small_mrt_file, checkpoint_interval=500)
+    before = snapshot(vrt.routing_table)
+    vrt.collapse_routing_table()
+
+    merged = [key for key, entry in vrt.routing_table.items() if entry['timestamp'] != before[key]['timestamp']]
+    assert merged
+    at = vrt.time_of_latest_update
+    assert vrt.routing_table_at(at) == vrt.routing_table
+    for key in merged:
+        timestamps, entries = vrt.range_history[key]
+        assert timestamps[-1] == at and entries[-1] == vrt.routing_table[key], key
+        assert entries[-2] == before[key], key